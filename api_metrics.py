@@ -0,0 +1,153 @@
+"""Accounting of the size, estimated token count and latency of the requests CodeplainAPI sends."""
+
+import json
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Optional
+
+import plain_spec
+
+
+@dataclass
+class RequestMetrics:
+    """Metrics of a single API call (including all of its retries)."""
+
+    endpoint: str
+    frid: Optional[str]
+    call_count: Optional[int]
+    latency: float  # seconds
+    error: Optional[str]
+    field_bytes: dict[str, int]
+    field_tokens: dict[str, int]
+    # The size of the request bodies as serialized (after content-addressed files and session cached fields were
+    # replaced by their hashes) and as sent (after compression), over all the retries of the call.
+    body_bytes: int = 0
+    sent_bytes: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.field_bytes.values())
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.field_tokens.values())
+
+
+@dataclass
+class AggregatedMetrics:
+    requests: int = 0
+    failed_requests: int = 0
+    latency: float = 0
+    total_bytes: int = 0
+    total_tokens: int = 0
+    body_bytes: int = 0
+    sent_bytes: int = 0
+    requests_per_endpoint: dict[str, int] = field(default_factory=dict)
+    field_bytes: dict[str, int] = field(default_factory=dict)
+    field_tokens: dict[str, int] = field(default_factory=dict)
+
+    def add(self, request_metrics: RequestMetrics):
+        self.requests += 1
+        if request_metrics.error is not None:
+            self.failed_requests += 1
+        self.latency += request_metrics.latency
+        self.total_bytes += request_metrics.total_bytes
+        self.total_tokens += request_metrics.total_tokens
+        self.body_bytes += request_metrics.body_bytes
+        self.sent_bytes += request_metrics.sent_bytes
+        self.requests_per_endpoint[request_metrics.endpoint] = (
+            self.requests_per_endpoint.get(request_metrics.endpoint, 0) + 1
+        )
+        for field_name, size in request_metrics.field_bytes.items():
+            self.field_bytes[field_name] = self.field_bytes.get(field_name, 0) + size
+        for field_name, tokens in request_metrics.field_tokens.items():
+            self.field_tokens[field_name] = self.field_tokens.get(field_name, 0) + tokens
+
+
+class ApiMetrics:
+    """
+    Records the serialized size and the estimated token count of every payload field of every API call, together with
+    the size of the request bodies actually sent and the call's wall-clock latency, and aggregates them per FRID and
+    per render.
+    """
+
+    def __init__(self, token_counter: Callable[[str], int]):
+        self.token_counter = token_counter
+        self.requests: list[RequestMetrics] = []
+        self._lock = threading.Lock()
+        # The same fields (e.g. the plain source tree) are sent over and over, so we don't tokenize them every time.
+        self._token_counts: dict[str, int] = {}
+
+    def _count_tokens(self, text: str) -> int:
+        digest = plain_spec.hash_text(text)
+        with self._lock:
+            if digest in self._token_counts:
+                return self._token_counts[digest]
+
+        token_count = self.token_counter(text)
+        with self._lock:
+            self._token_counts[digest] = token_count
+        return token_count
+
+    def record(
+        self,
+        endpoint: str,
+        payload: dict,
+        latency: float,
+        error: Optional[Exception] = None,
+        body_bytes: int = 0,
+        sent_bytes: int = 0,
+    ):
+        field_bytes = {}
+        field_tokens = {}
+        for field_name, value in payload.items():
+            if field_name == "render_state":
+                continue
+
+            serialized_value = json.dumps(value)
+            field_bytes[field_name] = len(serialized_value.encode("utf-8"))
+            field_tokens[field_name] = self._count_tokens(value if isinstance(value, str) else serialized_value)
+
+        frid = payload.get("frid")
+        request_metrics = RequestMetrics(
+            endpoint=endpoint,
+            frid=str(frid) if frid is not None else None,
+            call_count=payload.get("render_state", {}).get("call_count"),
+            latency=latency,
+            error=type(error).__name__ if error is not None else None,
+            field_bytes=field_bytes,
+            field_tokens=field_tokens,
+            body_bytes=body_bytes,
+            sent_bytes=sent_bytes,
+        )
+        with self._lock:
+            self.requests.append(request_metrics)
+
+    def get_report(self, render_id: Optional[str] = None) -> dict:
+        with self._lock:
+            requests = list(self.requests)
+
+        render_metrics = AggregatedMetrics()
+        frid_metrics: dict[str, AggregatedMetrics] = {}
+        for request_metrics in requests:
+            render_metrics.add(request_metrics)
+            if request_metrics.frid is not None:
+                frid_metrics.setdefault(request_metrics.frid, AggregatedMetrics()).add(request_metrics)
+
+        return {
+            "render_id": render_id,
+            "render": asdict(render_metrics),
+            "frids": {frid: asdict(metrics) for frid, metrics in frid_metrics.items()},
+            "requests": [
+                {
+                    **asdict(request_metrics),
+                    "total_bytes": request_metrics.total_bytes,
+                    "total_tokens": request_metrics.total_tokens,
+                }
+                for request_metrics in requests
+            ],
+        }
+
+    def write_report(self, report_path: str, render_id: Optional[str] = None):
+        with open(report_path, "w") as f:
+            json.dump(self.get_report(render_id), f, indent=4)
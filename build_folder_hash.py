@@ -0,0 +1,207 @@
+"""
+Merkle hash of the text files of a build folder, used to tell whether the code of a required module changed.
+
+Every file is hashed on its own, and the digests of the files and subfolders of every folder are hashed together into
+the folder's digest. The file digests can be persisted (in the `.codeplain` folder of the module that depends on the
+build folder) with the files' modification time, size and inode, so only new and changed files are read again, one
+chunk at a time.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import file_utils
+import plain_spec
+
+BUILD_FOLDER_HASH_CACHE_FILE_NAME = "build_folder_hash_cache.json"
+BUILD_FOLDER_HASH_CACHE_VERSION = 2
+# Keeps the file digests out of the module's git repository (the ignore file also ignores itself).
+BUILD_FOLDER_HASH_GITIGNORE_FILE_NAME = ".gitignore"
+BUILD_FOLDER_HASH_GITIGNORE = f"/{BUILD_FOLDER_HASH_GITIGNORE_FILE_NAME}\n/{BUILD_FOLDER_HASH_CACHE_FILE_NAME}\n"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class FileDigest:
+    mtime_ns: int
+    size: int
+    inode: int
+    # None if the file isn't a text file.
+    digest: Optional[str]
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return (self.mtime_ns, self.size, self.inode) == (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def hash_file(path: str) -> Optional[str]:
+    """Returns the sha256 digest of the file, or None if it isn't a UTF-8 text file. The file is read in chunks."""
+    hasher = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                decoder.decode(chunk)
+                hasher.update(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return None
+
+    return hasher.hexdigest()
+
+
+def hash_tree(file_digests: dict[str, str]) -> str:
+    """
+    Returns the digest of the folder with the given file digests (keyed by the file names relative to the folder).
+    Folders without files don't contribute to the digest, as in git.
+    """
+    tree: dict = {}
+    for file_name, digest in file_digests.items():
+        *folders, name = file_name.replace(os.sep, "/").split("/")
+        subtree = tree
+        for folder in folders:
+            subtree = subtree.setdefault(folder, {})
+        subtree[name] = digest
+
+    def hash_subtree(subtree: dict) -> str:
+        hasher = hashlib.sha256()
+        for name in sorted(subtree):
+            if isinstance(subtree[name], dict):
+                entry = f"tree {hash_subtree(subtree[name])} {json.dumps(name)}\n"
+            else:
+                entry = f"blob {subtree[name]} {json.dumps(name)}\n"
+            hasher.update(entry.encode())
+        return hasher.hexdigest()
+
+    return hash_subtree(tree)
+
+
+def get_build_folder_hash_cache_path(cache_folder: str) -> str:
+    return os.path.join(cache_folder, BUILD_FOLDER_HASH_CACHE_FILE_NAME)
+
+
+def load_file_digests(cache_path: str, build_folder: str) -> dict[str, FileDigest]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(cache, dict) or cache.get("version") != BUILD_FOLDER_HASH_CACHE_VERSION:
+        return {}
+
+    # The digests of another build folder (e.g. after the required module changed).
+    if cache.get("build_folder") != os.path.abspath(build_folder):
+        return {}
+
+    return {file_name: FileDigest(*entry) for file_name, entry in cache["files"].items()}
+
+
+def save_file_digests(cache_path: str, build_folder: str, file_digests: dict[str, FileDigest]):
+    codeplain_folder = os.path.dirname(cache_path)
+    os.makedirs(codeplain_folder, exist_ok=True)
+
+    gitignore_path = os.path.join(codeplain_folder, BUILD_FOLDER_HASH_GITIGNORE_FILE_NAME)
+    if not os.path.exists(gitignore_path):
+        with open(gitignore_path, "w", encoding="utf-8") as f:
+            f.write(BUILD_FOLDER_HASH_GITIGNORE)
+
+    cache = {
+        "version": BUILD_FOLDER_HASH_CACHE_VERSION,
+        "build_folder": os.path.abspath(build_folder),
+        "files": {
+            file_name: [file_digest.mtime_ns, file_digest.size, file_digest.inode, file_digest.digest]
+            for file_name, file_digest in file_digests.items()
+        },
+    }
+
+    # Written to a temporary file first, so that an interrupted write doesn't leave a corrupted cache behind.
+    fd, temporary_path = tempfile.mkstemp(dir=codeplain_folder, prefix=f"{BUILD_FOLDER_HASH_CACHE_FILE_NAME}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        os.remove(temporary_path)
+        raise
+
+
+def calculate_build_folder_hash(build_folder: str, cache_folder: Optional[str] = None) -> str:
+    """
+    Returns the Merkle hash of the text files of the build folder (the files listed by `list_all_text_files`).
+
+    If a cache folder is given, the file digests are persisted there, and only the files that are new or whose
+    modification time, size or inode changed since the previous call are read. The build folder itself is never
+    written to, as it's usually the build folder of another (required) module.
+    """
+    cache_path = get_build_folder_hash_cache_path(cache_folder) if cache_folder is not None else None
+    cached_file_digests = load_file_digests(cache_path, build_folder) if cache_path is not None else {}
+
+    files = [
+        (root, filename, file_name, os.stat(os.path.join(root, filename)))
+        for root, filename, file_name in file_utils.walk_files(build_folder)
+    ]
+
+    file_digests = {}
+    changed_files = []
+    for file in files:
+        cached_file_digest = cached_file_digests.get(file[2])
+        if cached_file_digest is not None and cached_file_digest.matches(file[3]):
+            file_digests[file[2]] = cached_file_digest
+        else:
+            changed_files.append(file)
+
+    hash_time_ns = time.time_ns()
+    digests = file_utils.map_files(hash_file, [os.path.join(root, filename) for root, filename, _, _ in changed_files])
+
+    racy_files = set()
+    for (root, filename, file_name, stat), digest in zip(changed_files, digests):
+        file_digests[file_name] = FileDigest(stat.st_mtime_ns, stat.st_size, stat.st_ino, digest)
+        # Files modified around the time they were hashed could change again without their modification time
+        # changing, so they are hashed again next time (see BuildFolderSnapshotEntry.racy).
+        if stat.st_mtime_ns >= hash_time_ns - file_utils.BUILD_FOLDER_SNAPSHOT_RACY_WINDOW_NS:
+            racy_files.add(file_name)
+        if digest is None:
+            print(f"WARNING! Not listing {filename} in {root}. File is not a text file. Skipping it.")
+
+    persisted_file_digests = {
+        file_name: file_digest for file_name, file_digest in file_digests.items() if file_name not in racy_files
+    }
+    if cache_path is not None and persisted_file_digests != cached_file_digests and os.path.isdir(build_folder):
+        save_file_digests(cache_path, build_folder, persisted_file_digests)
+
+    root_digest = hash_tree(
+        {
+            file_name: file_digest.digest
+            for file_name, file_digest in file_digests.items()
+            if file_digest.digest is not None
+        }
+    )
+    return plain_spec.hash_text(f"folder={build_folder}|{root_digest}")
+
+
+def calculate_legacy_build_folder_hash(build_folder: str) -> str:
+    """
+    Returns the hash of the build folder stored in module metadata before the Merkle hash was introduced: the sha256
+    of the JSON of the contents of all the text files. The JSON is hashed as it's generated, one file at a time. The
+    ignore rules didn't exist then, so the ignored files are hashed too.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"folder={build_folder}|{{".encode())
+    separator = ""
+    for root, filename, file_name in file_utils.walk_files(build_folder, apply_ignore_rules=False):
+        content = file_utils.read_text_file(os.path.join(root, filename))
+        if content is None:
+            continue
+
+        hasher.update(f"{separator}{json.dumps(file_name)}: {json.dumps(content)}".encode())
+        separator = ", "
+
+    hasher.update(b"}")
+    return hasher.hexdigest()
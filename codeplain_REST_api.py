@@ -1,25 +1,255 @@
+import asyncio
+import gzip
+import json
+import logging
+import threading
 import time
-from typing import Optional
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
 import plain2code_exceptions
+import plain_spec
+from api_metrics import ApiMetrics
 from plain2code_state import RunState
+from response_store import ResponseStore
+from retry_policy import RetryPolicy
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 30  # seconds
+# Generation endpoints can legitimately take many minutes, so by default we don't limit how long we wait for a response.
+DEFAULT_READ_TIMEOUT = None
+# Endpoints that only do bookkeeping on the server side and are expected to respond quickly.
+DEFAULT_ENDPOINT_READ_TIMEOUTS = {
+    "generate_folder_name_from_functional_requirement": 120,
+    "finish_functional_requirement": 120,
+    "fail_functional_requirement": 120,
+}
+
+# Streamed responses: the server sends a newline-delimited JSON document with one `{"type": "file", ...}` line per
+# generated file, followed by a `{"type": "result", ...}` line with the rest of the response (or a `{"type": "error"}`
+# line with the error response).
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+# Endpoints that can stream their files, with the field of the response that holds the files
+# (None if the whole response is the files dict).
+STREAMED_FILES_FIELDS = {
+    "render_functional_requirement": None,
+    "render_conformance_tests": "patched_response_files",
+}
+
+# Request bodies smaller than this are sent uncompressed since compressing them doesn't pay off.
+DEFAULT_COMPRESSION_THRESHOLD = 16 * 1024  # bytes
+# Content codings the client can compress request bodies with, in order of preference.
+REQUEST_ENCODINGS = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+# Content-addressed file upload: payload fields holding `{path: content}` dicts are sent as `{path: sha256}` under
+# `<field>_hashes`, and the bodies the server doesn't have yet are sent once under `file_blobs` as `{sha256: content}`.
+CONTENT_ADDRESSED_FILE_FIELDS = [
+    "existing_files_content",
+    "memory_files_content",
+    "conformance_tests_files",
+    "conformance_test_files_content",
+]
+CONTENT_ADDRESSED_FIELD_SUFFIX = "_hashes"
+FILE_BLOBS_FIELD = "file_blobs"
+# Returned by the server (with the list of digests in `missing_blobs`) when it doesn't have some of the referenced bodies.
+MISSING_FILE_BLOBS_ERROR_CODE = "MissingFileBlobs"
+
+# Render session cache: fields that are the same across most calls of a render are stored on the server under their
+# hash the first time they're sent (`session_cache_keys`) and later only referenced by it (`session_cache_refs`).
+SESSION_CACHED_FIELDS = [
+    "plain_source_tree",
+    "linked_resources",
+]
+SESSION_CACHE_KEYS_FIELD = "session_cache_keys"
+SESSION_CACHE_REFS_FIELD = "session_cache_refs"
+# Returned by the server (with the list of hashes in `missing_refs`) when it doesn't have some of the referenced fields.
+SESSION_CACHE_MISS_ERROR_CODE = "SessionCacheMiss"
+# How many times a request is resent after the server reports missing cached content (file bodies or session fields).
+MAX_CACHE_MISS_RESENDS = 2
 
-MAX_RETRIES = 4
-RETRY_DELAY = 3
 
-# TODO: Handle connection errors
-RETRY_ERROR_CODES = [
-    "LLMInternalError",
-]
+@dataclass
+class RequestSizes:
+    """Sizes of the request bodies sent for an API call, summed over its retries and resends."""
+
+    # The JSON bodies, after content-addressed files and session cached fields were replaced by their hashes.
+    body_bytes: int = 0
+    # The bodies as sent, i.e. after compression.
+    sent_bytes: int = 0
+
+
+# The sizes of the requests of the API call in progress (set while metrics are recorded).
+current_request_sizes: ContextVar[Optional[RequestSizes]] = ContextVar("current_request_sizes", default=None)
+
+
+@dataclass
+class ConnectionStats:
+    """Counts of the TCP (+TLS) connections opened and the requests sent over the pooled session."""
+
+    connections_opened: int = 0
+    requests_sent: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        return self.requests_sent - self.connections_opened
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that counts the requests it sends and the connections (handshakes) it has to open for them."""
+
+    def __init__(self, pool_size: int):
+        self._stats = ConnectionStats()
+        self._stats_lock = threading.Lock()
+        # Retries are handled in CodeplainAPI.post_request, not by the adapter.
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        adapter = self
+
+        class CountingHTTPConnection(HTTPConnection):
+            def connect(self):
+                super().connect()
+                adapter._record_connection_opened()
+
+        class CountingHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                super().connect()
+                adapter._record_connection_opened()
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = CountingHTTPConnection
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = CountingHTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+    def _record_connection_opened(self):
+        with self._stats_lock:
+            self._stats.connections_opened += 1
+
+    def send(self, request, *args, **kwargs):
+        with self._stats_lock:
+            self._stats.requests_sent += 1
+        return super().send(request, *args, **kwargs)
+
+    def get_stats(self) -> ConnectionStats:
+        with self._stats_lock:
+            return ConnectionStats(self._stats.connections_opened, self._stats.requests_sent)
+
+
+def get_endpoint_name(endpoint_url: str) -> str:
+    return endpoint_url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor().compress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+class UploadManifest:
+    """Tracks, per render_id, the sha256 digests of the content that has already been uploaded to the server."""
+
+    def __init__(self):
+        self._uploaded: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def is_uploaded(self, render_id: str, digest: str) -> bool:
+        with self._lock:
+            return digest in self._uploaded.get(render_id, set())
+
+    def mark_uploaded(self, render_id: str, digests):
+        with self._lock:
+            self._uploaded.setdefault(render_id, set()).update(digests)
+
+    def forget(self, render_id: str, digests):
+        with self._lock:
+            self._uploaded.get(render_id, set()).difference_update(digests)
+
+    def uploaded_count(self, render_id: str) -> int:
+        with self._lock:
+            return len(self._uploaded.get(render_id, set()))
 
 
 class CodeplainAPI:
 
-    def __init__(self, api_key, console):
+    def __init__(
+        self,
+        api_key,
+        console,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keep_alive: bool = True,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        endpoint_read_timeouts: Optional[dict[str, Optional[float]]] = None,
+        content_addressed_files: bool = False,
+        render_session_cache: bool = False,
+        compress_requests: bool = False,
+        compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        response_store: Optional[ResponseStore] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        stream_responses: bool = False,
+        metrics: Optional[ApiMetrics] = None,
+    ):
         self.api_key = api_key
         self.console = console
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.endpoint_read_timeouts: dict[str, Optional[float]] = dict(DEFAULT_ENDPOINT_READ_TIMEOUTS)
+        if endpoint_read_timeouts is not None:
+            self.endpoint_read_timeouts.update(endpoint_read_timeouts)
+        self.content_addressed_files = content_addressed_files
+        self.file_upload_manifest = UploadManifest()
+        self.render_session_cache = render_session_cache
+        self.render_session_manifest = UploadManifest()
+        self.compress_requests = compress_requests
+        self.compression_threshold = compression_threshold
+        # Request content codings advertised by the server (via the `Accept-Encoding` response header).
+        # Until the server advertises any, request bodies are sent as plain JSON.
+        self.server_request_encodings: list[str] = []
+        # When set, responses are recorded to the store, or, in replay mode, served from it without network access.
+        self.response_store = response_store
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        # When enabled, the generation endpoints that support it stream the generated files one at a time.
+        self.stream_responses = stream_responses
+        # When set, the size, token count and latency of every call are recorded.
+        self.metrics = metrics
+
+        # A single session keeps the connections to the API alive between calls so that consecutive requests
+        # don't pay for a new TCP and TLS handshake.
+        self._adapter = PooledHTTPAdapter(pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
 
     @property
     def api_url(self):
@@ -29,27 +259,334 @@ class CodeplainAPI:
     def api_url(self, value):
         self._api_url = value
 
+    def get_timeout(self, endpoint_url: str) -> tuple[Optional[float], Optional[float]]:
+        return self.connect_timeout, self.endpoint_read_timeouts.get(get_endpoint_name(endpoint_url), self.read_timeout)
+
+    def get_connection_stats(self) -> ConnectionStats:
+        return self._adapter.get_stats()
+
+    def close(self):
+        self.session.close()
+
     def _extend_payload_with_run_state(self, payload: dict, run_state: RunState):
-        run_state.increment_call_count()
-        payload["render_state"] = run_state.to_dict()
+        payload["render_state"] = run_state.next_call_state()
+
+    def _get_request_encoding(self, body_size: int) -> Optional[str]:
+        if not self.compress_requests or body_size < self.compression_threshold:
+            return None
+
+        for encoding in REQUEST_ENCODINGS:
+            if encoding in self.server_request_encodings:
+                return encoding
+
+        return None
+
+    def _update_server_request_encodings(self, response: requests.Response):
+        accept_encoding = response.headers.get("Accept-Encoding")
+        if accept_encoding is not None:
+            self.server_request_encodings = [
+                encoding.split(";")[0].strip().lower() for encoding in accept_encoding.split(",") if encoding.strip()
+            ]
+
+    def _record_request_size(self, body: bytes, sent_body: bytes):
+        request_sizes = current_request_sizes.get()
+        if request_sizes is not None:
+            request_sizes.body_bytes += len(body)
+            request_sizes.sent_bytes += len(sent_body)
+
+    def _post(self, endpoint_url, headers, payload) -> requests.Response:
+        body = json.dumps(payload, allow_nan=False).encode("utf-8")
+        stream = NDJSON_CONTENT_TYPE in headers.get("Accept", "")
+
+        encoding = self._get_request_encoding(len(body))
+        if encoding is not None:
+            compressed_body = compress(body, encoding)
+            logging.debug(
+                f"Request to {endpoint_url}: {len(body)} bytes uncompressed, {len(compressed_body)} bytes {encoding}."
+            )
+            self._record_request_size(body, compressed_body)
+            response = self.session.post(
+                endpoint_url,
+                headers={**headers, "Content-Encoding": encoding},
+                data=compressed_body,
+                timeout=self.get_timeout(endpoint_url),
+                stream=stream,
+            )
+            if response.status_code != requests.codes.unsupported_media_type:
+                self._update_server_request_encodings(response)
+                return response
+
+            # The server no longer accepts compressed requests, fall back to plain JSON.
+            logging.debug(f"Server rejected {encoding} request body, falling back to uncompressed requests.")
+            self.server_request_encodings = []
+        else:
+            logging.debug(f"Request to {endpoint_url}: {len(body)} bytes uncompressed.")
+
+        self._record_request_size(body, body)
+        response = self.session.post(
+            endpoint_url, headers=headers, data=body, timeout=self.get_timeout(endpoint_url), stream=stream
+        )
+        self._update_server_request_encodings(response)
+        return response
+
+    def _encode_content_addressed_payload(self, payload: dict, render_id: str) -> tuple[dict, dict[str, str]]:
+        """
+        Replaces the file content dicts in the payload with `{path: sha256}` dicts and attaches only the file bodies
+        that haven't been uploaded for this render yet.
+
+        Returns the encoded payload and all the file bodies it references, keyed by their sha256.
+        """
+        encoded_payload = dict(payload)
+        blobs: dict[str, str] = {}
+        for field in CONTENT_ADDRESSED_FILE_FIELDS:
+            files = payload.get(field)
+            if not isinstance(files, dict):
+                continue
+
+            file_hashes = {}
+            for file_name, content in files.items():
+                if not isinstance(content, str):
+                    file_hashes[file_name] = content
+                    continue
+
+                digest = plain_spec.hash_text(content)
+                file_hashes[file_name] = digest
+                blobs[digest] = content
+
+            del encoded_payload[field]
+            encoded_payload[field + CONTENT_ADDRESSED_FIELD_SUFFIX] = file_hashes
+
+        encoded_payload[FILE_BLOBS_FIELD] = {
+            digest: content
+            for digest, content in blobs.items()
+            if not self.file_upload_manifest.is_uploaded(render_id, digest)
+        }
+        return encoded_payload, blobs
+
+    def _encode_session_cached_payload(self, payload: dict, render_id: str) -> tuple[dict, dict[str, str]]:
+        """
+        Replaces the session cached fields that the server already stores for this render with references to them.
+        The fields that are sent in full are tagged with their hash so that the server can store them.
+
+        Returns the encoded payload and the hashes of all the session cached fields in it.
+        """
+        encoded_payload = dict(payload)
+        field_hashes: dict[str, str] = {}
+        session_cache_keys = {}
+        session_cache_refs = {}
+        for field in SESSION_CACHED_FIELDS:
+            if field not in payload:
+                continue
+
+            digest = plain_spec.hash_text(json.dumps(payload[field], sort_keys=True))
+            field_hashes[field] = digest
+            if self.render_session_manifest.is_uploaded(render_id, digest):
+                del encoded_payload[field]
+                session_cache_refs[field] = digest
+            else:
+                session_cache_keys[field] = digest
+
+        if session_cache_keys:
+            encoded_payload[SESSION_CACHE_KEYS_FIELD] = session_cache_keys
+        if session_cache_refs:
+            encoded_payload[SESSION_CACHE_REFS_FIELD] = session_cache_refs
+        return encoded_payload, field_hashes
+
+    def _handle_cache_miss(self, response: requests.Response, render_id: str) -> bool:
+        """
+        Checks whether the server rejected the request because it's missing previously uploaded content
+        (e.g. its cache was evicted). If so, forgets that the content was uploaded so that it's sent in full again.
+        """
+        if response.status_code != requests.codes.bad_request:
+            return False
+
+        try:
+            response_json = response.json()
+        except requests.exceptions.JSONDecodeError:
+            return False
+
+        if response_json.get("error_code") == MISSING_FILE_BLOBS_ERROR_CODE:
+            missing_digests = response_json.get("missing_blobs", [])
+            logging.debug(f"Re-uploading {len(missing_digests)} file(s) missing on the server.")
+            self.file_upload_manifest.forget(render_id, missing_digests)
+            return True
+
+        if response_json.get("error_code") == SESSION_CACHE_MISS_ERROR_CODE:
+            missing_digests = response_json.get("missing_refs", [])
+            logging.debug(f"Render session cache miss on the server, re-sending {len(missing_digests)} field(s).")
+            self.render_session_manifest.forget(render_id, missing_digests)
+            return True
+
+        return False
+
+    def _send_request(self, endpoint_url, headers, payload, run_state: Optional[RunState]) -> requests.Response:
+        if run_state is None or not (self.content_addressed_files or self.render_session_cache):
+            return self._post(endpoint_url, headers, payload)
+
+        render_id = run_state.render_id
+        # Cache misses aren't errors so resending after them doesn't count as a retry attempt.
+        for _ in range(MAX_CACHE_MISS_RESENDS + 1):
+            request_payload = payload
+            field_hashes: dict[str, str] = {}
+            blobs: dict[str, str] = {}
+            if self.render_session_cache:
+                request_payload, field_hashes = self._encode_session_cached_payload(request_payload, render_id)
+            if self.content_addressed_files:
+                request_payload, blobs = self._encode_content_addressed_payload(request_payload, render_id)
+
+            response = self._post(endpoint_url, headers, request_payload)
+            if response.ok:
+                self.render_session_manifest.mark_uploaded(render_id, field_hashes.values())
+                self.file_upload_manifest.mark_uploaded(render_id, blobs.keys())
+                return response
+
+            if not self._handle_cache_miss(response, render_id):
+                return response
+
+        return response
+
+    def _read_streamed_response(
+        self,
+        response: requests.Response,
+        endpoint_url: str,
+        on_file: Optional[Callable[[str, Optional[str]], None]],
+        received_lines: Optional[list[str]] = None,
+    ) -> tuple[int, Any]:
+        """
+        Reads a streamed (NDJSON) response, passing each file to `on_file` as soon as it arrives. If `received_lines`
+        is given, the lines of the response are appended to it as they're read.
+
+        Returns the status code and the response assembled into the same shape as the non-streamed response.
+        """
+        files: dict[str, Optional[str]] = {}
+        for line in response.iter_lines():
+            if not line:
+                continue
+
+            if received_lines is not None:
+                received_lines.append(line.decode("utf-8"))
+
+            message = json.loads(line)
+            if message["type"] == "file":
+                files[message["name"]] = message["content"]
+                logging.info(f"Received file {message['name']} ({len(files)} so far).")
+                if on_file is not None:
+                    on_file(message["name"], message["content"])
+            elif message["type"] == "error":
+                return message.get("status_code", requests.codes.bad_request), message["response"]
+            elif message["type"] == "result":
+                files_field = STREAMED_FILES_FIELDS[get_endpoint_name(endpoint_url)]
+                if files_field is None:
+                    return response.status_code, files
+
+                response_json = message["response"]
+                response_json[files_field] = files
+                return response.status_code, response_json
+
+        raise requests.exceptions.ConnectionError("The response stream ended before the result was received.")
+
+    def post_request(
+        self,
+        endpoint_url,
+        headers,
+        payload,
+        run_state: Optional[RunState],
+        on_file: Optional[Callable[[str, Optional[str]], None]] = None,
+        on_discard: Optional[Callable[[], None]] = None,
+    ):
+        if self.metrics is None:
+            return self._post_request(endpoint_url, headers, payload, run_state, on_file, on_discard)
+
+        start_time = time.monotonic()
+        error = None
+        request_sizes = RequestSizes()
+        token = current_request_sizes.set(request_sizes)
+        try:
+            return self._post_request(endpoint_url, headers, payload, run_state, on_file, on_discard)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            current_request_sizes.reset(token)
+            self.metrics.record(
+                get_endpoint_name(endpoint_url),
+                payload,
+                time.monotonic() - start_time,
+                error,
+                body_bytes=request_sizes.body_bytes,
+                sent_bytes=request_sizes.sent_bytes,
+            )
+
+    def _post_request(  # noqa: C901
+        self,
+        endpoint_url,
+        headers,
+        payload,
+        run_state: Optional[RunState],
+        on_file: Optional[Callable[[str, Optional[str]], None]] = None,
+        on_discard: Optional[Callable[[], None]] = None,
+    ):
+        if self.stream_responses and get_endpoint_name(endpoint_url) in STREAMED_FILES_FIELDS:
+            headers = {**headers, "Accept": f"{NDJSON_CONTENT_TYPE}, application/json"}
 
-    def post_request(self, endpoint_url, headers, payload, run_state: Optional[RunState]):  # noqa: C901
         if run_state is not None:
             self._extend_payload_with_run_state(payload, run_state)
 
-        retry_delay = RETRY_DELAY
-        response_json = None
-        for attempt in range(MAX_RETRIES + 1):
-            try:
-                response = requests.post(endpoint_url, headers=headers, json=payload)
+        use_response_store = self.response_store is not None and run_state is not None
+        replay = use_response_store and self.response_store.replay
+        record = use_response_store and not self.response_store.replay
 
+        retries = self.retry_policy.start_request()
+        while True:
+            response = None
+            try:
+                retries.before_attempt()
                 try:
-                    response_json = response.json()
-                except requests.exceptions.JSONDecodeError as e:
-                    print(f"Failed to decode JSON response: {e}. Response text: {response.text}")
+                    if replay:
+                        response = self.response_store.load(get_endpoint_name(endpoint_url), payload, retries.attempt)
+                    else:
+                        response = self._send_request(endpoint_url, headers, payload, run_state)
+                except requests.exceptions.RequestException as e:
+                    if record:
+                        self.response_store.record_error(get_endpoint_name(endpoint_url), payload, retries.attempt, e)
                     raise
 
-                if response.status_code == requests.codes.bad_request and "error_code" in response_json:
+                is_streamed = response.headers.get("Content-Type", "").startswith(NDJSON_CONTENT_TYPE)
+                # Streamed responses are recorded as they're read, since reading the body consumes the stream.
+                received_lines: Optional[list[str]] = None
+                if record:
+                    if is_streamed and response.ok:
+                        received_lines = []
+                    else:
+                        self.response_store.record(get_endpoint_name(endpoint_url), payload, retries.attempt, response)
+
+                status_code = response.status_code
+                if status_code >= 500 or status_code == requests.codes.too_many_requests:
+                    # Checked before decoding the body, as error pages of proxies and load balancers aren't JSON.
+                    response.raise_for_status()
+
+                if is_streamed:
+                    try:
+                        status_code, response_json = self._read_streamed_response(
+                            response, endpoint_url, on_file, received_lines
+                        )
+                    finally:
+                        if received_lines is not None:
+                            self.response_store.record(
+                                get_endpoint_name(endpoint_url),
+                                payload,
+                                retries.attempt,
+                                response,
+                                body="\n".join(received_lines),
+                            )
+                else:
+                    try:
+                        response_json = response.json()
+                    except requests.exceptions.JSONDecodeError as e:
+                        print(f"Failed to decode JSON response: {e}. Response text: {response.text}")
+                        raise
+
+                if status_code == requests.codes.bad_request and "error_code" in response_json:
                     if response_json["error_code"] == "FunctionalRequirementTooComplex":
                         raise plain2code_exceptions.FunctionalRequirementTooComplex(
                             response_json["message"], response_json.get("proposed_breakdown")
@@ -74,23 +611,36 @@ class CodeplainAPI:
                         raise plain2code_exceptions.InternalServerError(response_json["message"])
 
                 response.raise_for_status()
+                if status_code >= 400:
+                    raise requests.exceptions.HTTPError(
+                        f"{status_code} error in the streamed response from {endpoint_url}", response=response
+                    )
+                retries.record_success()
                 return response_json
 
+            except plain2code_exceptions.ServiceUnavailable:
+                raise
             except Exception as e:
-                if response_json is not None and "error_code" in response_json:
-                    if response_json["error_code"] not in RETRY_ERROR_CODES:
-                        raise e
-
-                if attempt < MAX_RETRIES:
-                    self.console.info(f"Error on attempt {attempt + 1}/{MAX_RETRIES + 1}: {e}")
-                    self.console.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    # Exponential backoff
-                    retry_delay *= 2
-                else:
-                    self.console.error(f"Max retries ({MAX_RETRIES}) exceeded. Last error: {e}")
+                if on_discard is not None:
+                    # Files streamed during a failed attempt mustn't outlive it.
+                    on_discard()
+
+                decision = retries.on_failure(e, response)
+                if not decision.retry:
+                    if decision.category is not None:
+                        self.console.error(
+                            f"Giving up after {retries.attempt} attempts ({decision.reason}). Last error: {e}"
+                        )
                     raise e
 
+                self.console.info(f"Error on attempt {retries.attempt}: {e}")
+                if replay:
+                    # The recorded attempts are replayed without waiting, as no request reaches the server.
+                    self.console.info("Retrying the recorded attempt...")
+                else:
+                    self.console.info(f"Retrying in {decision.delay:.1f} seconds...")
+                    time.sleep(decision.delay)
+
     def render_functional_requirement(
         self,
         frid: str,
@@ -101,6 +651,8 @@ class CodeplainAPI:
         module_name: str,
         required_modules: dict,
         run_state: RunState,
+        on_file: Optional[Callable[[str, Optional[str]], None]] = None,
+        on_discard: Optional[Callable[[], None]] = None,
     ) -> dict[str, str]:
         """
         Renders the content of a functional requirement based on the provided ID,
@@ -121,6 +673,10 @@ class CodeplainAPI:
             required_modules (dict): A dictionary where the keys represent module names
                                      and the values are lists of functionalities implemented in those modules.
             run_state (RunState): The current state of the rendering process.
+            on_file (Callable, optional): Called with the filename and the content of each file as soon as it's
+                                          received when streaming responses.
+            on_discard (Callable, optional): Called when an attempt fails, to discard the files passed to `on_file`
+                                             during the attempt.
         Returns:
             dict[str, str]: A dictionary where the keys are filenames and the values
                             are the rendered code for those files.
@@ -141,7 +697,7 @@ class CodeplainAPI:
             "required_modules": required_modules,
         }
 
-        return self.post_request(endpoint_url, headers, payload, run_state)
+        return self.post_request(endpoint_url, headers, payload, run_state, on_file, on_discard)
 
     def fix_unittests_issue(
         self,
@@ -234,6 +790,8 @@ class CodeplainAPI:
         conformance_tests_json,
         all_acceptance_tests,
         run_state: RunState,
+        on_file: Optional[Callable[[str, Optional[str]], None]] = None,
+        on_discard: Optional[Callable[[], None]] = None,
     ):
         endpoint_url = f"{self.api_url}/render_conformance_tests"
         headers = {"X-API-Key": self.api_key, "Content-Type": "application/json"}
@@ -252,7 +810,7 @@ class CodeplainAPI:
             "all_acceptance_tests": all_acceptance_tests,
         }
 
-        response = self.post_request(endpoint_url, headers, payload, run_state)
+        response = self.post_request(endpoint_url, headers, payload, run_state, on_file, on_discard)
         return response["patched_response_files"], response["conformance_tests_plan_summary_string"]
 
     def generate_folder_name_from_functional_requirement(
@@ -442,3 +1000,39 @@ class CodeplainAPI:
         }
 
         return self.post_request(endpoint_url, headers, payload, run_state)
+
+
+def _async_endpoint(name: str):
+    async def endpoint(self, *args, **kwargs):
+        return await asyncio.to_thread(getattr(self.api, name), *args, **kwargs)
+
+    endpoint.__name__ = name
+    endpoint.__doc__ = getattr(CodeplainAPI, name).__doc__
+    return endpoint
+
+
+class AsyncCodeplainAPI:
+    """
+    Asyncio variant of CodeplainAPI with the same endpoints as coroutines.
+
+    Each request runs in a worker thread over the wrapped client's pooled session, so several requests can be in flight
+    at once (up to the pool size) while sharing its connections, caches and retry handling.
+    """
+
+    def __init__(self, api: CodeplainAPI):
+        self.api = api
+
+    render_functional_requirement = _async_endpoint("render_functional_requirement")
+    fix_unittests_issue = _async_endpoint("fix_unittests_issue")
+    create_conformance_test_memory = _async_endpoint("create_conformance_test_memory")
+    refactor_source_files_if_needed = _async_endpoint("refactor_source_files_if_needed")
+    render_conformance_tests = _async_endpoint("render_conformance_tests")
+    generate_folder_name_from_functional_requirement = _async_endpoint(
+        "generate_folder_name_from_functional_requirement"
+    )
+    fix_conformance_tests_issue = _async_endpoint("fix_conformance_tests_issue")
+    render_acceptance_tests = _async_endpoint("render_acceptance_tests")
+    analyze_rendering = _async_endpoint("analyze_rendering")
+    finish_functional_requirement = _async_endpoint("finish_functional_requirement")
+    fail_functional_requirement = _async_endpoint("fail_functional_requirement")
+    summarize_finished_conformance_tests = _async_endpoint("summarize_finished_conformance_tests")
@@ -0,0 +1,411 @@
+"""
+A local stand-in for the Codeplain API, used to exercise the client without network access.
+
+It serves every endpoint CodeplainAPI calls with deterministic canned responses, and can add latency and inject errors
+so that the client's overhead and retry behavior can be measured offline. To render against it, run
+
+    python codeplain_mock_server.py --port 8080 --latency 0.5
+
+and pass `--api http://127.0.0.1:8080` to plain2code.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from codeplain_REST_api import (
+    CONTENT_ADDRESSED_FIELD_SUFFIX,
+    CONTENT_ADDRESSED_FILE_FIELDS,
+    FILE_BLOBS_FIELD,
+    MISSING_FILE_BLOBS_ERROR_CODE,
+    NDJSON_CONTENT_TYPE,
+    REQUEST_ENCODINGS,
+    SESSION_CACHE_KEYS_FIELD,
+    SESSION_CACHE_MISS_ERROR_CODE,
+    SESSION_CACHE_REFS_FIELD,
+    STREAMED_FILES_FIELDS,
+    decompress,
+)
+
+LLM_INTERNAL_ERROR = "llm_internal_error"
+SERVER_ERROR = "server_error"
+MALFORMED_JSON = "malformed_json"
+# A proxy's or load balancer's error page, which isn't JSON.
+BAD_GATEWAY = "bad_gateway"
+INJECTABLE_ERRORS = [LLM_INTERNAL_ERROR, SERVER_ERROR, MALFORMED_JSON, BAD_GATEWAY]
+
+
+def _get_frid_name(payload: dict) -> str:
+    return "frid_" + str(payload.get("frid", "")).replace(".", "_")
+
+
+def _render_functional_requirement(payload: dict):
+    frid_name = _get_frid_name(payload)
+    return {f"{frid_name}.py": f"def {frid_name}():\n    return {payload.get('frid')!r}\n"}
+
+
+def _render_conformance_tests(payload: dict):
+    frid_name = _get_frid_name(payload)
+    return {
+        "patched_response_files": {
+            f"test_{frid_name}.py": f"def test_{frid_name}():\n    assert True\n",
+        },
+        "conformance_tests_plan_summary_string": f"Conformance tests for functional requirement {payload.get('frid')}.",
+    }
+
+
+def _generate_folder_name_from_functional_requirement(payload: dict):
+    folder_name = _get_frid_name(payload)
+    existing_folder_names = payload.get("existing_folder_names") or []
+    suffix = 1
+    while folder_name in existing_folder_names:
+        suffix += 1
+        folder_name = f"{_get_frid_name(payload)}_{suffix}"
+    return folder_name
+
+
+def _analyze_rendering(payload: dict):
+    return {"guidance": f"No ambiguities found in functional requirement {payload.get('frid')}."}
+
+
+# Canned responses of the API endpoints, in the shape CodeplainAPI's callers expect them. The responses that update
+# files only do so on the initial rendering, so that fixing and refactoring steps always converge.
+DEFAULT_RESPONSES = {
+    "render_functional_requirement": _render_functional_requirement,
+    "fix_unittests_issue": lambda _: {},
+    "create_conformance_test_memory": lambda _: {},
+    "refactor_source_files_if_needed": lambda _: {},
+    "render_conformance_tests": _render_conformance_tests,
+    "generate_folder_name_from_functional_requirement": _generate_folder_name_from_functional_requirement,
+    "fix_conformance_tests_issue": lambda _: [False, {}],
+    "render_acceptance_tests": lambda _: {},
+    "analyze_rendering": _analyze_rendering,
+    "finish_functional_requirement": lambda _: {},
+    "fail_functional_requirement": lambda _: {},
+    "summarize_finished_conformance_tests": lambda _: [],
+}
+
+
+@dataclass
+class ReceivedRequest:
+    """A request received by the mock server, with the payload as the endpoint sees it."""
+
+    endpoint: str
+    payload: dict
+    body_size: int
+    content_encoding: Optional[str] = None
+
+
+class MockCodeplainServer:
+    """
+    HTTP server that accepts the same requests as the Codeplain API and answers them with canned responses.
+
+    Every endpoint responds with the response set for it in `responses`, or with its canned default response.
+    Each response is delayed by `latency` seconds (or the endpoint's entry in `endpoint_latencies`).
+    Errors can be injected for specific requests with `inject_error`, or at random with `error_rate`.
+    If `supports_streaming` is set, the endpoints in STREAMED_FILES_FIELDS stream their files as NDJSON to clients that
+    accept it, with `stream_delay` seconds between the files. The next `broken_streams` streamed responses end after
+    their first file, without the result line.
+    Content-addressed file uploads and render session cache references are resolved against per-render_id stores
+    before the payload is recorded.
+    Compressed request bodies are accepted in the `request_encodings` codings, which are advertised to the client
+    in the `Accept-Encoding` response header.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        request_encodings: Optional[list[str]] = None,
+        latency: float = 0,
+        error_rate: float = 0,
+        seed: Optional[int] = None,
+    ):
+        self.host = host
+        self.request_encodings = list(REQUEST_ENCODINGS) if request_encodings is None else request_encodings
+        self.responses: dict[str, object] = {}
+        self.latency = latency
+        self.endpoint_latencies: dict[str, float] = {}
+        self.error_rate = error_rate
+        self.supports_streaming = True
+        self.stream_delay: float = 0
+        self.broken_streams = 0
+        self._random = random.Random(seed)
+        self._injected_errors: list[tuple[Optional[str], str]] = []
+        self.received_requests: list[ReceivedRequest] = []
+        self._file_blobs: dict[str, dict[str, str]] = {}
+        self._session_cache: dict[str, dict[str, object]] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._create_handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self._server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        """Serves requests in the current thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def inject_error(self, error: str, endpoint: Optional[str] = None, count: int = 1):
+        """Makes the next `count` requests (to the given endpoint, or to any endpoint) fail with the given error."""
+        if error not in INJECTABLE_ERRORS:
+            raise ValueError(f"Unknown error: {error}. Valid errors are: {INJECTABLE_ERRORS}.")
+
+        with self._lock:
+            self._injected_errors.extend([(endpoint, error)] * count)
+
+    def _get_injected_error(self, endpoint: str) -> Optional[str]:
+        with self._lock:
+            for index, (error_endpoint, error) in enumerate(self._injected_errors):
+                if error_endpoint is None or error_endpoint == endpoint:
+                    del self._injected_errors[index]
+                    return error
+
+            if self.error_rate > 0 and self._random.random() < self.error_rate:
+                return self._random.choice(INJECTABLE_ERRORS)
+
+        return None
+
+    def evict_file_blobs(self, render_id: Optional[str] = None):
+        """Forgets the uploaded file bodies (of a single render or all of them), as a server-side cache eviction would."""
+        with self._lock:
+            if render_id is None:
+                self._file_blobs.clear()
+            else:
+                self._file_blobs.pop(render_id, None)
+
+    def evict_render_session(self, render_id: Optional[str] = None):
+        """Forgets the render session cache (of a single render or all of them)."""
+        with self._lock:
+            if render_id is None:
+                self._session_cache.clear()
+            else:
+                self._session_cache.pop(render_id, None)
+
+    def _resolve_session_cache_refs(self, payload: dict) -> list[str]:
+        """
+        Stores the fields tagged with `session_cache_keys` and fills in the fields referenced in `session_cache_refs`.
+
+        Returns the referenced hashes that aren't in the session cache.
+        """
+        render_id = payload.get("render_state", {}).get("render_id")
+        with self._lock:
+            session_cache = self._session_cache.setdefault(render_id, {})
+            for field, digest in payload.pop(SESSION_CACHE_KEYS_FIELD, {}).items():
+                session_cache[digest] = payload[field]
+
+            missing_digests = []
+            for field, digest in payload.pop(SESSION_CACHE_REFS_FIELD, {}).items():
+                if digest in session_cache:
+                    payload[field] = session_cache[digest]
+                else:
+                    missing_digests.append(digest)
+
+        return sorted(missing_digests)
+
+    def _resolve_file_blobs(self, payload: dict) -> list[str]:
+        """
+        Replaces the `<field>_hashes` dicts in a content-addressed payload with the file contents.
+
+        Returns the digests of the file bodies that are neither in the payload nor in the blob store.
+        """
+        render_id = payload.get("render_state", {}).get("render_id")
+        with self._lock:
+            blob_store = self._file_blobs.setdefault(render_id, {})
+            blob_store.update(payload.pop(FILE_BLOBS_FIELD))
+
+            missing_digests: set[str] = set()
+            for field in CONTENT_ADDRESSED_FILE_FIELDS:
+                file_hashes = payload.pop(field + CONTENT_ADDRESSED_FIELD_SUFFIX, None)
+                if file_hashes is None:
+                    continue
+
+                files = {}
+                for file_name, digest in file_hashes.items():
+                    if not isinstance(digest, str):
+                        files[file_name] = digest
+                    elif digest in blob_store:
+                        files[file_name] = blob_store[digest]
+                    else:
+                        missing_digests.add(digest)
+                payload[field] = files
+
+        return sorted(missing_digests)
+
+    def handle_request(
+        self, endpoint: str, payload: dict, body_size: int, content_encoding: Optional[str] = None
+    ) -> tuple[int, str]:
+        """Returns the status code and the body of the response to the request."""
+        time.sleep(self.endpoint_latencies.get(endpoint, self.latency))
+
+        if endpoint not in DEFAULT_RESPONSES:
+            return 404, json.dumps({"message": f"Unknown endpoint: {endpoint}"})
+
+        if SESSION_CACHE_KEYS_FIELD in payload or SESSION_CACHE_REFS_FIELD in payload:
+            missing_digests = self._resolve_session_cache_refs(payload)
+            if missing_digests:
+                return 400, json.dumps(
+                    {
+                        "error_code": SESSION_CACHE_MISS_ERROR_CODE,
+                        "message": f"Missing {len(missing_digests)} render session cache entries.",
+                        "missing_refs": missing_digests,
+                    }
+                )
+
+        if FILE_BLOBS_FIELD in payload:
+            missing_digests = self._resolve_file_blobs(payload)
+            if missing_digests:
+                return 400, json.dumps(
+                    {
+                        "error_code": MISSING_FILE_BLOBS_ERROR_CODE,
+                        "message": f"Missing {len(missing_digests)} file bodies.",
+                        "missing_blobs": missing_digests,
+                    }
+                )
+
+        with self._lock:
+            self.received_requests.append(ReceivedRequest(endpoint, payload, body_size, content_encoding))
+
+        error = self._get_injected_error(endpoint)
+        if error == LLM_INTERNAL_ERROR:
+            return 400, json.dumps({"error_code": "LLMInternalError", "message": "Injected LLM internal error."})
+        if error == SERVER_ERROR:
+            return 500, json.dumps({"message": "Injected internal server error."})
+        if error == MALFORMED_JSON:
+            return 200, '{"malformed": '
+        if error == BAD_GATEWAY:
+            return 502, "<html><body><h1>502 Bad Gateway</h1></body></html>"
+
+        if endpoint in self.responses:
+            return 200, json.dumps(self.responses[endpoint])
+        return 200, json.dumps(DEFAULT_RESPONSES[endpoint](payload))
+
+    def get_streamed_messages(self, endpoint: str, response_text: str) -> Optional[list[dict]]:
+        """Splits a response into the messages of a streamed response, or returns None if it can't be streamed."""
+        try:
+            response_json = json.loads(response_text)
+        except json.JSONDecodeError:
+            return None
+
+        files_field = STREAMED_FILES_FIELDS[endpoint]
+        if files_field is None:
+            files, response_json = response_json, {}
+        else:
+            files = response_json.pop(files_field)
+
+        messages = [{"type": "file", "name": file_name, "content": content} for file_name, content in files.items()]
+        messages.append({"type": "result", "response": response_json})
+        return messages
+
+    def _create_handler_class(self):
+        server = self
+
+        class MockCodeplainRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send_streamed_response(self, messages: list[dict]):
+                self.send_response(200)
+                self.send_header("Content-Type", NDJSON_CONTENT_TYPE)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.send_header("Accept-Encoding", ", ".join(server.request_encodings))
+                self.end_headers()
+
+                with server._lock:
+                    is_broken = server.broken_streams > 0
+                    server.broken_streams -= is_broken
+                if is_broken:
+                    messages = messages[:1]
+
+                for index, message in enumerate(messages):
+                    if index > 0:
+                        time.sleep(server.stream_delay)
+                    chunk = (json.dumps(message) + "\n").encode()
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                content_encoding = self.headers.get("Content-Encoding")
+
+                if content_encoding is None:
+                    status, response_text = server.handle_request(self.path.strip("/"), json.loads(body), len(body))
+                elif content_encoding in server.request_encodings:
+                    payload = json.loads(decompress(body, content_encoding))
+                    status, response_text = server.handle_request(
+                        self.path.strip("/"), payload, len(body), content_encoding
+                    )
+                else:
+                    status, response_text = 415, json.dumps(
+                        {"message": f"Unsupported content encoding: {content_encoding}"}
+                    )
+
+                endpoint = self.path.strip("/")
+                if (
+                    status == 200
+                    and server.supports_streaming
+                    and endpoint in STREAMED_FILES_FIELDS
+                    and NDJSON_CONTENT_TYPE in self.headers.get("Accept", "")
+                ):
+                    messages = server.get_streamed_messages(endpoint, response_text)
+                    if messages is not None:
+                        self._send_streamed_response(messages)
+                        return
+
+                response_body = response_text.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response_body)))
+                self.send_header("Accept-Encoding", ", ".join(server.request_encodings))
+                self.end_headers()
+                self.wfile.write(response_body)
+
+            def log_message(self, *args):
+                pass
+
+        return MockCodeplainRequestHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Codeplain API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to listen on.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--latency", type=float, default=0, help="Delay of every response in seconds.")
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help=f"Probability of a request failing with a random error ({', '.join(INJECTABLE_ERRORS)}).",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the random errors.")
+    args = parser.parse_args()
+
+    server = MockCodeplainServer(args.host, args.port, latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    print(f"Mock Codeplain API listening on {server.url}")
+    server.serve_forever()
@@ -1,10 +1,10 @@
 import re
-from copy import deepcopy
+from collections import Counter
+from dataclasses import dataclass
 from typing import Optional
 
 import mistletoe
 import mistletoe.block_token
-import networkx as nx
 
 import plain_spec
 from plain2code_exceptions import PlainSyntaxError
@@ -18,52 +18,89 @@ DEFAULT_CONCEPTS = {
 }
 
 
-def extract_concepts_from_definition(text: str) -> tuple[list[str], list[str]]:
-    pattern = r"-\s(:[^\:]+:)(?:,\s*:[^\:]+:)*"
-    match = re.search(pattern, text)
+DEFINITION_PATTERN = re.compile(r"-\s(:[^\:]+:)(?:,\s*:[^\:]+:)*")
+CONCEPT_CANDIDATE_PATTERN = re.compile(r":[^\:]+:")
+CONCEPT_PATTERN = re.compile(r":[+\-\.0-9A-Z_a-z]+:")
 
-    if not match:
-        return list(), [
-            f"Syntax error: Invalid definition specification text: {text}. Should start with `- :<concept>:` (where <concept> is any string that does not contain `:`)."
-        ]
 
-    concept_candidates = re.findall(r":[^\:]+:", match.group())
-    valid_concepts = list[str]()
-    concept_re = r":[+\-\.0-9A-Z_a-z]+:"
+@dataclass(frozen=True)
+class ConceptTokens:
+    # Concepts defined by the text if it's a definition (`- :<concept>:, :<concept>: ...`).
+    defined_concepts: tuple[str, ...]
+    # All the concepts the text mentions, in order of appearance.
+    used_concepts: tuple[str, ...]
+    # Errors of the text as a definition.
+    definition_errors: tuple[str, ...]
+
+
+def tokenize_concepts(text: str) -> ConceptTokens:
+    used_concepts = tuple(CONCEPT_PATTERN.findall(text))
+
+    match = DEFINITION_PATTERN.search(text)
+    if not match:
+        return ConceptTokens(
+            defined_concepts=(),
+            used_concepts=used_concepts,
+            definition_errors=(
+                f"Syntax error: Invalid definition specification text: {text}. Should start with `- :<concept>:` (where <concept> is any string that does not contain `:`).",
+            ),
+        )
+
+    defined_concepts = list[str]()
     errors = list[str]()
-    for candidate in concept_candidates:
-        if re.match(concept_re, candidate):
-            valid_concepts.append(candidate)
+    for candidate in CONCEPT_CANDIDATE_PATTERN.findall(match.group()):
+        if CONCEPT_PATTERN.match(candidate):
+            defined_concepts.append(candidate)
         else:
             errors.append(
                 f"Syntax error: Invalid concept: {candidate}. Should contain only letters, numbers, hyphens and dots."
             )
 
-    return valid_concepts, errors
+    return ConceptTokens(
+        defined_concepts=tuple(defined_concepts), used_concepts=used_concepts, definition_errors=tuple(errors)
+    )
+
 
+def extract_concepts_from_definition(text: str) -> tuple[list[str], list[str]]:
+    concept_tokens = tokenize_concepts(text)
+    return list(concept_tokens.defined_concepts), list(concept_tokens.definition_errors)
 
-def extract_concepts_from_spec_text(text: str) -> str:
-    return re.findall(r":[+\-\.0-9A-Z_a-z]+:", text)
 
+def extract_concepts_from_spec_text(text: str) -> list[str]:
+    return CONCEPT_PATTERN.findall(text)
 
-def collect_concepts(plain_source) -> tuple[set[str], list[str]]:
+
+def tokenize_definitions(plain_source) -> list[ConceptTokens]:
     if plain_spec.DEFINITIONS not in plain_source:
-        return set(), list()
+        return []
+
+    return [tokenize_concepts(definition["markdown"]) for definition in plain_source[plain_spec.DEFINITIONS]]
+
+
+def collect_concepts(
+    plain_source, definition_tokens: Optional[list[ConceptTokens]] = None
+) -> tuple[list[str], list[str]]:
+    if definition_tokens is None:
+        definition_tokens = tokenize_definitions(plain_source)
 
     concepts = list[str]()
     errors = list[str]()
-    for definition in plain_source[plain_spec.DEFINITIONS]:
-        spec_text = definition["markdown"]
-        new_concepts, new_errors = extract_concepts_from_definition(spec_text)
-        errors.extend(new_errors)
-        concepts.extend(new_concepts)
+    for concept_tokens in definition_tokens:
+        errors.extend(concept_tokens.definition_errors)
+        concepts.extend(concept_tokens.defined_concepts)
 
     return concepts, errors
 
 
-def validate_concepts_in_spec(spec: dict, concepts: set[str], spec_group: str) -> list[str]:
+def validate_concepts_in_spec(
+    spec: dict, concepts: set[str], spec_group: str, concept_tokens: Optional[ConceptTokens] = None
+) -> list[str]:
     spec_text = spec["markdown"]
-    used_concepts = extract_concepts_from_spec_text(spec_text)
+    if concept_tokens is None:
+        used_concepts = extract_concepts_from_spec_text(spec_text)
+    else:
+        used_concepts = list(concept_tokens.used_concepts)
+
     errors = []
     for used_concept in used_concepts:
         if used_concept not in concepts and used_concept not in DEFAULT_CONCEPTS:
@@ -74,43 +111,51 @@ def validate_concepts_in_spec(spec: dict, concepts: set[str], spec_group: str) -
     return errors
 
 
-def validate_concepts_in_spec_group(spec_group, plain_source, concepts: set[str]) -> list[str]:
+def validate_concepts_in_spec_group(
+    spec_group, plain_source, concepts: set[str], spec_tokens: Optional[list[ConceptTokens]] = None
+) -> list[str]:
     if spec_group not in plain_source:
         return []
 
     errors = []
-    for spec in plain_source[spec_group]:
-        errors.extend(validate_concepts_in_spec(spec, concepts, spec_group))
+    for idx, spec in enumerate(plain_source[spec_group]):
+        concept_tokens = spec_tokens[idx] if spec_tokens is not None else None
+        errors.extend(validate_concepts_in_spec(spec, concepts, spec_group, concept_tokens))
 
     return errors
 
 
 def validate_concepts(marshalled_plain_source) -> list[str]:
     errors = list[str]()
-    concepts = deepcopy(DEFAULT_CONCEPTS)
-    tree_based_concepts = deepcopy(DEFAULT_CONCEPTS)
 
-    new_concepts, new_errors = collect_concepts(marshalled_plain_source)
+    # Every definition is tokenized once, both for the concepts it defines and the concepts it uses.
+    definition_tokens = tokenize_definitions(marshalled_plain_source)
+    new_concepts, new_errors = collect_concepts(marshalled_plain_source, definition_tokens)
     errors.extend(new_errors)
 
-    unique_new_concepts = set(new_concepts)
-    intersection = unique_new_concepts.intersection(concepts)
+    concept_counts = Counter(new_concepts)
+    unique_new_concepts = set(concept_counts)
+    intersection = unique_new_concepts.intersection(DEFAULT_CONCEPTS)
 
     if len(unique_new_concepts) < len(new_concepts) or (len(intersection) > 0):
-        misused_concepts = {concept for concept in new_concepts if new_concepts.count(concept) > 1}
+        misused_concepts = {concept for concept, count in concept_counts.items() if count > 1}
         misused_concepts.update(intersection)
         errors.append(f"Syntax error: Concepts were defined multiple times: {', '.join(misused_concepts)} .")
 
-    concepts.update(unique_new_concepts)
-    tmp_tree_based_concepts = tree_based_concepts.union(unique_new_concepts)
+    tree_based_concepts = DEFAULT_CONCEPTS.union(unique_new_concepts)
 
     for spec_group in [
         plain_spec.NON_FUNCTIONAL_REQUIREMENTS,
         plain_spec.TEST_REQUIREMENTS,
         plain_spec.FUNCTIONAL_REQUIREMENTS,
-        plain_spec.DEFINITIONS,
     ]:
-        errors.extend(validate_concepts_in_spec_group(spec_group, marshalled_plain_source, tmp_tree_based_concepts))
+        errors.extend(validate_concepts_in_spec_group(spec_group, marshalled_plain_source, tree_based_concepts))
+
+    errors.extend(
+        validate_concepts_in_spec_group(
+            plain_spec.DEFINITIONS, marshalled_plain_source, tree_based_concepts, definition_tokens
+        )
+    )
 
     if plain_spec.FUNCTIONAL_REQUIREMENTS in marshalled_plain_source:
         for func_spec in marshalled_plain_source[plain_spec.FUNCTIONAL_REQUIREMENTS]:
@@ -119,98 +164,227 @@ def validate_concepts(marshalled_plain_source) -> list[str]:
 
             acceptance_tests = func_spec["acceptance_tests"]
             for spec in acceptance_tests:
-                errors.extend(validate_concepts_in_spec(spec, tmp_tree_based_concepts, plain_spec.ACCEPTANCE_TESTS))
+                errors.extend(validate_concepts_in_spec(spec, tree_based_concepts, plain_spec.ACCEPTANCE_TESTS))
 
     return errors
 
 
+@dataclass(frozen=True)
+class ConceptDefinition:
+    token: mistletoe.block_token.BlockToken
+    rendered_text: str
+    defined_concepts: tuple[str, ...]
+    # User-defined concepts used in the definition (including the concepts it defines), in order of appearance.
+    used_concepts: tuple[str, ...]
+
+
+class ConceptIndex:
+    """
+    Renders the definitions of a plain source once and indexes them by the concepts they define, so that the
+    definitions a concept depends on can be resolved without rendering and scanning the definitions over and over.
+    """
+
+    def __init__(self, plain_source: dict, renderer):
+        self.definitions = list[ConceptDefinition]()
+        self.definitions_by_concept = dict[str, list[ConceptDefinition]]()
+
+        if plain_source[plain_spec.DEFINITIONS] is None:
+            return
+
+        for token in plain_source[plain_spec.DEFINITIONS].children:
+            rendered_text = renderer.render(token)
+            concept_tokens = tokenize_concepts(rendered_text)
+            definition = ConceptDefinition(
+                token=token,
+                rendered_text=rendered_text,
+                defined_concepts=concept_tokens.defined_concepts,
+                used_concepts=tuple(
+                    used_concept
+                    for used_concept in concept_tokens.used_concepts
+                    if used_concept not in DEFAULT_CONCEPTS
+                ),
+            )
+            self.definitions.append(definition)
+            for concept in definition.defined_concepts:
+                self.definitions_by_concept.setdefault(concept, []).append(definition)
+
+    def get_definitions_closure(self, concepts: list[str]) -> list[mistletoe.block_token.BlockToken]:
+        """
+        Returns the definitions of the given concepts and, transitively, of all the concepts they use. Definitions are
+        listed depth-first, each definition followed by the definitions of the concepts it uses.
+        """
+        definitions = list[mistletoe.block_token.BlockToken]()
+        visited_concepts = set[str]()
+        visited_definitions = set[int]()
+
+        def visit(concept: str):
+            if concept in visited_concepts:
+                return
+            visited_concepts.add(concept)
+
+            for definition in self.definitions_by_concept.get(concept, []):
+                if id(definition) not in visited_definitions:
+                    visited_definitions.add(id(definition))
+                    definitions.append(definition.token)
+
+                for used_concept in definition.used_concepts:
+                    visit(used_concept)
+
+        for concept in concepts:
+            visit(concept)
+
+        return definitions
+
+
 def find_concept_definitions_in_plain_source(
     concept: str,
     plain_source: dict,
     renderer,
-) -> list[mistletoe.block_token.token]:
-    definitions = list[mistletoe.block_token.token]()
-    if plain_source[plain_spec.DEFINITIONS] is None:
-        return definitions
-
-    for definition in plain_source[plain_spec.DEFINITIONS].children:
-        rendered_definition = renderer.render(definition)
-        defined_concepts, _ = extract_concepts_from_definition(rendered_definition)
-        if concept in defined_concepts:
-            definitions.append(definition)
-            used_concepts = [
-                used_concept
-                for used_concept in extract_concepts_from_spec_text(rendered_definition)
-                if used_concept != concept and used_concept not in DEFAULT_CONCEPTS
-            ]
-            for used_concept in used_concepts:
-                definitions.extend(find_concept_definitions_in_plain_source(used_concept, plain_source, renderer))
-
-    return definitions
-
-
-def build_adjacency_list(definitions: Optional[list[dict]]) -> tuple[dict, dict]:
-    adjacency_list = dict[str, list[str]]()
-    concept_definitions = dict[str, dict]()
-    if definitions is None or len(definitions) == 0:
-        return adjacency_list, concept_definitions
-
-    for definition in definitions:
-        def_text = definition["markdown"]
-        new_concepts, _ = extract_concepts_from_definition(def_text)
-        used_concepts = [
-            used_concept
-            for used_concept in extract_concepts_from_spec_text(def_text)
-            if used_concept not in new_concepts and used_concept not in DEFAULT_CONCEPTS
-        ]
-        used_concepts = set(used_concepts)
-
-        for new_concept in new_concepts:
-            if new_concept not in adjacency_list:
-                adjacency_list[new_concept] = []
-
-        for used_concept in used_concepts:
-            if used_concept not in adjacency_list:
-                adjacency_list[used_concept] = []
-
-            adjacency_list[used_concept].extend(new_concepts)
-
-        for new_concept in new_concepts:
-            concept_definitions[new_concept] = definition
-
-    return adjacency_list, concept_definitions
-
+) -> list[mistletoe.block_token.BlockToken]:
+    return ConceptIndex(plain_source, renderer).get_definitions_closure([concept])
+
+
+def build_definition_graph(definitions: list[dict]) -> list[list[int]]:
+    """
+    Returns the dependents of every definition: the (ascending) indices of the definitions that use any of the
+    concepts it defines.
+    """
+    definitions_concept_tokens = [tokenize_concepts(definition["markdown"]) for definition in definitions]
+
+    concept_definitions = dict[str, list[int]]()
+    for idx, concept_tokens in enumerate(definitions_concept_tokens):
+        for concept in concept_tokens.defined_concepts:
+            concept_definitions.setdefault(concept, []).append(idx)
+
+    dependents = [list[int]() for _ in definitions]
+    for idx, concept_tokens in enumerate(definitions_concept_tokens):
+        dependencies = set[int]()
+        for used_concept in concept_tokens.used_concepts:
+            if used_concept in concept_tokens.defined_concepts or used_concept in DEFAULT_CONCEPTS:
+                continue
+            dependencies.update(concept_definitions.get(used_concept, []))
+        dependencies.discard(idx)
+
+        for dependency in sorted(dependencies):
+            dependents[dependency].append(idx)
+
+    return dependents
+
+
+def find_strongly_connected_components(successors: list[list[int]]) -> list[list[int]]:
+    """Tarjan's algorithm, iterative so that long chains of definitions don't hit the recursion limit."""
+    next_index = 0
+    indices = [-1] * len(successors)
+    lowlinks = [0] * len(successors)
+    on_stack = [False] * len(successors)
+    stack = list[int]()
+    components = list[list[int]]()
+
+    for root in range(len(successors)):
+        if indices[root] != -1:
+            continue
+
+        indices[root] = lowlinks[root] = next_index
+        next_index += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]
+        while work:
+            node, successor_position = work[-1]
+            if successor_position < len(successors[node]):
+                work[-1] = (node, successor_position + 1)
+                successor = successors[node][successor_position]
+                if indices[successor] == -1:
+                    indices[successor] = lowlinks[successor] = next_index
+                    next_index += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    work.append((successor, 0))
+                elif on_stack[successor]:
+                    lowlinks[node] = min(lowlinks[node], indices[successor])
+                continue
 
-def sort_definitions(definitions: list[dict]) -> list[dict]:
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlinks[parent] = min(lowlinks[parent], lowlinks[node])
+
+            if lowlinks[node] == indices[node]:
+                component = list[int]()
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(sorted(component))
+
+    return components
+
+
+def find_cycle(successors: list[list[int]], component: list[int]) -> list[int]:
+    """Returns a shortest cycle through the first node of a strongly connected component."""
+    members = set(component)
+    start = component[0]
+    previous = dict[int, int]()
+    queue = [start]
+    for node in queue:
+        for successor in successors[node]:
+            if successor == start:
+                cycle = [node]
+                while cycle[-1] != start:
+                    cycle.append(previous[cycle[-1]])
+                return list(reversed(cycle))
+
+            if successor in members and successor not in previous:
+                previous[successor] = node
+                queue.append(successor)
+
+    raise ValueError("Not a strongly connected component.")
+
+
+def sort_definitions(definitions: list[dict]) -> None:
+    """
+    Sorts the definitions (in place) so that every concept is defined before it's used in another definition.
+
+    The definitions are ordered generation by generation: first the ones that don't use any other defined concept,
+    then the ones whose dependencies are all in earlier generations, and so on. Within a generation, the definitions
+    keep their original order, so a definition can be moved behind later definitions of an earlier generation (e.g.
+    `[A uses B, B, C]` is sorted into `[B, C, A]`).
+    """
     if len(definitions) <= 1:
         return
 
-    adjacency_list, concept_definitions = build_adjacency_list(definitions)
-
-    concept_graph = nx.DiGraph()
-    for node, neighbors in adjacency_list.items():
-        for neighbour in neighbors:
-            concept_graph.add_edge(node, neighbour)
-        if not neighbors:
-            concept_graph.add_node(node)
-
-    if not nx.is_directed_acyclic_graph(concept_graph):
+    dependents = build_definition_graph(definitions)
+
+    # Kahn's algorithm, processing the definitions one generation at a time.
+    in_degrees = [0] * len(definitions)
+    for idx_dependents in dependents:
+        for dependent in idx_dependents:
+            in_degrees[dependent] += 1
+
+    order: list[int] = []
+    generation = [idx for idx, in_degree in enumerate(in_degrees) if in_degree == 0]
+    while generation:
+        order.extend(generation)
+        next_generation = []
+        for idx in generation:
+            for dependent in dependents[idx]:
+                in_degrees[dependent] -= 1
+                if in_degrees[dependent] == 0:
+                    next_generation.append(dependent)
+        generation = sorted(next_generation)
+
+    if len(order) < len(definitions):
         msg = "Found cycles in the concept graph. Cycles are not allowed."
-        all_cycles = list(nx.simple_cycles(concept_graph))
+        for component in sorted(find_strongly_connected_components(dependents)):
+            if len(component) < 2:
+                continue
 
-        for cycle in all_cycles:
-            cyclic_definitions = []
-            cyclic_definitions.append(concept_definitions[cycle[0]]["markdown"])
-            cyclic_definitions.append(concept_definitions[cycle[1]]["markdown"])
             msg += "Cyclic definitons:\n"
-            msg += "\n".join(cyclic_definitions)
+            msg += "\n".join(definitions[idx]["markdown"] for idx in find_cycle(dependents, component))
             msg += "\n"
 
         raise PlainSyntaxError(msg)
 
-    order = list(nx.topological_sort(concept_graph))
-    if len(order) > 0:
-        definition_to_order_idx = {
-            plain_spec.hash_text(str(concept_definitions[concept])): idx for idx, concept in enumerate(order)
-        }
-        definitions.sort(key=lambda definition: definition_to_order_idx[plain_spec.hash_text(str(definition))])
+    definitions[:] = [definitions[idx] for idx in order]
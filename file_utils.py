@@ -1,13 +1,25 @@
+import codecs
+import functools
 import os
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Optional, TypeVar
 
 from liquid2 import Environment, FileSystemLoader, StrictUndefined
 from liquid2.exceptions import UndefinedError
 
+import ignore_rules
 import plain_spec
 from plain2code_nodes import Plain2CodeIncludeTag, Plain2CodeLoaderMixin
 from plain_modules import CODEPLAIN_MEMORY_SUBFOLDER, CODEPLAIN_METADATA_FOLDER
+from template_cache import CompiledTemplate, TemplateCache, shared_template_cache
+
+T = TypeVar("T")
 
 BINARY_FILE_EXTENSIONS = [".pyc"]
 
@@ -45,6 +57,19 @@ FILE_EXTENSION_MAPPING = {
 
 SYSTEM_FOLDERS = [".git", CODEPLAIN_METADATA_FOLDER, CODEPLAIN_MEMORY_SUBFOLDER]
 
+BUILD_FOLDER_SNAPSHOT_RACY_WINDOW_NS = 2 * 10**9
+
+# The number of threads reading files concurrently (1 reads them sequentially). On network file systems and overlay
+# storage, the latency of every single read dominates reading many small files.
+file_read_workers = min(32, (os.cpu_count() or 1) + 4)
+# Fewer files than this are read sequentially, as starting the threads isn't worth it.
+PARALLEL_READ_MIN_FILES = 64
+PARALLEL_READ_CHUNKS_PER_WORKER = 4
+
+# Files are recognized as text files by decoding this many bytes from their start.
+TEXT_FILE_SNIFF_SIZE = 8192
+TEXT_FILE_CACHE_SIZE = 65536
+
 
 def get_file_type(file_name):
 
@@ -55,8 +80,13 @@ def get_file_type(file_name):
     return FILE_EXTENSION_MAPPING.get(ext, "unknown")
 
 
-def list_all_text_files(directory):
-    all_files = []
+def walk_files(directory, apply_ignore_rules=True):
+    """
+    Yields the (root, file name, file name relative to the directory) of all the files in the directory, skipping the
+    system folders, files with binary file extensions and (unless `apply_ignore_rules` is False) files ignored by the
+    ignore rules.
+    """
+    directory_ignore_rules = ignore_rules.get_ignore_rules() if apply_ignore_rules else None
     for root, dirs, files in os.walk(directory, topdown=True):
         # Skip directories that should not be traversed
         for skip_dir in SYSTEM_FOLDERS:
@@ -67,20 +97,236 @@ def list_all_text_files(directory):
         if modified_root == ".":
             modified_root = ""
 
+        # Pruned before os.walk descends into them, so ignored directories are never listed.
+        if directory_ignore_rules is not None:
+            directory_ignore_rules.prune(modified_root, dirs)
+
         for filename in files:
-            if not any(filename.endswith(ending) for ending in BINARY_FILE_EXTENSIONS):
-                try:
-                    with open(os.path.join(root, filename), "rb") as f:
-                        f.read().decode("utf-8")
-                except UnicodeDecodeError:
-                    print(f"WARNING! Not listing {filename} in {root}. File is not a text file. Skipping it.")
-                    continue
+            if any(filename.endswith(ending) for ending in BINARY_FILE_EXTENSIONS):
+                continue
+
+            file_name = os.path.join(modified_root, filename)
+            if directory_ignore_rules is None or not directory_ignore_rules.is_ignored_entry(file_name, False):
+                yield root, filename, file_name
+
+
+@functools.lru_cache(maxsize=TEXT_FILE_CACHE_SIZE)
+def _is_text_file(path: str, mtime_ns: int, size: int) -> bool:
+    with open(path, "rb") as f:
+        prefix = f.read(TEXT_FILE_SNIFF_SIZE)
+
+    try:
+        # The prefix may end in the middle of a multi-byte character.
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=size <= TEXT_FILE_SNIFF_SIZE)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def is_text_file(path: str) -> bool:
+    """
+    Whether the file is a UTF-8 text file, judging by its first TEXT_FILE_SNIFF_SIZE bytes. Cached per path,
+    modification time and size.
+    """
+    stat = os.stat(path)
+    return _is_text_file(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def read_text_file(path: str) -> Optional[str]:
+    """Returns the content of the file, or None if it isn't a UTF-8 text file."""
+    with open(path, "rb") as f:
+        content = f.read()
+
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def map_files(function: Callable[[str], T], paths: list[str], max_workers: Optional[int] = None) -> list[T]:
+    """
+    Applies the function (that reads the file) to every path with a bounded thread pool. The results are returned in
+    the order of the paths.
+    """
+    if max_workers is None:
+        max_workers = file_read_workers
+
+    if max_workers <= 1 or len(paths) < PARALLEL_READ_MIN_FILES:
+        return [function(path) for path in paths]
+
+    # Every thread reads a chunk of files, as a future per file costs more than reading a small cached file.
+    chunk_size = -(-len(paths) // (max_workers * PARALLEL_READ_CHUNKS_PER_WORKER))
+    chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="file-reader") as executor:
+        return [
+            result
+            for chunk_results in executor.map(lambda chunk: [function(path) for path in chunk], chunks)
+            for result in chunk_results
+        ]
+
 
-                all_files.append(os.path.join(modified_root, filename))
+def read_text_files(paths: list[str], max_workers: Optional[int] = None) -> list[Optional[str]]:
+    """Reads and decodes the files concurrently (see `read_text_file` and `map_files`)."""
+    return map_files(read_text_file, paths, max_workers)
+
+
+def list_all_text_files(directory):
+    all_files = []
+    for root, filename, file_name in walk_files(directory):
+        if not is_text_file(os.path.join(root, filename)):
+            print(f"WARNING! Not listing {filename} in {root}. File is not a text file. Skipping it.")
+            continue
+
+        all_files.append(file_name)
 
     return all_files
 
 
+def read_all_text_files(directory) -> tuple[list[str], dict[str, str]]:
+    """
+    Returns the text files in the directory and their content, like `list_all_text_files` followed by
+    `get_existing_files_content` would, but reading every file only once.
+    """
+    files = list(walk_files(directory))
+    contents = read_text_files([os.path.join(root, filename) for root, filename, _ in files])
+
+    all_files = []
+    all_files_content = {}
+    for (root, filename, file_name), content in zip(files, contents):
+        if content is None:
+            print(f"WARNING! Not listing {filename} in {root}. File is not a text file. Skipping it.")
+            continue
+
+        all_files.append(file_name)
+        all_files_content[file_name] = content
+
+    return all_files, all_files_content
+
+
+@dataclass
+class BuildFolderSnapshotEntry:
+    mtime_ns: int
+    size: int
+    inode: int
+    # None if the file isn't a text file.
+    content: Optional[str]
+    # Whether the file could have been modified right after it was read without its modification time changing.
+    racy: bool
+
+
+class BuildFolderSnapshot:
+    """
+    In-memory snapshot of the text files of a build folder, so that the whole build folder isn't read on every action.
+
+    Every `fetch` still walks the build folder (in the same order as `list_all_text_files`), but only reads the files
+    that are new or whose modification time, size or inode changed since they were last read. Files written by
+    `store_response_files` are recorded directly, without reading them back.
+    """
+
+    def __init__(self, build_folder: str):
+        self.build_folder = build_folder
+        self.entries: dict[str, BuildFolderSnapshotEntry] = {}
+        self.scans = 0
+        # The number of files read from disk (either new or changed since the previous scan).
+        self.read_files = 0
+        self._lock = threading.Lock()
+
+    def _is_up_to_date(self, file_name: str, stat: os.stat_result) -> bool:
+        entry = self.entries.get(file_name)
+        return (
+            entry is not None
+            and not entry.racy
+            and (entry.mtime_ns, entry.size, entry.inode) == (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        )
+
+    def _read_entries(self, files: list[tuple[str, str, str, os.stat_result]]):
+        read_time_ns = time.time_ns()
+        contents = read_text_files([os.path.join(root, filename) for root, filename, _, _ in files])
+        self.read_files += len(files)
+
+        for (root, filename, file_name, stat), content in zip(files, contents):
+            self.entries[file_name] = BuildFolderSnapshotEntry(
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+                inode=stat.st_ino,
+                content=content,
+                # Like git's "racily clean" index entries: file systems only update the modification time every few
+                # milliseconds (or seconds), so files modified around the time they were read are read again.
+                racy=stat.st_mtime_ns >= read_time_ns - BUILD_FOLDER_SNAPSHOT_RACY_WINDOW_NS,
+            )
+            if content is None:
+                print(f"WARNING! Not listing {filename} in {root}. File is not a text file. Skipping it.")
+
+    def fetch(self) -> tuple[list[str], dict[str, str]]:
+        """Returns the text files of the build folder and their content, like `list_all_text_files` would."""
+        with self._lock:
+            self.scans += 1
+
+            files = [
+                (root, filename, file_name, os.stat(os.path.join(root, filename)))
+                for root, filename, file_name in walk_files(self.build_folder)
+            ]
+            self._read_entries([file for file in files if not self._is_up_to_date(file[2], file[3])])
+
+            seen_files = {file_name for _, _, file_name, _ in files}
+            for file_name in set(self.entries) - seen_files:
+                del self.entries[file_name]
+
+            existing_files = []
+            existing_files_content = {}
+            for _, _, file_name, _ in files:
+                content = self.entries[file_name].content
+                if content is not None:
+                    existing_files.append(file_name)
+                    existing_files_content[file_name] = content
+
+            return existing_files, existing_files_content
+
+    def record_write(self, file_name: str, content: Optional[str]):
+        """
+        Records the content written to a file of the build folder. If the content is None (the file was deleted or
+        its content on disk isn't known), the file is read again on the next scan.
+        """
+        full_file_name = os.path.join(self.build_folder, file_name)
+        with self._lock:
+            if content is None or not os.path.exists(full_file_name):
+                self.entries.pop(file_name, None)
+                return
+
+            stat = os.stat(full_file_name)
+            self.entries[file_name] = BuildFolderSnapshotEntry(
+                mtime_ns=stat.st_mtime_ns, size=stat.st_size, inode=stat.st_ino, content=content, racy=False
+            )
+
+
+# Build folder snapshots shared by all the actions of the process, keyed by the absolute build folder path.
+_build_folder_snapshots: dict[str, BuildFolderSnapshot] = {}
+_build_folder_snapshots_lock = threading.Lock()
+
+
+def get_build_folder_snapshot(build_folder: str) -> BuildFolderSnapshot:
+    with _build_folder_snapshots_lock:
+        build_folder_snapshot = _build_folder_snapshots.get(os.path.abspath(build_folder))
+        if build_folder_snapshot is None:
+            build_folder_snapshot = BuildFolderSnapshot(build_folder)
+            _build_folder_snapshots[os.path.abspath(build_folder)] = build_folder_snapshot
+
+    return build_folder_snapshot
+
+
+def record_build_folder_write(full_file_name: str, content: Optional[str]):
+    with _build_folder_snapshots_lock:
+        build_folder_snapshots = list(_build_folder_snapshots.items())
+
+    for build_folder, build_folder_snapshot in build_folder_snapshots:
+        file_name = os.path.relpath(os.path.abspath(full_file_name), build_folder)
+        file_path = Path(file_name)
+        if file_path.parts[0] == os.path.pardir or any(part in SYSTEM_FOLDERS for part in file_path.parts[:-1]):
+            continue
+
+        build_folder_snapshot.record_write(file_name, content)
+
+
 def list_folders_in_directory(directory):
     # List all items in the directory
     items = os.listdir(directory)
@@ -149,13 +395,13 @@ def add_current_path_if_no_path(filename):
 
 def get_existing_files_content(build_folder, existing_files):
     existing_files_content = {}
-    for file_name in existing_files:
-        with open(os.path.join(build_folder, file_name), "rb") as f:
-            content = f.read()
-            try:
-                existing_files_content[file_name] = content.decode("utf-8")
-            except UnicodeDecodeError:
-                print(f"WARNING! Error loading {file_name}. File is not a text file. Skipping it.")
+    contents = read_text_files([os.path.join(build_folder, file_name) for file_name in existing_files])
+    for file_name, content in zip(existing_files, contents):
+        if content is None:
+            print(f"WARNING! Error loading {file_name}. File is not a text file. Skipping it.")
+            continue
+
+        existing_files_content[file_name] = content
 
     return existing_files_content
 
@@ -169,6 +415,7 @@ def store_response_files(target_folder, response_files, existing_files):
             if os.path.exists(full_file_name):
                 os.remove(full_file_name)
                 existing_files.remove(file_name)
+                record_build_folder_write(full_file_name, None)
             else:
                 print(f"WARNING! Cannot delete file! File {full_file_name} does not exist.")
 
@@ -178,6 +425,10 @@ def store_response_files(target_folder, response_files, existing_files):
 
         with open(full_file_name, "w") as f:
             f.write(response_files[file_name])
+            # Reading the file back only yields the same content if it was written as UTF-8 without newline translation.
+            is_written_verbatim = codecs.lookup(f.encoding).name == "utf-8" and os.linesep == "\n"
+
+        record_build_folder_write(full_file_name, response_files[file_name] if is_written_verbatim else None)
 
         if file_name not in existing_files:
             existing_files.append(file_name)
@@ -185,6 +436,62 @@ def store_response_files(target_folder, response_files, existing_files):
     return existing_files
 
 
+class ResponseFileWriter:
+    """
+    Stores response files in the target folder as they're streamed in (when used as the `on_file` callback of the API),
+    and the files that weren't streamed once the whole response is received.
+
+    Until then, the streamed files can be discarded (when used as the `on_discard` callback of the API), which restores
+    the files they replaced.
+    """
+
+    def __init__(self, target_folder, existing_files):
+        self.target_folder = target_folder
+        self.existing_files = existing_files
+        self.stored_files = set()
+        # The content of the streamed files before they were stored (None if they didn't exist).
+        self._replaced_files: dict[str, Optional[bytes]] = {}
+
+    def __call__(self, file_name, content):
+        if file_name not in self._replaced_files:
+            full_file_name = os.path.join(self.target_folder, file_name)
+            if os.path.exists(full_file_name):
+                with open(full_file_name, "rb") as f:
+                    self._replaced_files[file_name] = f.read()
+            else:
+                self._replaced_files[file_name] = None
+
+        store_response_files(self.target_folder, {file_name: content}, self.existing_files)
+        self.stored_files.add(file_name)
+
+    def discard(self):
+        """Restores the files replaced (or deleted) by the streamed files, and deletes the new ones."""
+        for file_name, replaced_content in self._replaced_files.items():
+            full_file_name = os.path.join(self.target_folder, file_name)
+            if replaced_content is None:
+                if os.path.exists(full_file_name):
+                    os.remove(full_file_name)
+                if file_name in self.existing_files:
+                    self.existing_files.remove(file_name)
+            else:
+                with open(full_file_name, "wb") as f:
+                    f.write(replaced_content)
+                if file_name not in self.existing_files:
+                    self.existing_files.append(file_name)
+
+            record_build_folder_write(full_file_name, None)
+
+        self._replaced_files = {}
+        self.stored_files = set()
+
+    def store_remaining_files(self, response_files):
+        remaining_files = {
+            file_name: content for file_name, content in response_files.items() if file_name not in self.stored_files
+        }
+        self._replaced_files = {}
+        return store_response_files(self.target_folder, remaining_files, self.existing_files)
+
+
 def open_from(dirs, file_name):
     for dir in dirs:
         full_file_name = os.path.join(dir, file_name)
@@ -230,35 +537,104 @@ def load_linked_resources(template_dirs: list[str], resources_list):
     return linked_resources
 
 
+# Templates loaded while rendering a plain source with render_plain_source_with_templates.
+tracked_templates: ContextVar[Optional[dict[str, str]]] = ContextVar("tracked_templates", default=None)
+
+
 class TrackingFileSystemLoader(Plain2CodeLoaderMixin, FileSystemLoader):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, template_cache: Optional[TemplateCache] = None, **kwargs):
         super().__init__(*args, **kwargs)
         self.loaded_templates = {}
+        self.template_cache = template_cache
+
+    def track_template(self, template_name, source):
+        loaded_templates = tracked_templates.get()
+        if loaded_templates is None:
+            loaded_templates = self.loaded_templates
+        loaded_templates[template_name] = source
 
     def get_source(self, environment, template_name, **kwargs):
         source = super().get_source(environment, template_name, **kwargs)
-        self.loaded_templates[template_name] = source.source
+        self.track_template(template_name, source.source)
         return source
 
-
-def get_loaded_templates(source_path, plain_source):
-    # Render the plain source with Liquid templating engine
-    # to identify the templates that are being loaded
-
-    liquid_loader = TrackingFileSystemLoader(source_path)
-    liquid_env = Environment(loader=liquid_loader, undefined=StrictUndefined)
+    def load(self, env, name, *, globals=None, context=None, **kwargs):
+        if self.template_cache is None:
+            return super().load(env, name, globals=globals, context=context, **kwargs)
+
+        whitespaces = kwargs.get("whitespaces", 0)
+        assert isinstance(whitespaces, int)
+
+        path = self.resolve_path(name)
+        key = TemplateCache.get_key(path, whitespaces)
+        compiled_template = self.template_cache.get(key)
+        if compiled_template is None:
+            source, full_name, uptodate, matter = self.get_source(env, name, context=context, **kwargs)
+            template = self.compile_template(env, source, full_name, whitespaces, globals=globals, matter=matter)
+            template.uptodate = uptodate
+            self.template_cache.put(key, CompiledTemplate(source, template.nodes, matter))
+            return template
+
+        # Cache hits still count as loaded templates (e.g. for the dependencies of the parse cache).
+        self.track_template(name, compiled_template.source)
+
+        template = env.template_class(
+            env,
+            compiled_template.nodes,
+            name=path.name,
+            path=path,
+            global_data=globals,
+            overlay_data=compiled_template.matter,
+        )
+        template.uptodate = lambda: TemplateCache.get_key(path, whitespaces) == key
+        return template
+
+
+def create_template_environment(loader) -> Environment:
+    liquid_env = Environment(loader=loader, undefined=StrictUndefined)
     liquid_env.tags["include"] = Plain2CodeIncludeTag(liquid_env)
 
     liquid_env.filters["code_variable"] = plain_spec.code_variable_liquid_filter
     liquid_env.filters["prohibited_chars"] = plain_spec.prohibited_chars_liquid_filter
 
-    plain_source_template = liquid_env.from_string(plain_source)
+    return liquid_env
+
+
+# Liquid environments shared by all the plain sources rendered with the same template dirs.
+_template_environments: dict[tuple[str, ...], Environment] = {}
+_template_environments_lock = threading.Lock()
+
+
+def get_template_environment(template_dirs: list[str]) -> Environment:
+    with _template_environments_lock:
+        template_environment = _template_environments.get(tuple(template_dirs))
+        if template_environment is None:
+            template_environment = create_template_environment(
+                TrackingFileSystemLoader(list(template_dirs), template_cache=shared_template_cache)
+            )
+            _template_environments[tuple(template_dirs)] = template_environment
+
+    return template_environment
+
+
+def render_plain_source_with_templates(
+    template_dirs: list[str], plain_source: str, code_variables: dict
+) -> tuple[str, dict[str, str]]:
+    """
+    Renders the plain source with Liquid in a single pass, returning the rendered plain source and the sources of
+    all the templates it includes.
+    """
+    loaded_templates: dict[str, str] = {}
+    token = tracked_templates.set(loaded_templates)
     try:
-        plain_source = plain_source_template.render()
+        plain_source_template = get_template_environment(template_dirs).from_string(plain_source)
+        rendered_plain_source = plain_source_template.render(code_variables=code_variables)
     except UndefinedError as e:
         raise Exception(f"Undefined liquid variable: {str(e)}")
+    finally:
+        tracked_templates.reset(token)
 
-    return plain_source, liquid_loader.loaded_templates
+    return rendered_plain_source, loaded_templates
 
 
 def update_build_folder_with_rendered_files(build_folder, existing_files, response_files):
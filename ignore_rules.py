@@ -0,0 +1,184 @@
+"""Gitignore-compatible rules for the files that are skipped when scanning build and conformance tests folders."""
+
+import functools
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+IGNORE_FILE_NAME = ".codeplainignore"
+
+# Dependencies and caches the test scripts install or create, which never contain generated sources. They can be
+# re-included with negated patterns (e.g. `!node_modules/`) in the ignore file.
+DEFAULT_IGNORE_PATTERNS = [
+    "node_modules/",
+    "__pycache__/",
+    ".venv/",
+]
+
+# The ignore file with the rules for all the scanned folders (None if there is none). It's kept outside the build and
+# conformance tests folders, which are generated and wiped on every full render.
+ignore_file: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    pattern: str
+    regex: re.Pattern
+    negated: bool
+    directory_only: bool
+
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        if self.directory_only and not is_dir:
+            return False
+        return self.regex.match(relative_path) is not None
+
+
+def _translate_glob(glob: str) -> str:
+    regex = ""
+    i = 0
+    while i < len(glob):
+        char = glob[i]
+        if glob.startswith("**/", i) and (i == 0 or glob[i - 1] == "/"):
+            # Leading `**/` and `/**/` match zero or more directories.
+            regex += "(?:.*/)?"
+            i += 3
+        elif glob.startswith("**", i) and i + 2 == len(glob) and (i == 0 or glob[i - 1] == "/"):
+            # Trailing `/**` matches everything inside.
+            regex += ".*"
+            i += 2
+        elif char == "*":
+            regex += "[^/]*"
+            i += 1
+        elif char == "?":
+            regex += "[^/]"
+            i += 1
+        elif char == "\\" and i + 1 < len(glob):
+            regex += re.escape(glob[i + 1])
+            i += 2
+        elif char == "[":
+            # A `]` right after the opening bracket (or its negation) is part of the class.
+            class_start = i + 1
+            if class_start < len(glob) and glob[class_start] in "!^":
+                class_start += 1
+            if class_start < len(glob) and glob[class_start] == "]":
+                class_start += 1
+            end = glob.find("]", class_start)
+            if end == -1:
+                regex += re.escape(char)
+                i += 1
+                continue
+
+            character_class = glob[i + 1 : end]
+            if character_class[0] in "!^":
+                character_class = "^" + character_class[1:]
+            regex += "[" + character_class.replace("\\", "\\\\").replace("[", "\\[") + "]"
+            i = end + 1
+        else:
+            regex += re.escape(char)
+            i += 1
+
+    return regex
+
+
+def compile_ignore_rule(line: str) -> Optional[IgnoreRule]:
+    """
+    Compiles a line of an ignore file, following the gitignore pattern format. Returns None for blank lines and
+    comments.
+    """
+    pattern = line.rstrip("\n").rstrip("\r")
+    # Trailing spaces are ignored unless they're escaped.
+    while pattern.endswith(" ") and not pattern.endswith("\\ "):
+        pattern = pattern[:-1]
+
+    if pattern == "" or pattern.startswith("#"):
+        return None
+
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    elif pattern.startswith("\\!") or pattern.startswith("\\#"):
+        pattern = pattern[1:]
+
+    directory_only = pattern.endswith("/")
+    glob = pattern.rstrip("/")
+    if glob == "":
+        return None
+
+    # Patterns with a slash (other than a trailing one) are relative to the scanned folder, others match at any level.
+    anchored = "/" in glob
+    glob = glob.lstrip("/")
+    prefix = "" if anchored else "(?:.*/)?"
+
+    return IgnoreRule(
+        pattern=line.strip(),
+        regex=re.compile(f"{prefix}{_translate_glob(glob)}$", re.DOTALL),
+        negated=negated,
+        directory_only=directory_only,
+    )
+
+
+class IgnoreRules:
+    """
+    A list of gitignore rules. As in gitignore, the last rule matching a path decides whether it's ignored, and files
+    in an ignored directory are ignored regardless of the rules matching them.
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.rules = [rule for rule in (compile_ignore_rule(pattern) for pattern in patterns) if rule is not None]
+
+    def _matches(self, relative_path: str, is_dir: bool) -> bool:
+        for rule in reversed(self.rules):
+            if rule.matches(relative_path, is_dir):
+                return not rule.negated
+        return False
+
+    def is_ignored_entry(self, relative_path: str, is_dir: bool) -> bool:
+        """Whether the entry is ignored, assuming none of the directories it's in are (as when walking top-down)."""
+        return self._matches(relative_path.replace(os.sep, "/"), is_dir)
+
+    def is_ignored(self, relative_path: str, is_dir: bool = False) -> bool:
+        parts = relative_path.replace(os.sep, "/").split("/")
+        for i in range(1, len(parts)):
+            if self._matches("/".join(parts[:i]), True):
+                return True
+        return self._matches("/".join(parts), is_dir)
+
+    def prune(self, relative_root: str, dirs: list[str]):
+        """Removes the ignored directories (in place), so that `os.walk` doesn't descend into them."""
+        dirs[:] = [
+            dir_name for dir_name in dirs if not self.is_ignored_entry(os.path.join(relative_root, dir_name), True)
+        ]
+
+
+@functools.lru_cache(maxsize=128)
+def _load_ignore_rules(ignore_file_path: Optional[str], mtime_ns: int, size: int) -> IgnoreRules:
+    patterns = list(DEFAULT_IGNORE_PATTERNS)
+    if ignore_file_path is not None:
+        with open(ignore_file_path, "r", encoding="utf-8") as f:
+            patterns.extend(f.readlines())
+
+    return IgnoreRules(patterns)
+
+
+def find_ignore_file(plain_file_path: str) -> Optional[str]:
+    """Returns the ignore file next to the plain file, or None if there is none."""
+    ignore_file_path = os.path.join(os.path.dirname(os.path.abspath(plain_file_path)), IGNORE_FILE_NAME)
+    return ignore_file_path if os.path.isfile(ignore_file_path) else None
+
+
+def get_ignore_rules() -> IgnoreRules:
+    """
+    Returns the default ignore rules followed by the rules of the ignore file (if it's set and exists). The patterns
+    are relative to the scanned folder. The compiled rules are cached until the ignore file changes.
+    """
+    if ignore_file is None:
+        return _load_ignore_rules(None, 0, 0)
+
+    ignore_file_path = os.path.abspath(ignore_file)
+    try:
+        stat = os.stat(ignore_file_path)
+    except OSError:
+        return _load_ignore_rules(None, 0, 0)
+
+    return _load_ignore_rules(ignore_file_path, stat.st_mtime_ns, stat.st_size)
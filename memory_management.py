@@ -18,9 +18,7 @@ class MemoryManager:
         memory_path = os.path.join(memory_folder, CONFORMANCE_TEST_MEMORY_SUBFOLDER)
         if not os.path.exists(memory_path):
             return {}, {}
-        memory_files = file_utils.list_all_text_files(memory_path)
-        memory_files_content = file_utils.get_existing_files_content(memory_path, memory_files)
-        return memory_files, memory_files_content
+        return file_utils.read_all_text_files(memory_path)
 
     def __init__(self, codeplain_api, module_build_folder: str):
         self.codeplain_api = codeplain_api
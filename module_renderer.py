@@ -7,6 +7,7 @@ import plain_modules
 import plain_spec
 from event_bus import EventBus
 from memory_management import MemoryManager
+from parse_cache import ParseCache
 from plain2code_console import console
 from plain2code_events import RenderCompleted, RenderFailed
 from plain2code_exceptions import MissingPreviousFunctionalitiesError
@@ -28,6 +29,8 @@ class ModuleRenderer:
         args: argparse.Namespace,
         run_state: RunState,
         event_bus: EventBus,
+        parse_cache: ParseCache | None = None,
+        incremental_parser: plain_file.IncrementalPlainParser | None = None,
     ):
         self.codeplainAPI = codeplainAPI
         self.filename = filename
@@ -36,6 +39,8 @@ class ModuleRenderer:
         self.args = args
         self.run_state = run_state
         self.event_bus = event_bus
+        self.parse_cache = parse_cache
+        self.incremental_parser = incremental_parser
 
     def _ensure_module_folders_exist(self, module_name: str, first_render_frid: str) -> tuple[str, str]:
         """
@@ -186,7 +191,9 @@ class ModuleRenderer:
         Returns:
             tuple[bool, list[PlainModule], bool]: (Whether the module was rendered, the required modules, and whether the rendering failed)
         """
-        module_name, plain_source, required_modules_list = plain_file.plain_file_parser(filename, self.template_dirs)
+        module_name, plain_source, required_modules_list = plain_file.plain_file_parser(
+            filename, self.template_dirs, self.parse_cache, self.incremental_parser
+        )
 
         resources_list = []
         plain_spec.collect_linked_resources(plain_source, resources_list, None, True)
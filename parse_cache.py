@@ -0,0 +1,101 @@
+"""On-disk cache of parsed plain files, so that unchanged plain files aren't parsed over and over."""
+
+import json
+import logging
+import os
+from typing import Optional
+
+import file_utils
+import plain_spec
+
+# Bump whenever the output of plain_file.plain_file_parser changes, so that entries of older clients aren't used.
+PARSE_CACHE_VERSION = 1
+
+
+class ParseCache:
+    """
+    Stores the results of `plain_file.plain_file_parser` keyed by the module name and the template dirs (in order).
+
+    Together with the result, each entry stores the content hash of every file read while parsing: the plain file
+    itself, all imported and required modules and all included templates. An entry is only used if each of these
+    files still resolves (with the template dirs precedence) to a file with the same content. Stale entries are
+    evicted.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    @staticmethod
+    def get_key(module_name: str, template_dirs: list[str]) -> str:
+        return plain_spec.hash_text(
+            json.dumps(
+                {
+                    "version": PARSE_CACHE_VERSION,
+                    "module_name": module_name,
+                    "template_dirs": [os.path.abspath(template_dir) for template_dir in template_dirs],
+                }
+            )
+        )
+
+    def _get_entry_path(self, module_name: str, template_dirs: list[str]) -> str:
+        return os.path.join(self.folder, f"{module_name}-{self.get_key(module_name, template_dirs)}.json")
+
+    @staticmethod
+    def _is_up_to_date(dependencies: dict[str, str], template_dirs: list[str]) -> bool:
+        for file_name, content_hash in dependencies.items():
+            content = file_utils.open_from(template_dirs, file_name)
+            if content is None or plain_spec.hash_text(content) != content_hash:
+                logging.debug(f"Parse cache entry is stale: {file_name} has changed.")
+                return False
+        return True
+
+    def load(self, module_name: str, template_dirs: list[str]) -> Optional[tuple[str, dict, list[str]]]:
+        entry_path = self._get_entry_path(module_name, template_dirs)
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            is_up_to_date = self._is_up_to_date(entry["dependencies"], template_dirs)
+        except (OSError, ValueError, KeyError):
+            is_up_to_date = False
+
+        if not is_up_to_date:
+            self.evict(module_name, template_dirs)
+            return None
+
+        logging.debug(f"Parse cache hit for module {module_name}.")
+        return entry["module_name"], entry["plain_source"], entry["required_modules"]
+
+    def store(
+        self,
+        module_name: str,
+        template_dirs: list[str],
+        result: tuple[str, dict, list[str]],
+        dependencies: dict[str, str],
+    ):
+        entry_path = self._get_entry_path(module_name, template_dirs)
+        os.makedirs(self.folder, exist_ok=True)
+
+        parsed_module_name, plain_source, required_modules = result
+        # Written to a temporary file first so that concurrent renders never read a partially written entry.
+        temporary_entry_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(temporary_entry_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "module_name": parsed_module_name,
+                    "template_dirs": template_dirs,
+                    "dependencies": dependencies,
+                    "plain_source": plain_source,
+                    "required_modules": required_modules,
+                },
+                f,
+                indent=4,
+            )
+        os.replace(temporary_entry_path, entry_path)
+
+    def evict(self, module_name: str, template_dirs: list[str]):
+        entry_path = self._get_entry_path(module_name, template_dirs)
+        if os.path.exists(entry_path):
+            os.remove(entry_path)
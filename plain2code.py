@@ -11,10 +11,14 @@ from requests.exceptions import RequestException
 
 import codeplain_REST_api as codeplain_api
 import file_utils
+import ignore_rules
 import plain_file
 import plain_spec
+import template_cache
+from api_metrics import ApiMetrics
 from event_bus import EventBus
 from module_renderer import ModuleRenderer
+from parse_cache import ParseCache
 from plain2code_arguments import parse_arguments
 from plain2code_console import console
 from plain2code_exceptions import (
@@ -27,6 +31,7 @@ from plain2code_exceptions import (
     MissingPreviousFunctionalitiesError,
     MissingResource,
     PlainSyntaxError,
+    ServiceUnavailable,
     UnexpectedState,
 )
 from plain2code_logger import (
@@ -38,6 +43,7 @@ from plain2code_logger import (
     get_log_file_path,
 )
 from plain2code_state import RunState
+from response_store import ResponseStore
 from system_config import system_config
 from tui.plain2code_tui import Plain2CodeTUI
 
@@ -171,42 +177,88 @@ def render(args, run_state: RunState, codeplain_api, event_bus: EventBus):  # no
 
     console.info(f"Rendering {args.filename} to target code.")
 
+    parse_cache = ParseCache(args.parse_cache) if args.parse_cache else None
+    if args.template_cache:
+        template_cache.shared_template_cache.folder = args.template_cache
+    if args.file_read_workers:
+        file_utils.file_read_workers = args.file_read_workers
+    ignore_rules.ignore_file = args.ignore_file or ignore_rules.find_ignore_file(args.filename)
+    incremental_parser = plain_file.IncrementalPlainParser()
+
     # Compute render range from either --render-range or --render-from
     render_range = None
     if args.render_range or args.render_from:
         # Parse the plain file to get the plain_source for FRID extraction
-        _, plain_source, _ = plain_file.plain_file_parser(args.filename, template_dirs)
+        _, plain_source, _ = plain_file.plain_file_parser(args.filename, template_dirs, parse_cache, incremental_parser)
 
         if args.render_range:
             render_range = get_render_range(args.render_range, plain_source)
         elif args.render_from:
             render_range = get_render_range_from(args.render_from, plain_source)
 
-    codeplainAPI = codeplain_api.CodeplainAPI(args.api_key, console)
+    response_store = None
+    if args.record_responses:
+        response_store = ResponseStore(args.record_responses, replay=False)
+    elif args.replay_responses:
+        response_store = ResponseStore(args.replay_responses, replay=True)
+
+    api_metrics = None
+    if args.api_metrics_report:
+        api_metrics = ApiMetrics(token_counter=lambda text: len(console.llm_encoding.encode(text)))
+
+    codeplainAPI = codeplain_api.CodeplainAPI(
+        args.api_key,
+        console,
+        pool_size=args.api_pool_size or codeplain_api.DEFAULT_POOL_SIZE,
+        keep_alive=not args.no_api_keep_alive,
+        connect_timeout=args.api_connect_timeout or codeplain_api.DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=args.api_read_timeout or codeplain_api.DEFAULT_READ_TIMEOUT,
+        content_addressed_files=args.content_addressed_files,
+        render_session_cache=args.render_session_cache,
+        compress_requests=args.compress_requests,
+        response_store=response_store,
+        stream_responses=args.stream_responses,
+        metrics=api_metrics,
+    )
     codeplainAPI.verbose = args.verbose
     assert args.api is not None and args.api != "", "API URL is required"
     codeplainAPI.api_url = args.api
 
-    module_renderer = ModuleRenderer(
-        codeplainAPI,
-        args.filename,
-        render_range,
-        template_dirs,
-        args,
-        run_state,
-        event_bus,
-    )
+    try:
+        module_renderer = ModuleRenderer(
+            codeplainAPI,
+            args.filename,
+            render_range,
+            template_dirs,
+            args,
+            run_state,
+            event_bus,
+            parse_cache,
+            incremental_parser,
+        )
 
-    app = Plain2CodeTUI(
-        event_bus=event_bus,
-        worker_fun=module_renderer.render_module,
-        render_id=run_state.render_id,
-        unittests_script=args.unittests_script,
-        conformance_tests_script=args.conformance_tests_script,
-        prepare_environment_script=args.prepare_environment_script,
-        css_path="styles.css",
-    )
-    result = app.run()
+        app = Plain2CodeTUI(
+            event_bus=event_bus,
+            worker_fun=module_renderer.render_module,
+            render_id=run_state.render_id,
+            unittests_script=args.unittests_script,
+            conformance_tests_script=args.conformance_tests_script,
+            prepare_environment_script=args.prepare_environment_script,
+            css_path="styles.css",
+        )
+        result = app.run()
+    finally:
+        connection_stats = codeplainAPI.get_connection_stats()
+        logging.info(
+            f"API connections opened: {connection_stats.connections_opened}, "
+            f"requests sent: {connection_stats.requests_sent}, "
+            f"connections reused: {connection_stats.connections_reused}"
+        )
+        codeplainAPI.close()
+
+    if api_metrics is not None:
+        api_metrics.write_report(args.api_metrics_report, run_state.render_id)
+        console.info(f"API metrics report written to {args.api_metrics_report}")
 
     # If the app exited due to a worker error, re-raise it here
     # so it hits the exception handlers in main()
@@ -288,6 +340,10 @@ def main():  # noqa: C901
         exc_info = sys.exc_info()
         console.error(f"Missing resource: {str(e)}\n")
         console.debug(f"Render ID: {run_state.render_id}")
+    except ServiceUnavailable as e:
+        exc_info = sys.exc_info()
+        console.error(f"Codeplain API unavailable: {str(e)}\n")
+        console.debug(f"Render ID: {run_state.render_id}")
     except Exception as e:
         exc_info = sys.exc_info()
         console.error(f"Error rendering plain code: {str(e)}\n")
@@ -55,6 +55,26 @@ def non_empty_string(s):
     return s
 
 
+def positive_int(s):
+    try:
+        value = int(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{s} is not an integer.")
+    if value < 1:
+        raise argparse.ArgumentTypeError("The number must be at least 1.")
+    return value
+
+
+def positive_float(s):
+    try:
+        value = float(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{s} is not a number.")
+    if value <= 0:
+        raise argparse.ArgumentTypeError("The number must be greater than 0.")
+    return value
+
+
 def frid_string(s):
     """Validate that the string contains only numbers separated by dots."""
     if not s:
@@ -214,6 +234,58 @@ def create_parser():
         default=CODEPLAIN_API_KEY,
         help="API key used to access the API. If not provided, the CODEPLAIN_API_KEY environment variable is used.",
     )
+    parser.add_argument(
+        "--api-pool-size",
+        type=positive_int,
+        default=None,
+        help="The maximum number of connections to the API kept open for reuse. Default: 10",
+    )
+    parser.add_argument(
+        "--no-api-keep-alive",
+        action="store_true",
+        default=False,
+        help="Close the connection to the API after every request instead of reusing it for subsequent requests.",
+    )
+    parser.add_argument(
+        "--api-connect-timeout",
+        type=positive_float,
+        default=None,
+        help="Seconds to wait for a connection to the API to be established. Default: 30",
+    )
+    parser.add_argument(
+        "--api-read-timeout",
+        type=positive_float,
+        default=None,
+        help="Seconds to wait for a response of the API's generation endpoints. Default: no limit",
+    )
+    parser.add_argument(
+        "--content-addressed-files",
+        action="store_true",
+        default=False,
+        help="Upload file contents to the API only once per render and reference them by their hash afterwards. "
+        "Requires the API to support content-addressed file upload.",
+    )
+    parser.add_argument(
+        "--render-session-cache",
+        action="store_true",
+        default=False,
+        help="Send the plain source tree and linked resources to the API only once per render and reference them "
+        "by their hash afterwards. Requires the API to support the render session cache.",
+    )
+    parser.add_argument(
+        "--stream-responses",
+        action="store_true",
+        default=False,
+        help="Ask the API to stream generated files one at a time, writing each file as soon as it's received. "
+        "Falls back to regular responses if the API doesn't support streaming.",
+    )
+    parser.add_argument(
+        "--compress-requests",
+        action="store_true",
+        default=False,
+        help="Compress large API request bodies (gzip, or zstd if the zstandard package is installed) "
+        "when the API advertises support for it.",
+    )
     parser.add_argument(
         "--full-plain",
         action="store_true",
@@ -231,6 +303,61 @@ def create_parser():
         help="",
     )
 
+    response_store_group = parser.add_mutually_exclusive_group()
+    response_store_group.add_argument(
+        "--record-responses",
+        type=non_empty_string,
+        default=None,
+        help="Record all API responses of the render to this folder, so that the render can later be replayed with --replay-responses.",
+    )
+    response_store_group.add_argument(
+        "--replay-responses",
+        type=non_empty_string,
+        default=None,
+        help="Replay the API responses recorded with --record-responses from this folder instead of calling the API. "
+        "Requires --replay-with set to the render ID of the recorded render.",
+    )
+
+    parser.add_argument(
+        "--api-metrics-report",
+        type=non_empty_string,
+        default=None,
+        help="Write a JSON report of the size, estimated token count and latency of all API calls, "
+        "per payload field and aggregated per functional requirement and per render, to this file.",
+    )
+
+    parser.add_argument(
+        "--parse-cache",
+        type=non_empty_string,
+        default=None,
+        help="Cache parsed plain files in this folder. A cached plain file is only parsed again "
+        "if it, any of its imported or required modules or any of its included templates have changed.",
+    )
+
+    parser.add_argument(
+        "--template-cache",
+        type=non_empty_string,
+        default=None,
+        help="Persist compiled Liquid templates in this folder, so that templates included by many modules "
+        "or in subsequent renders aren't compiled again. A cached template is only used if its file hasn't changed.",
+    )
+
+    parser.add_argument(
+        "--file-read-workers",
+        type=positive_int,
+        default=None,
+        help="The number of threads reading the files of the build and conformance tests folders concurrently "
+        "(1 reads them sequentially). Defaults to the number of CPUs plus 4, at most 32.",
+    )
+
+    parser.add_argument(
+        "--ignore-file",
+        type=str,
+        default=None,
+        help="Path to the file with the gitignore patterns of the files to skip when scanning the build and conformance "
+        "tests folders. Defaults to the .codeplainignore file next to the plain file, if it exists.",
+    )
+
     parser.add_argument(
         "--template-dir",
         type=str,
@@ -298,6 +425,12 @@ def parse_arguments():
     if not args.render_conformance_tests and args.copy_conformance_tests:
         parser.error("--copy-conformance-tests requires --conformance-tests-script to be set")
 
+    if args.ignore_file and not os.path.isfile(args.ignore_file):
+        parser.error(f"--ignore-file {args.ignore_file} does not exist")
+
+    if args.replay_responses and not args.replay_with:
+        parser.error("--replay-responses requires --replay-with to be set to the render ID of the recorded render")
+
     if not args.log_to_file and args.log_file_name != DEFAULT_LOG_FILE_NAME:
         parser.error("--log-file-name cannot be used when --log-to-file is False.")
 
@@ -59,3 +59,15 @@ class MissingPreviousFunctionalitiesError(Exception):
     """Raised when trying to render from a FRID but previous FRID commits are missing."""
 
     pass
+
+
+class MissingRecordedResponse(Exception):
+    """Raised when replaying a render and the response to an API call wasn't recorded."""
+
+    pass
+
+
+class ServiceUnavailable(Exception):
+    """Raised when requests to the API are suspended after too many consecutive failures."""
+
+    pass
@@ -92,17 +92,34 @@ class Plain2CodeLoaderMixin:
         source, full_name, uptodate, matter = self.get_source(env, name, context=context, **kwargs)
         whitespaces = kwargs.get("whitespaces", 0)
         assert isinstance(whitespaces, int)
+
+        template = self.compile_template(env, source, full_name, whitespaces, globals=globals, matter=matter)
+
+        template.uptodate = uptodate
+        return template
+
+    @staticmethod
+    def compile_template(
+        env: Environment,
+        source: str,
+        full_name: str,
+        whitespaces: int,
+        *,
+        globals: Mapping[str, object] | None = None,
+        matter: Mapping[str, object] | None = None,
+    ) -> Template:
+        """
+        Parse the template source indented by the given number of whitespaces, so that every line of an included
+        template is aligned with the include tag.
+        """
         source = source.rstrip().replace("\n", "\n" + " " * whitespaces)
 
         path = Path(full_name)
 
-        template = env.from_string(
+        return env.from_string(
             source,
             name=path.name,
             path=path,
             globals=globals,
             overlay_data=matter,
         )
-
-        template.uptodate = uptodate
-        return template
@@ -1,5 +1,6 @@
 """Contains all state and context information we need for the rendering process."""
 
+import threading
 import uuid
 from typing import Optional
 
@@ -17,9 +18,18 @@ class RunState:
         self.call_count: int = 0
         self.unittest_batch_id: int = 0
         self.frid_render_anaysis: dict[str, str] = {}
+        # API calls can be made concurrently from several threads.
+        self._call_count_lock = threading.RLock()
 
     def increment_call_count(self):
-        self.call_count += 1
+        with self._call_count_lock:
+            self.call_count += 1
+
+    def next_call_state(self) -> dict:
+        """Increments the call count and returns the state for the new call, atomically."""
+        with self._call_count_lock:
+            self.increment_call_count()
+            return self.to_dict()
 
     def increment_unittest_batch_id(self):
         self.unittest_batch_id += 1
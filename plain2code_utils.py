@@ -13,13 +13,14 @@ AMBIGUITY_CAUSES = {
 
 
 def print_dry_run_output(plain_source_tree: dict, render_range: Optional[list[str]]):
+    specification_views = plain_spec.SpecificationViews(plain_source_tree)
     frid = plain_spec.get_first_frid(plain_source_tree)
 
     while frid is not None:
         is_inside_range = render_range is None or frid in render_range
 
         if is_inside_range:
-            specifications, _ = plain_spec.get_specifications_for_frid(plain_source_tree, frid)
+            specifications, _ = specification_views.get(frid)
             functional_requirement_text = specifications[plain_spec.FUNCTIONAL_REQUIREMENTS][-1]
             console.info(
                 "-------------------------------------"
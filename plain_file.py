@@ -1,14 +1,15 @@
 import io
+import json
 import os
+from contextvars import ContextVar
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Optional
 from urllib.parse import urlparse
 
 import frontmatter
 import mistletoe
 import mistletoe.block_token
-from liquid2 import DictLoader, Environment
 from mistletoe.block_token import List, Paragraph, Quote
 from mistletoe.markdown_renderer import Fragment, MarkdownRenderer
 from mistletoe.span_token import Emphasis, Link, RawText, Strong
@@ -17,8 +18,8 @@ from mistletoe.utils import traverse
 import concept_utils
 import file_utils
 import plain_spec
+from parse_cache import ParseCache
 from plain2code_exceptions import PlainSyntaxError
-from plain2code_nodes import Plain2CodeIncludeTag, Plain2CodeLoaderMixin
 
 RESOURCE_MARKER = "[resource]"
 
@@ -35,6 +36,17 @@ PLAIN_SOURCE_TEMPLATE = {
     plain_spec.TEST_REQUIREMENTS: None,
 }
 
+# Files read while parsing a plain file (file name -> content hash), collected for the parse cache.
+parse_dependencies: ContextVar[Optional[dict[str, str]]] = ContextVar("parse_dependencies", default=None)
+
+# The incremental parser of the plain file being parsed, if any.
+active_incremental_parser: ContextVar[Optional["IncrementalPlainParser"]] = ContextVar(
+    "active_incremental_parser", default=None
+)
+
+# Top-level tokens for which tokenizing the blocks of a plain source separately is the same as tokenizing it at once.
+INCREMENTAL_TOP_LEVEL_TOKENS = (Paragraph, List, Quote)
+
 
 @dataclass
 class PlainFileParseResult:
@@ -307,21 +319,6 @@ def marshall_plain_source(input_plain_source):
     return plain_source
 
 
-class Plain2CodeDictLoader(Plain2CodeLoaderMixin, DictLoader):
-    pass
-
-
-def render_plain_source(plain_source, loaded_templates, code_variables):
-    env = Environment(loader=Plain2CodeDictLoader(loaded_templates))
-    env.tags["include"] = Plain2CodeIncludeTag(env)
-    env.filters["code_variable"] = plain_spec.code_variable_liquid_filter
-    env.filters["prohibited_chars"] = plain_spec.prohibited_chars_liquid_filter
-
-    template = env.from_string(plain_source)
-
-    return template.render(code_variables=code_variables)
-
-
 def process_imports(
     plain_source: dict,
     imports: list[str],
@@ -424,11 +421,13 @@ def parse_plain_source(  # noqa: C901
     else:
         required_concepts = list[str]()
 
-    [_, loaded_templates] = file_utils.get_loaded_templates(template_dirs, plain_source_text)
-
-    plain_source_full_text = render_plain_source(plain_source_obj.content, loaded_templates, code_variables)
+    plain_source_full_text, loaded_templates = file_utils.render_plain_source_with_templates(
+        template_dirs, plain_source_obj.content, code_variables
+    )
+    for template_name, template_source in loaded_templates.items():
+        record_parse_dependency(template_name, template_source)
 
-    plain_file = mistletoe.Document(io.StringIO(plain_source_full_text))
+    plain_file = tokenize_plain_source(plain_source_full_text)
 
     remove_quotes(plain_file)
 
@@ -510,10 +509,17 @@ def parse_plain_source(  # noqa: C901
     )
 
 
+def record_parse_dependency(file_name: str, content: str):
+    dependencies = parse_dependencies.get()
+    if dependencies is not None:
+        dependencies[file_name] = plain_spec.hash_text(content)
+
+
 def read_module_plain_source(module_name: str, template_dirs: list[str]) -> str:
     plain_source_text = file_utils.open_from(template_dirs, module_name + PLAIN_SOURCE_FILE_EXTENSION)
     if plain_source_text is None:
         raise PlainSyntaxError(f"Module does not exist ({module_name}).")
+    record_parse_dependency(module_name + PLAIN_SOURCE_FILE_EXTENSION, plain_source_text)
     return plain_source_text
 
 
@@ -585,12 +591,8 @@ def process_required_modules(
                     raise PlainSyntaxError(f"Syntax error: Invalid exported concept: {concept}.")
 
             with PlainRenderer() as renderer:
-                for exported_concept in exported_concepts:
-                    exported_definitions.extend(
-                        concept_utils.find_concept_definitions_in_plain_source(
-                            exported_concept, plain_file_parse_result.plain_source, renderer
-                        )
-                    )
+                concept_index = concept_utils.ConceptIndex(plain_file_parse_result.plain_source, renderer)
+            exported_definitions.extend(concept_index.get_definitions_closure(exported_concepts))
 
         all_required_modules.append(module_name)
 
@@ -602,21 +604,168 @@ def process_exported_definitions(plain_source: dict, exported_definitions: list[
         return
 
     with PlainRenderer() as renderer:
+        rendered_definitions = {
+            renderer.render(definition).strip() for definition in plain_source[plain_spec.DEFINITIONS].children
+        }
         for exported_definition in exported_definitions:
-            add_defintion = True
-
             exported_rendered_definition = renderer.render(exported_definition).strip()
-            for definition in plain_source[plain_spec.DEFINITIONS].children:
-                rendered_definition = renderer.render(definition).strip()
-                if exported_rendered_definition == rendered_definition:
-                    add_defintion = False
-                    break
-
-            if add_defintion:
+            if exported_rendered_definition not in rendered_definitions:
+                rendered_definitions.add(exported_rendered_definition)
                 plain_source[plain_spec.DEFINITIONS].children.append(exported_definition)
 
 
-def plain_file_parser(  # noqa: C901
+def split_into_blocks(plain_source_text: str) -> list[str]:
+    """Splits the plain source before every unindented line that follows a blank line."""
+    blocks = list[str]()
+    block_lines = list[str]()
+    previous_line_blank = False
+    for line in plain_source_text.splitlines(keepends=True):
+        line_blank = line.strip() == ""
+        if block_lines and previous_line_blank and not line_blank and not line[0].isspace():
+            blocks.append("".join(block_lines))
+            block_lines = []
+
+        block_lines.append(line)
+        previous_line_blank = line_blank
+
+    if block_lines:
+        blocks.append("".join(block_lines))
+
+    return blocks
+
+
+def copy_token(token):
+    # mistletoe tokens can't be copied with the copy module.
+    token_copy = object.__new__(type(token))
+    token_copy.__dict__.update(token.__dict__)
+    if getattr(token, "children", None) is not None:
+        token_copy.children = type(token.children)(copy_token(child) for child in token.children)
+    return token_copy
+
+
+class IncrementalPlainParser:
+    """
+    Parses plain files, tokenizing only the blocks of the plain source that have changed since the previous parse.
+
+    A block starts at every unindented line that follows a blank line, which is where every top-level block of a
+    plain source ends. Blocks are tokenized separately and their tokens are reused (copied, as parsing modifies them)
+    for as long as their text doesn't change. The order of the definitions is reused too while they don't change.
+
+    The result is always the same as the one of a full parse: if a plain source contains anything for which
+    tokenizing the blocks separately isn't equivalent (link reference definitions, code blocks, HTML blocks, ...),
+    it's tokenized in full, and if parsing fails, the plain file is parsed in full again so that the error (and its
+    line numbers) are the same too.
+    """
+
+    def __init__(self):
+        self.block_tokens: dict[str, list] = {}
+        self.definitions_order: dict[str, list[int]] = {}
+        self.tokenized_blocks = 0
+        self.reused_blocks = 0
+        self._parsed_block_tokens: dict[str, list] = {}
+        self._parsed_definitions_order: dict[str, list[int]] = {}
+
+    def tokenize(self, plain_source_text: str) -> Optional[mistletoe.Document]:
+        children = []
+        for block in split_into_blocks(plain_source_text):
+            block_tokens = self.block_tokens.get(block, self._parsed_block_tokens.get(block))
+            if block_tokens is None:
+                block_document = mistletoe.Document(block)
+                if block_document.footnotes or not all(
+                    isinstance(token, INCREMENTAL_TOP_LEVEL_TOKENS) for token in block_document.children
+                ):
+                    return None
+
+                block_tokens = block_document.children
+                self.tokenized_blocks += 1
+            else:
+                self.reused_blocks += 1
+
+            self._parsed_block_tokens[block] = block_tokens
+            children.extend(copy_token(token) for token in block_tokens)
+
+        document = mistletoe.Document("")
+        document.children = children
+        return document
+
+    def sort_definitions(self, definitions: list[dict]):
+        key = json.dumps(definitions)
+        order = self.definitions_order.get(key, self._parsed_definitions_order.get(key))
+        if order is None:
+            unsorted_definitions = list(definitions)
+            concept_utils.sort_definitions(definitions)
+            positions = {id(definition): position for position, definition in enumerate(unsorted_definitions)}
+            order = [positions[id(definition)] for definition in definitions]
+        else:
+            definitions[:] = [definitions[position] for position in order]
+
+        self._parsed_definitions_order[key] = order
+
+    def parse(self, plain_source_file_name: str, template_dirs: list[str]) -> tuple[str, dict, list[str]]:
+        self._parsed_block_tokens = {}
+        self._parsed_definitions_order = {}
+        token = active_incremental_parser.set(self)
+        try:
+            result = parse_plain_file_tree(plain_source_file_name, template_dirs)
+        except Exception:
+            result = None
+        finally:
+            active_incremental_parser.reset(token)
+
+        if result is None:
+            return parse_plain_file_tree(plain_source_file_name, template_dirs)
+
+        # Only the blocks of the latest parse are kept.
+        self.block_tokens = self._parsed_block_tokens
+        self.definitions_order = self._parsed_definitions_order
+        return result
+
+
+def tokenize_plain_source(plain_source_text: str) -> mistletoe.Document:
+    incremental_parser = active_incremental_parser.get()
+    if incremental_parser is not None:
+        plain_source_document = incremental_parser.tokenize(plain_source_text)
+        if plain_source_document is not None:
+            return plain_source_document
+
+    return mistletoe.Document(io.StringIO(plain_source_text))
+
+
+def sort_definitions(definitions: list[dict]):
+    incremental_parser = active_incremental_parser.get()
+    if incremental_parser is not None:
+        incremental_parser.sort_definitions(definitions)
+    else:
+        concept_utils.sort_definitions(definitions)
+
+
+def plain_file_parser(
+    plain_source_file_name: str,
+    template_dirs: list[str],
+    parse_cache: Optional[ParseCache] = None,
+    incremental_parser: Optional[IncrementalPlainParser] = None,
+) -> tuple[str, dict, list[str]]:
+    parse = incremental_parser.parse if incremental_parser is not None else parse_plain_file_tree
+    if parse_cache is None:
+        return parse(plain_source_file_name, template_dirs)
+
+    module_name = Path(plain_source_file_name).stem
+    cached_result = parse_cache.load(module_name, template_dirs)
+    if cached_result is not None:
+        return cached_result
+
+    dependencies: dict[str, str] = {}
+    token = parse_dependencies.set(dependencies)
+    try:
+        result = parse(plain_source_file_name, template_dirs)
+    finally:
+        parse_dependencies.reset(token)
+
+    parse_cache.store(module_name, template_dirs, result, dependencies)
+    return result
+
+
+def parse_plain_file_tree(  # noqa: C901
     plain_source_file_name: str,
     template_dirs: list[str],
 ) -> tuple[str, dict, list[str]]:
@@ -676,6 +825,6 @@ def plain_file_parser(  # noqa: C901
         raise PlainSyntaxError(msg)
 
     if plain_spec.DEFINITIONS in marshalled_plain_source:
-        concept_utils.sort_definitions(marshalled_plain_source[plain_spec.DEFINITIONS])
+        sort_definitions(marshalled_plain_source[plain_spec.DEFINITIONS])
 
     return module_name, marshalled_plain_source, plain_file_parse_result.required_modules
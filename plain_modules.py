@@ -13,6 +13,9 @@ from render_machine.implementation_code_helpers import ImplementationCodeHelpers
 CODEPLAIN_MEMORY_SUBFOLDER = ".memory"
 CODEPLAIN_METADATA_FOLDER = ".codeplain"
 MODULE_METADATA_FILENAME = "module_metadata.json"
+REQUIRED_MODULES_CODE_HASH = "required_modules_code_merkle_hash"
+# Stored by earlier versions, compared with the legacy build folder hash so that existing modules aren't rendered again.
+LEGACY_REQUIRED_MODULES_CODE_HASH = "required_modules_code_hash"
 MODULE_FUNCTIONALITIES = "functionalities"
 REQUIRED_MODULES_FUNCTIONALITIES = "required_modules_functionalities"
 
@@ -51,8 +54,11 @@ class PlainModule:
     def get_module_source_hash(self, plain_source: dict, resources_list: list[dict]) -> str:
         return plain_spec.get_hash_value([plain_source] + resources_list)
 
-    def get_module_code_hash(self) -> str:
-        return ImplementationCodeHelpers.calculate_build_folder_hash(self.get_module_build_folder())
+    def get_module_code_hash(self, cache_folder: str | None = None) -> str:
+        return ImplementationCodeHelpers.calculate_build_folder_hash(self.get_module_build_folder(), cache_folder)
+
+    def get_legacy_module_code_hash(self) -> str:
+        return ImplementationCodeHelpers.calculate_legacy_build_folder_hash(self.get_module_build_folder())
 
     def has_required_modules_code_changed(
         self,
@@ -63,11 +69,19 @@ class PlainModule:
 
         module_metadata = self.load_module_metadata()
 
-        if not module_metadata or "required_modules_code_hash" not in module_metadata:
+        if not module_metadata:
             return True
 
         previous_module = required_modules[-1]
-        return module_metadata["required_modules_code_hash"] != previous_module.get_module_code_hash()
+        if REQUIRED_MODULES_CODE_HASH in module_metadata:
+            return module_metadata[REQUIRED_MODULES_CODE_HASH] != previous_module.get_module_code_hash(
+                self.get_codeplain_folder()
+            )
+
+        if LEGACY_REQUIRED_MODULES_CODE_HASH in module_metadata:
+            return module_metadata[LEGACY_REQUIRED_MODULES_CODE_HASH] != previous_module.get_legacy_module_code_hash()
+
+        return True
 
     def has_plain_spec_changed(self, plain_source: dict, resources_list: list[dict]) -> bool:
         module_metadata = self.load_module_metadata()
@@ -118,7 +132,8 @@ class PlainModule:
 
         if required_modules is not None and len(required_modules) > 0:
             previous_module = required_modules[-1]
-            module_metadata["required_modules_code_hash"] = previous_module.get_module_code_hash()
+            # The file digests are cached with this module's metadata, so the required module isn't modified.
+            module_metadata[REQUIRED_MODULES_CODE_HASH] = previous_module.get_module_code_hash(codeplain_folder)
 
         required_modules_functionalities = {}
         for required_module in required_modules:
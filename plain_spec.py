@@ -1,8 +1,12 @@
 import hashlib
 import json
 import uuid
-from typing import Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
 
+from liquid2 import Undefined
 from liquid2.filter import with_context
 
 from plain2code_exceptions import InvalidLiquidVariableName
@@ -24,94 +28,116 @@ ALLOWED_SPECIFICATION_HEADINGS = [
 
 ALLOWED_IMPORT_SPECIFICATION_HEADINGS = [DEFINITIONS, NON_FUNCTIONAL_REQUIREMENTS, TEST_REQUIREMENTS]
 
+INDEX_CACHE_SIZE = 32
 
-def collect_specification_linked_resources(specification, specification_heading, linked_resources_list):
-    linked_resources = []
-    if "linked_resources" in specification:
-        linked_resources.extend(specification["linked_resources"])
 
-    for resource in linked_resources:
-        resource_found = False
-        for resource_map in linked_resources_list:
-            if resource["text"] == resource_map["text"]:
-                if resource["target"] != resource_map["target"]:
-                    raise Exception(
-                        f"The file {resource['target']} is linked to multiple linked resources with the same text: {resource['text']}"
-                    )
-            elif resource["target"] == resource_map["target"]:
-                if resource["text"] != resource_map["text"]:
-                    raise Exception(
-                        f"The linked resource {resource['text']} is linked to multiple files: {resource_map['target']}"
-                    )
-            else:
-                continue
+@dataclass(frozen=True)
+class _LinkedResourceOccurrence:
+    text: str
+    target: str
+    specification_heading: str
+    # ID of the section of a definition, technical spec or test spec (None for the root section)
+    section_id: Optional[str] = None
+    # FRID of a functional requirement or acceptance test
+    frid: Optional[str] = None
+    is_acceptance_test: bool = False
+
 
-            if resource_found:
-                raise Exception(
-                    "Duplicate linked resource found: " + resource["text"] + " (" + resource["target"] + ")"
+class LinkedResourceIndex:
+    """
+    The linked resources of a plain source tree, indexed in a single pass over the tree.
+
+    The index holds every linked resource occurrence in the order in which the tree is traversed, and for every FRID
+    the number of occurrences up to and including its acceptance tests. Conflicting linked resources (the same text
+    linked to different files or the same file linked with different texts) are detected while indexing. The
+    resources visible to a FRID are computed once per FRID and section filter.
+    """
+
+    def __init__(self, plain_source_tree):
+        self.occurrences: list[_LinkedResourceOccurrence] = []
+        self.frid_occurrences_count: dict[str, int] = {}
+        self._targets_by_text: dict[str, str] = {}
+        self._texts_by_target: dict[str, str] = {}
+        self._resources: dict[tuple, list[dict]] = {}
+
+        self._index_section(plain_source_tree)
+
+    def _add_occurrences(self, specification, specification_heading, **kwargs):
+        for resource in specification.get("linked_resources", []):
+            text = resource["text"]
+            target = resource["target"]
+            if text in self._targets_by_text and self._targets_by_text[text] != target:
+                raise Exception(f"The file {target} is linked to multiple linked resources with the same text: {text}")
+            if target in self._texts_by_target and self._texts_by_target[target] != text:
+                raise Exception(f"The linked resource {text} is linked to multiple files: {target}")
+            self._targets_by_text[text] = target
+            self._texts_by_target[target] = text
+
+            self.occurrences.append(_LinkedResourceOccurrence(text, target, specification_heading, **kwargs))
+
+    def _index_section(self, section):
+        section_id = section.get("ID", None)
+        for specification_heading in [DEFINITIONS, NON_FUNCTIONAL_REQUIREMENTS, TEST_REQUIREMENTS]:
+            for requirement in section.get(specification_heading) or []:
+                self._add_occurrences(requirement, specification_heading, section_id=section_id)
+
+        for functional_requirement_count, requirement in enumerate(section.get(FUNCTIONAL_REQUIREMENTS) or [], 1):
+            current_frid = get_current_frid(section_id, functional_requirement_count)
+            self._add_occurrences(requirement, FUNCTIONAL_REQUIREMENTS, frid=current_frid)
+            for acceptance_test in requirement.get(ACCEPTANCE_TESTS, []):
+                self._add_occurrences(
+                    acceptance_test, FUNCTIONAL_REQUIREMENTS, frid=current_frid, is_acceptance_test=True
                 )
+            self.frid_occurrences_count[current_frid] = len(self.occurrences)
 
-            resource_found = True
-            resource_map["sections"].append(specification_heading)
+        for subsection in section.get("sections", []):
+            self._index_section(subsection)
 
-        if not resource_found:
-            linked_resources_list.append(
-                {"text": resource["text"], "target": resource["target"], "sections": [specification_heading]}
-            )
+    def _is_visible(
+        self, occurrence: _LinkedResourceOccurrence, specifications_list, include_acceptance_tests, frid
+    ) -> bool:
+        if specifications_list and occurrence.specification_heading not in specifications_list:
+            return False
 
+        if occurrence.specification_heading != FUNCTIONAL_REQUIREMENTS:
+            # Definitions, technical specs and test specs are visible in the section of the FRID and its parents.
+            return frid is None or occurrence.section_id is None or frid.startswith(occurrence.section_id)
 
-def collect_linked_resources_in_section(
-    section, linked_resources_list, specifications_list, include_acceptance_tests, frid=Optional[str]
-):
-    # When should we collect specification headings in the current section. Either when one of the following holds true:
-    # - frid wasn't specified
-    # - section has no ID (and that's exactly when it's the root section)
-    # - section has ID, frid was specified and the specified frid inside the current section tree
-    should_collect_specification_headings_in_current_section = (
-        frid is None or "ID" not in section or frid.startswith(section["ID"])
-    )
-    if should_collect_specification_headings_in_current_section:
-        specifications_to_collect = list(set([DEFINITIONS, NON_FUNCTIONAL_REQUIREMENTS, TEST_REQUIREMENTS]))
-        if specifications_list:
-            specifications_to_collect = list(set(specifications_to_collect) & set(specifications_list))
-        for specification_heading in specifications_to_collect:
-            if specification_heading in section:
-                for requirement in section[specification_heading]:
-                    collect_specification_linked_resources(requirement, specification_heading, linked_resources_list)
-
-    if FUNCTIONAL_REQUIREMENTS in section and (
-        not specifications_list or FUNCTIONAL_REQUIREMENTS in specifications_list
-    ):
-        functional_requirement_count = 0
-        for requirement in section[FUNCTIONAL_REQUIREMENTS]:
-            collect_specification_linked_resources(requirement, FUNCTIONAL_REQUIREMENTS, linked_resources_list)
-
-            functional_requirement_count += 1
-            section_id = section.get("ID", None)
-            current_frid = get_current_frid(section_id, functional_requirement_count)
+        if occurrence.is_acceptance_test:
+            return include_acceptance_tests and (frid is None or occurrence.frid == frid)
 
-            if ACCEPTANCE_TESTS in requirement and include_acceptance_tests and (frid is None or frid == current_frid):
-                for acceptance_test in requirement[ACCEPTANCE_TESTS]:
-                    collect_specification_linked_resources(
-                        acceptance_test, FUNCTIONAL_REQUIREMENTS, linked_resources_list
-                    )
+        return True
 
-            if frid is not None and current_frid == frid:
-                # here, we rely on the fact that FRIDs are incrementing. And if we have reached the current FRID, we should
-                # not collect any FRIDs after the current one.
-                return True
+    def _collect_resources(self, specifications_list, include_acceptance_tests, frid) -> list[dict]:
+        occurrences_count = len(self.occurrences)
+        if frid is not None and (not specifications_list or FUNCTIONAL_REQUIREMENTS in specifications_list):
+            # FRIDs are incrementing, so nothing after the current FRID is visible to it.
+            occurrences_count = self.frid_occurrences_count[frid]
 
-    if "sections" in section:
-        for subsection in section["sections"]:
-            if collect_linked_resources_in_section(
-                subsection, linked_resources_list, specifications_list, include_acceptance_tests, frid
-            ):
-                return True
+        resources: dict[str, dict] = {}
+        for occurrence in self.occurrences[:occurrences_count]:
+            if not self._is_visible(occurrence, specifications_list, include_acceptance_tests, frid):
+                continue
+
+            if occurrence.text not in resources:
+                resources[occurrence.text] = {"text": occurrence.text, "target": occurrence.target, "sections": []}
+            resources[occurrence.text]["sections"].append(occurrence.specification_heading)
+
+        return sorted(resources.values(), key=lambda resource: resource["text"])
+
+    def get_linked_resources(
+        self, specifications_list=None, include_acceptance_tests=True, frid: Optional[str] = None
+    ) -> list[dict]:
+        if frid is not None and frid not in self.frid_occurrences_count:
+            raise ValueError(f"frid {frid} does not exist.")
 
-    return False
+        key = (tuple(sorted(specifications_list)) if specifications_list else None, include_acceptance_tests, frid)
+        if key not in self._resources:
+            self._resources[key] = self._collect_resources(specifications_list, include_acceptance_tests, frid)
+
+        return [{**resource, "sections": list(resource["sections"])} for resource in self._resources[key]]
 
 
-# TODO: check if this function can be refactored to return the list of linked resources instead of modifying it in place
 def collect_linked_resources(
     plain_source_tree, linked_resources_list, specifications_list, include_acceptance_tests, frid=None
 ):
@@ -119,36 +145,118 @@ def collect_linked_resources(
     if not isinstance(plain_source_tree, dict):
         raise ValueError("[plain_source_tree must be a dictionary.")
 
-    if frid is not None:
-        functional_requirements = get_frids(plain_source_tree)
-        if frid not in functional_requirements:
-            raise ValueError(f"frid {frid} does not exist.")
-
-    result = collect_linked_resources_in_section(
-        plain_source_tree, linked_resources_list, specifications_list, include_acceptance_tests, frid
+    linked_resources_list.extend(
+        get_linked_resource_index(plain_source_tree).get_linked_resources(
+            specifications_list, include_acceptance_tests, frid
+        )
     )
 
     # Sort linked_resources_list by the "text" field
     linked_resources_list.sort(key=lambda x: x["text"])
 
-    return result
+    return frid is not None and (not specifications_list or FUNCTIONAL_REQUIREMENTS in specifications_list)
 
 
-def get_frids(plain_source_tree):
-    if FUNCTIONAL_REQUIREMENTS in plain_source_tree:
-        for functional_requirement_id in range(1, len(plain_source_tree[FUNCTIONAL_REQUIREMENTS]) + 1):
-            if "ID" in plain_source_tree:
-                yield plain_source_tree["ID"] + "." + str(functional_requirement_id)
-            else:
-                yield str(functional_requirement_id)
+@dataclass(frozen=True)
+class FridIndex:
+    """
+    The FRIDs of a plain source tree in order, with constant time lookups of their position, of the section they are
+    defined in and of their previous and next FRIDs.
+    """
+
+    frids: tuple[str, ...]
+    positions: Mapping[str, int]
+    sections: Mapping[str, dict]
+    previous_frids: Mapping[str, Optional[str]]
+    next_frids: Mapping[str, Optional[str]]
+
+    @staticmethod
+    def build(plain_source_tree) -> "FridIndex":
+        frids: list[str] = []
+        sections: dict[str, dict] = {}
+        _index_frids_in_section(plain_source_tree, frids, sections)
+
+        return FridIndex(
+            frids=tuple(frids),
+            positions=MappingProxyType({frid: position for position, frid in enumerate(frids)}),
+            sections=MappingProxyType(sections),
+            previous_frids=MappingProxyType(dict(zip(frids, [None] + frids[:-1]))),
+            next_frids=MappingProxyType(dict(zip(frids, frids[1:] + [None]))),
+        )
+
+    def __contains__(self, frid) -> bool:
+        return frid in self.positions
+
+    def _check_frid_exists(self, frid: str):
+        if frid not in self.positions:
+            raise Exception(f"Functional requirement {frid} does not exist.")
+
+    def get_first_frid(self) -> Optional[str]:
+        return self.frids[0] if self.frids else None
+
+    def get_next_frid(self, frid: str) -> Optional[str]:
+        self._check_frid_exists(frid)
+        return self.next_frids[frid]
+
+    def get_previous_frid(self, frid: str) -> Optional[str]:
+        self._check_frid_exists(frid)
+        return self.previous_frids[frid]
+
+    def get_frids_before(self, frid: str) -> list[str]:
+        if frid not in self.positions:
+            return list(self.frids)
+        return list(self.frids[: self.positions[frid]])
+
+
+def _index_frids_in_section(section, frids: list[str], sections: dict[str, dict]):
+    if FUNCTIONAL_REQUIREMENTS in section:
+        for functional_requirement_count in range(1, len(section[FUNCTIONAL_REQUIREMENTS]) + 1):
+            frid = get_current_frid(section.get("ID"), functional_requirement_count)
+            frids.append(frid)
+            sections[frid] = section
+
+    if "sections" in section:
+        for subsection in section["sections"]:
+            _index_frids_in_section(subsection, frids, sections)
+
+
+# The most recently used indexes of plain source trees, keyed by the id of the tree. The trees are kept alongside
+# the indexes so that their ids can't be reused by other trees while they are cached.
+_frid_indexes: "OrderedDict[int, tuple[dict, FridIndex]]" = OrderedDict()
+_linked_resource_indexes: "OrderedDict[int, tuple[dict, LinkedResourceIndex]]" = OrderedDict()
 
-    if "sections" in plain_source_tree:
-        for section in plain_source_tree["sections"]:
-            yield from get_frids(section)
+
+def _get_cached_index(indexes: OrderedDict, plain_source_tree, build_index):
+    tree_id = id(plain_source_tree)
+    cached = indexes.get(tree_id)
+    if cached is not None and cached[0] is plain_source_tree:
+        indexes.move_to_end(tree_id)
+        return cached[1]
+
+    index = build_index(plain_source_tree)
+    indexes[tree_id] = (plain_source_tree, index)
+    while len(indexes) > INDEX_CACHE_SIZE:
+        indexes.popitem(last=False)
+
+    return index
+
+
+def get_frid_index(plain_source_tree) -> FridIndex:
+    """Returns the FRID index of the plain source tree, building it only the first time it's requested."""
+    return _get_cached_index(_frid_indexes, plain_source_tree, FridIndex.build)
+
+
+def get_linked_resource_index(plain_source_tree) -> LinkedResourceIndex:
+    """Returns the linked resource index of the plain source tree, building it only the first time it's requested."""
+    return _get_cached_index(_linked_resource_indexes, plain_source_tree, LinkedResourceIndex)
+
+
+def get_frids(plain_source_tree):
+    return iter(get_frid_index(plain_source_tree).frids)
 
 
 def get_first_frid(plain_source_tree):
-    return next(get_frids(plain_source_tree), None)
+    return get_frid_index(plain_source_tree).get_first_frid()
 
 
 def get_current_frid(section_id: Optional[str], functional_requirement_count: int) -> str:
@@ -159,23 +267,11 @@ def get_current_frid(section_id: Optional[str], functional_requirement_count: in
 
 
 def get_next_frid(plain_source_tree, frid):
-    functional_requirements = get_frids(plain_source_tree)
-    for temp_frid in functional_requirements:
-        if temp_frid == frid:
-            return next(functional_requirements, None)
-
-    raise Exception(f"Functional requirement {frid} does not exist.")
+    return get_frid_index(plain_source_tree).get_next_frid(frid)
 
 
 def get_previous_frid(plain_source_tree, frid):
-    previous_frid = None
-    for temp_frid in get_frids(plain_source_tree):
-        if temp_frid == frid:
-            return previous_frid
-
-        previous_frid = temp_frid
-
-    raise Exception(f"Functional requirement {frid} does not exist.")
+    return get_frid_index(plain_source_tree).get_previous_frid(frid)
 
 
 def get_frids_before(plain_source_tree, target_frid: str) -> list[str]:
@@ -189,13 +285,7 @@ def get_frids_before(plain_source_tree, target_frid: str) -> list[str]:
     Returns:
         List of FRIDs that appear before target_frid, in order
     """
-    previous_frids = []
-    for frid in get_frids(plain_source_tree):
-        if frid == target_frid:
-            break
-        previous_frids.append(frid)
-
-    return previous_frids
+    return get_frid_index(plain_source_tree).get_frids_before(target_frid)
 
 
 def get_specification_item_markdown(specification_item, code_variables, replace_code_variables):
@@ -216,120 +306,149 @@ def get_specification_item_markdown(specification_item, code_variables, replace_
     return markdown
 
 
-def get_specifications_from_plain_source_tree(
-    frid,
-    plain_source_tree,
-    definitions,
-    non_functional_requirements,
-    test_requirements,
-    functional_requirements,
-    acceptance_tests,
-    code_variables,
-    replace_code_variables,
-    section_id=None,
-):
-    return_frid = None
-    if FUNCTIONAL_REQUIREMENTS in plain_source_tree and len(plain_source_tree[FUNCTIONAL_REQUIREMENTS]) > 0:
-        functional_requirement_count = 0
-        for functional_requirement in plain_source_tree[FUNCTIONAL_REQUIREMENTS]:
-            functional_requirement_count += 1
-            if section_id is None:
-                current_frid = str(functional_requirement_count)
-            else:
-                current_frid = section_id + "." + str(functional_requirement_count)
+@dataclass
+class _SectionSpecifications:
+    """The definitions, technical specs and test specs of a section, including those of all its parent sections."""
+
+    definitions: list[str]
+    non_functional_requirements: list[str]
+    test_requirements: list[str]
+    # Specification items with code variables, in the order in which their code variables are collected.
+    code_variable_items: list[dict]
+
+
+@dataclass
+class _FridSpecifications:
+    functional_requirement: dict
+    functional_requirements_count: int  # Number of functional requirements up to and including this one
+    section_specifications: _SectionSpecifications
+    code_variables: dict  # Code variables of the functional requirements up to and including this one
+    error: Optional[str]
 
-            functional_requirements.append(
-                get_specification_item_markdown(functional_requirement, code_variables, replace_code_variables)
+
+class SpecificationViews:
+    """
+    The specifications of every FRID of a plain source tree, built in a single pass over the tree.
+
+    FRIDs of the same section share the lists of definitions, technical specs and test specs, and a section without
+    its own specifications shares them with its parent section. The views must therefore not be modified.
+    """
+
+    def __init__(self, plain_source_tree, replace_code_variables=True):
+        self.replace_code_variables = replace_code_variables
+        self._functional_requirements: list[str] = []
+        self._frids: dict[str, _FridSpecifications] = {}
+        self._views: dict[str, tuple[dict, Optional[dict]]] = {}
+
+        self._add_section(plain_source_tree, None, _SectionSpecifications([], [], [], []), {}, None)
+
+    def _get_markdown(self, specification_item) -> str:
+        markdown = specification_item["markdown"]
+        if self.replace_code_variables:
+            for code_variable in specification_item.get("code_variables", []):
+                markdown = markdown.replace(f"{{{{ {code_variable['name']} }}}}", code_variable["value"])
+        return markdown
+
+    def _extend_specifications(self, parent_specifications: list[str], specification_items) -> list[str]:
+        if not specification_items:
+            return parent_specifications
+        return parent_specifications + [self._get_markdown(item) for item in specification_items]
+
+    def _add_section(
+        self,
+        section,
+        section_id: Optional[str],
+        parent_specifications: _SectionSpecifications,
+        code_variables: dict,
+        error: Optional[str],
+    ) -> tuple[dict, Optional[str]]:
+        own_code_variable_items = [
+            item
+            for specification_heading in [DEFINITIONS, NON_FUNCTIONAL_REQUIREMENTS, TEST_REQUIREMENTS]
+            for item in section.get(specification_heading) or []
+            if "code_variables" in item
+        ]
+        section_specifications = _SectionSpecifications(
+            definitions=self._extend_specifications(parent_specifications.definitions, section.get(DEFINITIONS)),
+            non_functional_requirements=self._extend_specifications(
+                parent_specifications.non_functional_requirements, section.get(NON_FUNCTIONAL_REQUIREMENTS)
+            ),
+            test_requirements=self._extend_specifications(
+                parent_specifications.test_requirements, section.get(TEST_REQUIREMENTS)
+            ),
+            code_variable_items=(
+                own_code_variable_items + parent_specifications.code_variable_items
+                if own_code_variable_items
+                else parent_specifications.code_variable_items
+            ),
+        )
+
+        for functional_requirement_count, functional_requirement in enumerate(
+            section.get(FUNCTIONAL_REQUIREMENTS) or [], 1
+        ):
+            if "code_variables" in functional_requirement and error is None:
+                # Copied on write, so that FRIDs without new code variables share the dictionary.
+                code_variables = dict(code_variables)
+                try:
+                    get_specification_item_markdown(functional_requirement, code_variables, False)
+                except Exception as e:
+                    # All the following FRIDs have the same conflicting code variables.
+                    error = str(e)
+
+            self._functional_requirements.append(self._get_markdown(functional_requirement))
+            self._frids[get_current_frid(section_id, functional_requirement_count)] = _FridSpecifications(
+                functional_requirement=functional_requirement,
+                functional_requirements_count=len(self._functional_requirements),
+                section_specifications=section_specifications,
+                code_variables=code_variables,
+                error=error,
             )
 
-            if current_frid == frid:
-                if ACCEPTANCE_TESTS in functional_requirement:
-                    for acceptance_test in functional_requirement[ACCEPTANCE_TESTS]:
-                        acceptance_tests.append(
-                            get_specification_item_markdown(acceptance_test, code_variables, replace_code_variables)
-                        )
-
-                return_frid = current_frid
-                break
-
-    if "sections" in plain_source_tree:
-        for section in plain_source_tree["sections"]:
-            sub_frid = get_specifications_from_plain_source_tree(
-                frid,
-                section,
-                definitions,
-                non_functional_requirements,
-                test_requirements,
-                functional_requirements,
-                acceptance_tests,
-                code_variables,
-                replace_code_variables,
-                section["ID"],
+        for subsection in section.get("sections", []):
+            code_variables, error = self._add_section(
+                subsection, subsection["ID"], section_specifications, code_variables, error
             )
-            if sub_frid is not None:
-                return_frid = sub_frid
-                break
-
-    if return_frid is not None:
-        if DEFINITIONS in plain_source_tree and plain_source_tree[DEFINITIONS] is not None:
-            definitions[0:0] = [
-                get_specification_item_markdown(specification, code_variables, replace_code_variables)
-                for specification in plain_source_tree[DEFINITIONS]
-            ]
-        if (
-            NON_FUNCTIONAL_REQUIREMENTS in plain_source_tree
-            and plain_source_tree[NON_FUNCTIONAL_REQUIREMENTS] is not None
-        ):
-            non_functional_requirements[0:0] = [
-                get_specification_item_markdown(specification, code_variables, replace_code_variables)
-                for specification in plain_source_tree[NON_FUNCTIONAL_REQUIREMENTS]
-            ]
-        if TEST_REQUIREMENTS in plain_source_tree and plain_source_tree[TEST_REQUIREMENTS] is not None:
-            test_requirements[0:0] = [
-                get_specification_item_markdown(specification, code_variables, replace_code_variables)
-                for specification in plain_source_tree[TEST_REQUIREMENTS]
-            ]
 
-    return return_frid
+        return code_variables, error
 
+    def _build_view(self, frid: str) -> tuple[dict, Optional[dict]]:
+        frid_specifications = self._frids.get(frid)
+        if frid_specifications is None:
+            raise Exception(f"Functional requirement {frid} does not exist.")
+        if frid_specifications.error is not None:
+            raise Exception(frid_specifications.error)
 
-def get_specifications_for_frid(plain_source_tree, frid, replace_code_variables=True):
-    definitions = []
-    non_functional_requirements = []
-    test_requirements = []
-    functional_requirements = []
-    acceptance_tests = []
-
-    code_variables = {}
-
-    result = get_specifications_from_plain_source_tree(
-        frid,
-        plain_source_tree,
-        definitions,
-        non_functional_requirements,
-        test_requirements,
-        functional_requirements,
-        acceptance_tests,
-        code_variables,
-        replace_code_variables,
-    )
-    if result is None:
-        raise Exception(f"Functional requirement {frid} does not exist.")
+        code_variables = dict(frid_specifications.code_variables)
+        acceptance_tests = [
+            get_specification_item_markdown(acceptance_test, code_variables, self.replace_code_variables)
+            for acceptance_test in frid_specifications.functional_requirement.get(ACCEPTANCE_TESTS, [])
+        ]
+        section_specifications = frid_specifications.section_specifications
+        for specification_item in section_specifications.code_variable_items:
+            get_specification_item_markdown(specification_item, code_variables, False)
 
-    specifications = {
-        DEFINITIONS: definitions,
-        NON_FUNCTIONAL_REQUIREMENTS: non_functional_requirements,
-        TEST_REQUIREMENTS: test_requirements,
-        FUNCTIONAL_REQUIREMENTS: functional_requirements,
-    }
+        specifications = {
+            DEFINITIONS: section_specifications.definitions,
+            NON_FUNCTIONAL_REQUIREMENTS: section_specifications.non_functional_requirements,
+            TEST_REQUIREMENTS: section_specifications.test_requirements,
+            FUNCTIONAL_REQUIREMENTS: self._functional_requirements[: frid_specifications.functional_requirements_count],
+        }
+        if acceptance_tests:
+            specifications[ACCEPTANCE_TESTS] = acceptance_tests
 
-    if acceptance_tests:
-        specifications[ACCEPTANCE_TESTS] = acceptance_tests
+        return specifications, code_variables if code_variables else None
 
-    if code_variables:
-        return specifications, code_variables
-    else:
-        return specifications, None
+    def get(self, frid) -> tuple[dict, Optional[dict]]:
+        """Returns the specifications of the FRID and its code variables (None if there are none)."""
+        if frid not in self._views:
+            self._views[frid] = self._build_view(frid)
+
+        specifications, code_variables = self._views[frid]
+        return dict(specifications), dict(code_variables) if code_variables is not None else None
+
+
+def get_specifications_for_frid(plain_source_tree, frid, replace_code_variables=True):
+    return SpecificationViews(plain_source_tree, replace_code_variables).get(frid)
 
 
 @with_context
@@ -340,6 +459,10 @@ def code_variable_liquid_filter(value, *, context):
     if "code_variables" in context.globals:
         code_variables = context.globals["code_variables"]
 
+        if isinstance(value, Undefined):
+            # Raises an UndefinedError if undefined variables aren't allowed.
+            str(value)
+
         variable = next(iter(context.scope.items()))
 
         unique_str = uuid.uuid4().hex
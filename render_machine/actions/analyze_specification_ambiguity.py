@@ -1,11 +1,11 @@
 from typing import Any
 
-import file_utils
 import git_utils
 import plain_spec
 from plain2code_console import console
 from plain2code_utils import AMBIGUITY_CAUSES
 from render_machine.actions.base_action import BaseAction
+from render_machine.implementation_code_helpers import ImplementationCodeHelpers
 from render_machine.render_context import RenderContext
 
 
@@ -22,8 +22,7 @@ class AnalyzeSpecificationAmbiguity(BaseAction):
             )
         previous_frid = plain_spec.get_previous_frid(render_context.plain_source_tree, render_context.frid_context.frid)
         git_utils.checkout_commit_with_frid(render_context.build_folder, previous_frid)
-        existing_files = file_utils.list_all_text_files(render_context.build_folder)
-        existing_files_content = file_utils.get_existing_files_content(render_context.build_folder, existing_files)
+        _, existing_files_content = ImplementationCodeHelpers.fetch_existing_files(render_context.build_folder)
         git_utils.checkout_previous_branch(render_context.build_folder)
         implementation_code_diff = git_utils.get_implementation_code_diff(
             render_context.build_folder, render_context.frid_context.frid, previous_frid
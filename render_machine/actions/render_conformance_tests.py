@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import Any
 
@@ -36,17 +37,9 @@ class RenderConformanceTests(BaseAction):
             with console.status(
                 f"[{console.INFO_STYLE}]Generating folder name for conformance tests for functional requirement {render_context.conformance_tests_running_context.current_testing_frid}...\n"
             ):
-                fr_subfolder_name = render_context.codeplain_api.generate_folder_name_from_functional_requirement(
-                    frid=render_context.conformance_tests_running_context.current_testing_frid,
-                    functional_requirement=render_context.conformance_tests_running_context.current_testing_frid_specifications[
-                        plain_spec.FUNCTIONAL_REQUIREMENTS
-                    ][
-                        -1
-                    ],
-                    existing_folder_names=render_context.conformance_tests.fetch_existing_conformance_test_folder_names(
-                        render_context.conformance_tests_running_context.current_testing_module_name
-                    ),
-                    run_state=render_context.run_state,
+                # The folder name doesn't depend on the code files, so we fetch them while waiting for the API.
+                fr_subfolder_name, existing_files_content, memory_files_content = asyncio.run(
+                    self._generate_folder_name_and_fetch_files(render_context)
                 )
 
             conformance_tests_folder_name = os.path.join(
@@ -69,9 +62,9 @@ class RenderConformanceTests(BaseAction):
             conformance_tests_folder_name = (
                 render_context.conformance_tests_running_context.get_current_conformance_test_folder_name()
             )
+            _, existing_files_content = ImplementationCodeHelpers.fetch_existing_files(render_context.build_folder)
+            _, memory_files_content = MemoryManager.fetch_memory_files(render_context.memory_manager.memory_folder)
 
-        _, existing_files_content = ImplementationCodeHelpers.fetch_existing_files(render_context.build_folder)
-        _, memory_files_content = MemoryManager.fetch_memory_files(render_context.memory_manager.memory_folder)
         if render_context.verbose:
             tmp_resources_list = []
             plain_spec.collect_linked_resources(
@@ -95,6 +88,8 @@ class RenderConformanceTests(BaseAction):
             )
 
         all_acceptance_tests = render_context.frid_context.specifications.get(plain_spec.ACCEPTANCE_TESTS, [])
+        # Streamed files are written to the conformance tests folder as soon as they're received.
+        response_file_writer = file_utils.ResponseFileWriter(conformance_tests_folder_name, [])
         with console.status(
             f"[{console.INFO_STYLE}]Rendering conformance test for functional requirement {render_context.conformance_tests_running_context.current_testing_frid}...\n"
         ):
@@ -113,13 +108,15 @@ class RenderConformanceTests(BaseAction):
                 ),
                 all_acceptance_tests,
                 run_state=render_context.run_state,
+                on_file=response_file_writer,
+                on_discard=response_file_writer.discard,
             )
 
         render_context.conformance_tests_running_context.current_testing_frid_high_level_implementation_plan = (
             implementation_plan_summary
         )
 
-        file_utils.store_response_files(conformance_tests_folder_name, response_files, [])
+        response_file_writer.store_remaining_files(response_files)
 
         if render_context.verbose:
             console.print_files(
@@ -131,6 +128,24 @@ class RenderConformanceTests(BaseAction):
 
         return self.SUCCESSFUL_OUTCOME, None
 
+    async def _generate_folder_name_and_fetch_files(self, render_context: RenderContext):
+        folder_name_request = render_context.async_codeplain_api.generate_folder_name_from_functional_requirement(
+            frid=render_context.conformance_tests_running_context.current_testing_frid,
+            functional_requirement=render_context.conformance_tests_running_context.current_testing_frid_specifications[
+                plain_spec.FUNCTIONAL_REQUIREMENTS
+            ][-1],
+            existing_folder_names=render_context.conformance_tests.fetch_existing_conformance_test_folder_names(
+                render_context.conformance_tests_running_context.current_testing_module_name
+            ),
+            run_state=render_context.run_state,
+        )
+        fr_subfolder_name, (_, existing_files_content), (_, memory_files_content) = await asyncio.gather(
+            folder_name_request,
+            asyncio.to_thread(ImplementationCodeHelpers.fetch_existing_files, render_context.build_folder),
+            asyncio.to_thread(MemoryManager.fetch_memory_files, render_context.memory_manager.memory_folder),
+        )
+        return fr_subfolder_name, existing_files_content, memory_files_content
+
     def _render_acceptance_test(self, render_context: RenderContext):
         _, existing_files_content = ImplementationCodeHelpers.fetch_existing_files(render_context.build_folder)
         _, memory_files_content = MemoryManager.fetch_memory_files(render_context.memory_manager.memory_folder)
@@ -40,6 +40,8 @@ class RenderFunctionalRequirement(BaseAction):
                     render_context, existing_files_content, "Files sent as input to code generation:"
                 )
 
+            # Streamed files are written to the build folder as soon as they're received.
+            response_file_writer = file_utils.ResponseFileWriter(render_context.build_folder, existing_files)
             with console.status(
                 f"[{console.INFO_STYLE}]Generating functional requirement {render_context.frid_context.frid}...\n"
             ):
@@ -52,6 +54,8 @@ class RenderFunctionalRequirement(BaseAction):
                     render_context.module_name,
                     render_context.get_required_modules_functionalities(),
                     render_context.run_state,
+                    on_file=response_file_writer,
+                    on_discard=response_file_writer.discard,
                 )
         except FunctionalRequirementTooComplex as e:
             error_message = f"The functional requirement:\n{render_context.frid_context.functional_requirement_text}\n is too complex to be implemented. Please break down the functional requirement into smaller parts ({str(e)})."
@@ -70,10 +74,8 @@ class RenderFunctionalRequirement(BaseAction):
                 ).to_payload(),
             )
 
-        _, changed_files = file_utils.update_build_folder_with_rendered_files(
-            render_context.build_folder, existing_files, response_files
-        )
-        render_context.frid_context.changed_files.update(changed_files)
+        response_file_writer.store_remaining_files(response_files)
+        render_context.frid_context.changed_files.update(response_files.keys())
 
         if render_context.verbose:
             console.print_files(
@@ -21,9 +21,8 @@ class ConformanceTestHelpers:
         conformance_test_folder_name = ConformanceTestHelpers.get_current_conformance_test_folder_name(
             conformance_tests_running_context
         )
-        existing_conformance_test_files = file_utils.list_all_text_files(conformance_test_folder_name)
-        existing_conformance_test_files_content = file_utils.get_existing_files_content(
-            conformance_test_folder_name, existing_conformance_test_files
+        existing_conformance_test_files, existing_conformance_test_files_content = file_utils.read_all_text_files(
+            conformance_test_folder_name
         )
         return existing_conformance_test_files, existing_conformance_test_files_content
 
@@ -162,8 +162,7 @@ class ConformanceTests:
                 current_conformance_test_folder_name,
             )
 
-        existing_conformance_test_files = file_utils.list_all_text_files(current_conformance_test_folder_name)
-        existing_conformance_test_files_content = file_utils.get_existing_files_content(
-            current_conformance_test_folder_name, existing_conformance_test_files
+        existing_conformance_test_files, existing_conformance_test_files_content = file_utils.read_all_text_files(
+            current_conformance_test_folder_name
         )
         return existing_conformance_test_files, existing_conformance_test_files_content
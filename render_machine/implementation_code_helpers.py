@@ -1,5 +1,6 @@
-import json
+from typing import Optional
 
+import build_folder_hash
 import file_utils
 import git_utils
 import plain_spec
@@ -7,15 +8,16 @@ import plain_spec
 
 class ImplementationCodeHelpers:
     @staticmethod
-    def calculate_build_folder_hash(build_folder: str) -> str:
-        _, existing_files_content = ImplementationCodeHelpers.fetch_existing_files(build_folder)
-        return plain_spec.hash_text(f"folder={build_folder}|{json.dumps(existing_files_content)}")
+    def calculate_build_folder_hash(build_folder: str, cache_folder: Optional[str] = None) -> str:
+        return build_folder_hash.calculate_build_folder_hash(build_folder, cache_folder)
+
+    @staticmethod
+    def calculate_legacy_build_folder_hash(build_folder: str) -> str:
+        return build_folder_hash.calculate_legacy_build_folder_hash(build_folder)
 
     @staticmethod
     def fetch_existing_files(build_folder: str):
-        existing_files = file_utils.list_all_text_files(build_folder)
-        existing_files_content = file_utils.get_existing_files_content(build_folder, existing_files)
-        return existing_files, existing_files_content
+        return file_utils.get_build_folder_snapshot(build_folder).fetch()
 
     @staticmethod
     def get_code_diff(build_folder: str, plain_source_tree: dict, frid: str):
@@ -4,7 +4,7 @@ from typing import Optional
 import file_utils
 import git_utils
 import plain_spec
-from codeplain_REST_api import CodeplainAPI
+from codeplain_REST_api import AsyncCodeplainAPI, CodeplainAPI
 from event_bus import EventBus
 from plain2code_console import console
 from plain2code_events import RenderContextSnapshot
@@ -53,6 +53,7 @@ class RenderContext:
         event_bus: EventBus,
     ):
         self.codeplain_api: CodeplainAPI = codeplain_api
+        self.async_codeplain_api = AsyncCodeplainAPI(codeplain_api)
         self.memory_manager = memory_manager
         self.plain_source_tree = plain_source_tree
         self.module_name = module_name
@@ -75,6 +76,7 @@ class RenderContext:
         self.event_bus = event_bus
         self.script_execution_history = ScriptExecutionHistory()
         self.starting_frid = None
+        self.specification_views = plain_spec.SpecificationViews(plain_source_tree)
 
         resources_list = []
         plain_spec.collect_linked_resources(plain_source_tree, resources_list, None, True)
@@ -145,7 +147,7 @@ class RenderContext:
             self.machine.dispatch(triggers.PREPARE_FINAL_OUTPUT)
             return
 
-        specifications, _ = plain_spec.get_specifications_for_frid(self.plain_source_tree, frid)
+        specifications, _ = self.specification_views.get(frid)
         functional_requirement_text = specifications[plain_spec.FUNCTIONAL_REQUIREMENTS][-1]
 
         resources_list = []
@@ -280,7 +282,7 @@ class RenderContext:
         self.conformance_tests_running_context = self.get_first_conformance_tests_running_context()
 
     def finish_unittests_processing(self):
-        existing_files = file_utils.list_all_text_files(self.build_folder)
+        existing_files, _ = file_utils.get_build_folder_snapshot(self.build_folder).fetch()
 
         # TODO: Double check if this logic is what we want
         for file_name in self.unit_tests_running_context.changed_files:
@@ -413,9 +415,7 @@ class RenderContext:
 
             if self.conformance_tests_running_context.current_testing_module_name == self.module_name:
                 self.conformance_tests_running_context.current_testing_frid_specifications, _ = (
-                    plain_spec.get_specifications_for_frid(
-                        self.plain_source_tree, self.conformance_tests_running_context.current_testing_frid
-                    )
+                    self.specification_views.get(self.conformance_tests_running_context.current_testing_frid)
                 )
             else:
                 self.conformance_tests_running_context.current_testing_frid_specifications = (
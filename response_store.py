@@ -0,0 +1,120 @@
+"""On-disk store of API responses, used to record renders and to replay them without network access."""
+
+import glob
+import json
+import os
+from typing import Optional
+
+import requests
+
+import plain_spec
+from plain2code_exceptions import MissingRecordedResponse
+
+
+class ResponseStore:
+    """
+    Stores API responses keyed by (render_id, call_count, attempt, endpoint, payload hash).
+
+    Each attempt of a call is stored in its own file
+    `<folder>/<render_id>/<call_count>-<attempt>-<endpoint>-<payload hash>.json`, so replaying a call goes through the
+    same failed attempts and retries as the recorded one. The payload hash doesn't include the render state, so a
+    replayed render matches the recorded one as long as it sends the same requests in the same order.
+    """
+
+    def __init__(self, folder: str, replay: bool):
+        self.folder = folder
+        self.replay = replay
+
+    @staticmethod
+    def get_payload_hash(payload: dict) -> str:
+        return plain_spec.hash_text(
+            json.dumps({key: value for key, value in payload.items() if key != "render_state"}, sort_keys=True)
+        )
+
+    def _get_response_path(
+        self, render_id: str, call_count: int, attempt: int, endpoint: str, payload_hash: str
+    ) -> str:
+        return os.path.join(self.folder, render_id, f"{call_count:06d}-{attempt:02d}-{endpoint}-{payload_hash}.json")
+
+    def _save(self, endpoint: str, payload: dict, attempt: int, recorded_attempt: dict):
+        render_state = payload["render_state"]
+        payload_hash = self.get_payload_hash(payload)
+        response_path = self._get_response_path(
+            render_state["render_id"], render_state["call_count"], attempt, endpoint, payload_hash
+        )
+        os.makedirs(os.path.dirname(response_path), exist_ok=True)
+
+        with open(response_path, "w") as f:
+            json.dump(
+                {
+                    "render_id": render_state["render_id"],
+                    "call_count": render_state["call_count"],
+                    "attempt": attempt,
+                    "endpoint": endpoint,
+                    "payload_hash": payload_hash,
+                    **recorded_attempt,
+                },
+                f,
+                indent=4,
+            )
+
+    def record(
+        self, endpoint: str, payload: dict, attempt: int, response: requests.Response, body: Optional[str] = None
+    ):
+        """Records the response. The body is read from the response unless it's given (e.g. the lines of a stream)."""
+        # Failed responses are recorded too, so that replaying also reproduces the error handling.
+        self._save(
+            endpoint,
+            payload,
+            attempt,
+            {
+                "status_code": response.status_code,
+                "reason": response.reason,
+                "url": response.url,
+                "content_type": response.headers.get("Content-Type"),
+                "body": response.text if body is None else body,
+            },
+        )
+
+    def record_error(self, endpoint: str, payload: dict, attempt: int, error: requests.exceptions.RequestException):
+        """Records an attempt that failed without a response (e.g. a connection error or a timeout)."""
+        self._save(endpoint, payload, attempt, {"error_type": type(error).__name__, "error": str(error)})
+
+    def load(self, endpoint: str, payload: dict, attempt: int) -> requests.Response:
+        """Returns the recorded response, or raises the recorded error if the attempt failed without a response."""
+        render_state = payload["render_state"]
+        response_path = self._get_response_path(
+            render_state["render_id"], render_state["call_count"], attempt, endpoint, self.get_payload_hash(payload)
+        )
+        if not os.path.exists(response_path):
+            message = (
+                f"No recorded response for attempt {attempt} of call {render_state['call_count']} to {endpoint} "
+                f"of render {render_state['render_id']} in {self.folder}."
+            )
+            other_payload_path = self._get_response_path(
+                render_state["render_id"], render_state["call_count"], attempt, endpoint, "*"
+            )
+            if glob.glob(other_payload_path):
+                message += " The call was recorded with a different payload."
+            raise MissingRecordedResponse(message)
+
+        with open(response_path, "r") as f:
+            recorded_response = json.load(f)
+
+        if "error_type" in recorded_response:
+            error_class = getattr(requests.exceptions, recorded_response["error_type"], None)
+            if not (isinstance(error_class, type) and issubclass(error_class, requests.exceptions.RequestException)):
+                error_class = requests.exceptions.ConnectionError
+            raise error_class(recorded_response["error"])
+
+        response = requests.Response()
+        response.status_code = recorded_response["status_code"]
+        response.reason = recorded_response["reason"]
+        response.url = recorded_response["url"]
+        if recorded_response["content_type"] is not None:
+            response.headers["Content-Type"] = recorded_response["content_type"]
+        response._content = recorded_response["body"].encode("utf-8")
+        # Lets streamed responses be read with `iter_lines` from the content.
+        response._content_consumed = True
+        response.encoding = "utf-8"
+        return response
@@ -0,0 +1,250 @@
+"""Retry policy and circuit breaker for the requests CodeplainAPI sends."""
+
+import email.utils
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import requests
+
+import plain2code_exceptions
+
+DEFAULT_BASE_DELAY = 3  # seconds
+DEFAULT_MAX_DELAY = 120  # seconds
+
+# Categories of failed requests, each of which has its own retry budget.
+CONNECT_ERROR = "connect_error"
+TIMEOUT = "timeout"
+SERVER_ERROR = "server_error"
+RATE_LIMITED = "rate_limited"
+LLM_ERROR = "llm_error"
+INVALID_RESPONSE = "invalid_response"
+
+# Number of retries per category of failure, for a single request.
+DEFAULT_RETRY_BUDGETS = {
+    CONNECT_ERROR: 4,
+    TIMEOUT: 2,
+    SERVER_ERROR: 4,
+    RATE_LIMITED: 6,
+    LLM_ERROR: 4,
+    INVALID_RESPONSE: 2,
+}
+
+# Failures that indicate that the service (rather than a single request) is unhealthy.
+CIRCUIT_BREAKER_CATEGORIES = [CONNECT_ERROR, TIMEOUT, SERVER_ERROR]
+
+DEFAULT_FAILURE_THRESHOLD = 10
+DEFAULT_RESET_TIMEOUT = 60  # seconds
+
+
+@dataclass
+class RetryDecision:
+    retry: bool
+    category: Optional[str]
+    delay: float = 0
+    reason: str = ""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to the API after too many consecutive service failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and requests fail immediately. After
+    `reset_timeout` seconds a single trial request is let through (half-open); the circuit closes again if it succeeds.
+    The breaker is meant to be shared by all the renders running in the same process.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_request_in_flight = False
+
+    def before_request(self):
+        """Raises ServiceUnavailable if the circuit is open."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                logging.info("Circuit breaker half-open, letting a trial request through.")
+                self.state = self.HALF_OPEN
+                self._trial_request_in_flight = False
+
+            if self.state == self.HALF_OPEN and not self._trial_request_in_flight:
+                self._trial_request_in_flight = True
+                return
+
+            raise plain2code_exceptions.ServiceUnavailable(
+                f"The API failed {self.consecutive_failures} times in a row, not sending requests for "
+                f"{self.reset_timeout} seconds."
+            )
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info("Circuit breaker closed.")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_request_in_flight = False
+
+    def end_trial_request(self):
+        """
+        Lets another trial request through after one that neither succeeded nor failed because of the service (e.g. a
+        request the API rejected).
+        """
+        with self._lock:
+            self._trial_request_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"Circuit breaker opened after {self.consecutive_failures} consecutive failures.")
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+                self._trial_request_in_flight = False
+
+
+default_circuit_breaker = CircuitBreaker()
+
+
+def get_retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    """Returns the delay in seconds requested by the `Retry-After` response header, if any."""
+    if response is None or "Retry-After" not in response.headers:
+        return None
+
+    retry_after = response.headers["Retry-After"].strip()
+    if retry_after.isdigit():
+        return float(retry_after)
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def get_failure_category(error: Exception, response: Optional[requests.Response]) -> Optional[str]:
+    """Returns the category of a failed request, or None if the request shouldn't be retried."""
+    if isinstance(error, requests.exceptions.Timeout):
+        return TIMEOUT
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return CONNECT_ERROR
+    if isinstance(error, plain2code_exceptions.LLMInternalError):
+        return LLM_ERROR
+    # Error pages of proxies and load balancers aren't JSON, so the status code decides even if decoding failed.
+    is_decode_error = isinstance(error, (requests.exceptions.JSONDecodeError, json.JSONDecodeError))
+    if (isinstance(error, requests.exceptions.HTTPError) or is_decode_error) and response is not None:
+        if response.status_code == requests.codes.too_many_requests:
+            return RATE_LIMITED
+        if response.status_code >= 500:
+            return SERVER_ERROR
+    if is_decode_error:
+        return INVALID_RESPONSE
+    return None
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is retried.
+
+    Delays use decorrelated jitter (each delay is random between the base delay and three times the previous delay,
+    capped at the max delay) so that concurrent renders don't retry in lockstep. A `Retry-After` response header
+    takes precedence if it asks for a longer delay. Each failure category has its own retry budget.
+    """
+
+    def __init__(
+        self,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        retry_budgets: Optional[dict[str, int]] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        random_generator: Optional[random.Random] = None,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budgets = dict(DEFAULT_RETRY_BUDGETS)
+        if retry_budgets is not None:
+            self.retry_budgets.update(retry_budgets)
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else default_circuit_breaker
+        self._random = random_generator if random_generator is not None else random.Random()
+
+    def start_request(self) -> "RequestRetries":
+        return RequestRetries(self)
+
+
+class RequestRetries:
+    """Retry state of a single request."""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.attempt = 0
+        self.retries: dict[str, int] = {}
+        self.previous_delay = policy.base_delay
+
+    def before_attempt(self):
+        self.attempt += 1
+        self.policy.circuit_breaker.before_request()
+
+    def record_success(self):
+        self.policy.circuit_breaker.record_success()
+
+    def on_failure(self, error: Exception, response: Optional[requests.Response]) -> RetryDecision:
+        category = get_failure_category(error, response)
+        if category in CIRCUIT_BREAKER_CATEGORIES:
+            self.policy.circuit_breaker.record_failure()
+        elif response is not None and 200 <= response.status_code < 300:
+            # The service responded successfully, so it's up even though the response couldn't be used.
+            self.policy.circuit_breaker.record_success()
+        else:
+            # Otherwise the attempt says nothing about the health of the service, but it's over, so it mustn't keep
+            # the half-open circuit waiting for its outcome.
+            self.policy.circuit_breaker.end_trial_request()
+
+        if category is None:
+            decision = RetryDecision(False, None, reason=f"{type(error).__name__} is not retryable")
+        elif self.retries.get(category, 0) >= self.policy.retry_budgets.get(category, 0):
+            decision = RetryDecision(
+                False, category, reason=f"retry budget of {self.policy.retry_budgets.get(category, 0)} exhausted"
+            )
+        else:
+            self.retries[category] = self.retries.get(category, 0) + 1
+            delay = min(
+                self.policy.max_delay,
+                self.policy._random.uniform(self.policy.base_delay, self.previous_delay * 3),
+            )
+            self.previous_delay = max(delay, self.policy.base_delay)
+            reason = "decorrelated jitter"
+
+            retry_after = get_retry_after(response)
+            if retry_after is not None and retry_after > delay:
+                delay = retry_after
+                reason = "Retry-After header"
+
+            decision = RetryDecision(True, category, delay, reason)
+
+        logging.info(
+            f"Retry policy decision on attempt {self.attempt} ({type(error).__name__}): "
+            f"category={decision.category}, retry={decision.retry}, delay={decision.delay:.2f}s, "
+            f"reason={decision.reason}, retries={self.retries}"
+        )
+        return decision
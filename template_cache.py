@@ -0,0 +1,126 @@
+"""Process-wide cache of compiled Liquid templates, so that included templates aren't compiled over and over."""
+
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Mapping, Optional
+
+import liquid2
+
+import plain_spec
+
+# Bump whenever the way templates are compiled changes, so that entries of older clients aren't used.
+TEMPLATE_CACHE_VERSION = 2
+
+TEMPLATE_CACHE_CAPACITY = 300
+
+TemplateCacheKey = tuple[str, int, int, int]
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    # The template source as read from the file (before it's indented), so that loaded templates can be tracked.
+    source: str
+    # The parsed Liquid nodes of the indented template source.
+    nodes: list[Any]
+    # The variables the loader associated with the template (e.g. its front matter).
+    matter: Optional[Mapping[str, object]] = None
+
+
+class TemplateCache:
+    """
+    Stores compiled templates keyed by the resolved path of the template file, its modification time and size and
+    the indentation the template was included with (see `Plain2CodeIncludeNode`).
+
+    The templates are kept in memory (least recently used first out) and, if a folder is set, also persisted to disk,
+    so that batch renders of many modules don't compile the same templates again.
+    """
+
+    def __init__(self, folder: Optional[str] = None, capacity: int = TEMPLATE_CACHE_CAPACITY):
+        self.folder = folder
+        self.capacity = capacity
+        self._templates: OrderedDict[TemplateCacheKey, CompiledTemplate] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(path: Path, whitespaces: int) -> TemplateCacheKey:
+        stat = path.stat()
+        return str(path.resolve()), stat.st_mtime_ns, stat.st_size, whitespaces
+
+    def _get_entry_path(self, key: TemplateCacheKey) -> str:
+        assert self.folder is not None
+        # The pickled nodes are liquid2 objects, which can change between liquid2 versions.
+        entry_key = (TEMPLATE_CACHE_VERSION, liquid2.__version__, key)
+        return os.path.join(self.folder, f"{plain_spec.hash_text(repr(entry_key))}.pickle")
+
+    def _load_from_disk(self, key: TemplateCacheKey) -> Optional[CompiledTemplate]:
+        if self.folder is None:
+            return None
+
+        entry_path = self._get_entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with open(entry_path, "rb") as f:
+                compiled_template = pickle.load(f)
+        except Exception as e:
+            # Corrupted entries and entries that can't be unpickled anymore are cache misses.
+            logging.debug(f"Failed to load the compiled template {key[0]} from the template cache: {e}")
+            return None
+
+        if not isinstance(compiled_template, CompiledTemplate):
+            return None
+
+        return compiled_template
+
+    def _store_to_disk(self, key: TemplateCacheKey, compiled_template: CompiledTemplate):
+        if self.folder is None:
+            return
+
+        entry_path = self._get_entry_path(key)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            # Written to a temporary file first so that concurrent renders never read a partially written entry.
+            temporary_entry_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_entry_path, "wb") as f:
+                pickle.dump(compiled_template, f)
+            os.replace(temporary_entry_path, entry_path)
+        except (OSError, pickle.PicklingError) as e:
+            logging.debug(f"Failed to store the compiled template {key[0]} in the template cache: {e}")
+
+    def get(self, key: TemplateCacheKey) -> Optional[CompiledTemplate]:
+        with self._lock:
+            compiled_template = self._templates.get(key)
+            if compiled_template is not None:
+                self._templates.move_to_end(key)
+                return compiled_template
+
+        compiled_template = self._load_from_disk(key)
+        if compiled_template is not None:
+            self._remember(key, compiled_template)
+
+        return compiled_template
+
+    def put(self, key: TemplateCacheKey, compiled_template: CompiledTemplate):
+        self._remember(key, compiled_template)
+        self._store_to_disk(key, compiled_template)
+
+    def _remember(self, key: TemplateCacheKey, compiled_template: CompiledTemplate):
+        with self._lock:
+            self._templates[key] = compiled_template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.capacity:
+                self._templates.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+# Shared by all the Liquid environments of the process.
+shared_template_cache = TemplateCache()
@@ -0,0 +1,171 @@
+import json
+import os
+from unittest.mock import patch
+
+from git import Repo
+
+import build_folder_hash
+import file_utils
+import plain_modules
+import plain_spec
+from git_utils import init_git_repo, is_dirty
+from plain_modules import LEGACY_REQUIRED_MODULES_CODE_HASH, PlainModule
+
+
+def write_file(folder, file_name, content, mode="w", age=60):
+    full_file_name = os.path.join(folder, file_name)
+    os.makedirs(os.path.dirname(full_file_name), exist_ok=True)
+    with open(full_file_name, mode) as f:
+        f.write(content)
+
+    # Files modified right before they were hashed are hashed again next time.
+    modification_time = os.stat(full_file_name).st_mtime - age
+    os.utime(full_file_name, (modification_time, modification_time))
+
+
+def setup_build_folder(build_folder):
+    write_file(build_folder, "main.py", "print('hello')\n")
+    write_file(build_folder, "src/utils.py", "def util():\n    pass\n")
+    write_file(build_folder, "src/image.bin", b"\xff\xfe\x00", mode="wb")
+    write_file(build_folder, ".git/HEAD", "ref: refs/heads/main\n")
+
+
+def test_build_folder_hash(tmp_path):
+    build_folder = str(tmp_path)
+    setup_build_folder(build_folder)
+    build_hash = build_folder_hash.calculate_build_folder_hash(build_folder)
+
+    # Binary files, system folders and empty folders don't change the hash.
+    write_file(build_folder, "src/other.bin", b"\xff", mode="wb")
+    write_file(build_folder, ".git/ORIG_HEAD", "ref: refs/heads/main\n")
+    os.makedirs(os.path.join(build_folder, "empty"))
+    assert build_folder_hash.calculate_build_folder_hash(build_folder) == build_hash
+
+    write_file(build_folder, "src/utils.py", "def util():\n    return 1\n", age=30)
+    changed_build_hash = build_folder_hash.calculate_build_folder_hash(build_folder)
+    assert changed_build_hash != build_hash
+
+    os.rename(os.path.join(build_folder, "src", "utils.py"), os.path.join(build_folder, "utils.py"))
+    assert build_folder_hash.calculate_build_folder_hash(build_folder) not in (build_hash, changed_build_hash)
+
+
+def test_only_changed_files_are_hashed_again(tmp_path):
+    build_folder = str(tmp_path / "build")
+    cache_folder = str(tmp_path / "cache")
+    setup_build_folder(build_folder)
+    write_file(build_folder, "recent.py", "print('recent')\n", age=0)
+
+    with patch("build_folder_hash.hash_file", wraps=build_folder_hash.hash_file) as mock_hash_file:
+        build_hash = build_folder_hash.calculate_build_folder_hash(build_folder, cache_folder)
+        assert mock_hash_file.call_count == 4
+
+        # A new process only has the persisted digests.
+        assert build_folder_hash.calculate_build_folder_hash(build_folder, cache_folder) == build_hash
+        assert [os.path.basename(call.args[0]) for call in mock_hash_file.call_args_list[4:]] == ["recent.py"]
+
+        write_file(build_folder, "src/utils.py", "def util():\n    return 1\n", age=30)
+        build_folder_hash.calculate_build_folder_hash(build_folder, cache_folder)
+        assert sorted(os.path.basename(call.args[0]) for call in mock_hash_file.call_args_list[5:]) == [
+            "recent.py",
+            "utils.py",
+        ]
+
+        # The digests of another build folder aren't used.
+        other_build_folder = str(tmp_path / "other")
+        setup_build_folder(other_build_folder)
+        build_folder_hash.calculate_build_folder_hash(other_build_folder, cache_folder)
+        assert mock_hash_file.call_count == 7 + 3
+
+
+def test_file_digests_are_ignored_by_git(tmp_path):
+    module_folder = str(tmp_path / "module")
+    init_git_repo(module_folder)
+    write_file(module_folder, "main.py", "print('hello')\n")
+    Repo(module_folder).git.add(".")
+    Repo(module_folder).index.commit("Initial commit")
+
+    cache_folder = os.path.join(module_folder, plain_modules.CODEPLAIN_METADATA_FOLDER)
+    setup_build_folder(str(tmp_path / "required"))
+    build_folder_hash.calculate_build_folder_hash(str(tmp_path / "required"), cache_folder)
+
+    assert os.path.exists(build_folder_hash.get_build_folder_hash_cache_path(cache_folder))
+    assert not is_dirty(module_folder)
+
+
+def list_files(folder):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), folder) for root, _, names in os.walk(folder) for name in names
+    )
+
+
+def test_checking_required_modules_does_not_modify_them(tmp_path):
+    required_folder = str(tmp_path / "required")
+    init_git_repo(required_folder)
+    setup_build_folder(required_folder)
+    write_file(required_folder, ".codeplain/module_metadata.json", json.dumps({"functionalities": []}))
+    Repo(required_folder).git.add(".")
+    Repo(required_folder).index.commit("Initial commit")
+    files_before = list_files(required_folder)
+
+    required_module = PlainModule("required", str(tmp_path))
+    module = PlainModule("module", str(tmp_path))
+    module.save_module_metadata({plain_spec.FUNCTIONAL_REQUIREMENTS: []}, [], [required_module])
+    assert not module.has_required_modules_code_changed([required_module])
+
+    assert list_files(required_folder) == files_before
+    assert not is_dirty(required_folder)
+    assert os.path.exists(build_folder_hash.get_build_folder_hash_cache_path(module.get_codeplain_folder()))
+
+
+def test_legacy_build_folder_hash(tmp_path):
+    build_folder = str(tmp_path)
+    setup_build_folder(build_folder)
+
+    # The hash stored in module metadata by earlier versions.
+    existing_files_content = {"main.py": "print('hello')\n", os.path.join("src", "utils.py"): "def util():\n    pass\n"}
+    legacy_build_hash = plain_spec.hash_text(f"folder={build_folder}|{json.dumps(existing_files_content)}")
+
+    assert build_folder_hash.calculate_legacy_build_folder_hash(build_folder) == legacy_build_hash
+
+
+def test_legacy_build_folder_hash_includes_ignored_files(tmp_path):
+    build_folder = str(tmp_path)
+    setup_build_folder(build_folder)
+    write_file(build_folder, "node_modules/react/index.js", "module.exports = {};\n")
+    write_file(build_folder, "src/__pycache__/notes.txt", "cached\n")
+
+    # The hash as computed by earlier versions, which listed the text files of the build folder with os.walk.
+    existing_files_content = {}
+    for root, dirs, files in os.walk(build_folder, topdown=True):
+        dirs[:] = [dir_name for dir_name in dirs if dir_name not in file_utils.SYSTEM_FOLDERS]
+        for filename in files:
+            try:
+                with open(os.path.join(root, filename), "rb") as f:
+                    content = f.read().decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            existing_files_content[os.path.relpath(os.path.join(root, filename), build_folder)] = content
+    legacy_build_hash = plain_spec.hash_text(f"folder={build_folder}|{json.dumps(existing_files_content)}")
+
+    assert os.path.join("node_modules", "react", "index.js") in existing_files_content
+    assert build_folder_hash.calculate_legacy_build_folder_hash(build_folder) == legacy_build_hash
+
+
+def test_required_modules_code_hash_stored_by_earlier_versions(tmp_path):
+    setup_build_folder(str(tmp_path / "required"))
+    write_file(str(tmp_path / "required"), ".codeplain/module_metadata.json", json.dumps({"functionalities": []}))
+    required_module = PlainModule("required", str(tmp_path))
+    module = PlainModule("module", str(tmp_path))
+    os.makedirs(module.get_codeplain_folder())
+
+    module_metadata_path = os.path.join(module.get_codeplain_folder(), "module_metadata.json")
+    with open(module_metadata_path, "w") as f:
+        json.dump({LEGACY_REQUIRED_MODULES_CODE_HASH: required_module.get_legacy_module_code_hash()}, f)
+
+    assert not module.has_required_modules_code_changed([required_module])
+
+    write_file(str(tmp_path / "required"), "main.py", "print('hello, world')\n")
+    assert module.has_required_modules_code_changed([required_module])
+
+    module.save_module_metadata({plain_spec.FUNCTIONAL_REQUIREMENTS: []}, [], [required_module])
+    assert not module.has_required_modules_code_changed([required_module])
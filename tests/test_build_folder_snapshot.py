@@ -0,0 +1,88 @@
+import os
+
+import file_utils
+
+
+def write_file(folder, file_name, content, mode="w", age=None):
+    full_file_name = os.path.join(folder, file_name)
+    os.makedirs(os.path.dirname(full_file_name), exist_ok=True)
+    with open(full_file_name, mode) as f:
+        f.write(content)
+
+    if age is not None:
+        # Files that weren't modified right before they were read aren't read again until they change.
+        modification_time = os.stat(full_file_name).st_mtime - age
+        os.utime(full_file_name, (modification_time, modification_time))
+
+
+def setup_build_folder(build_folder):
+    write_file(build_folder, "main.py", "print('hello')\n", age=60)
+    write_file(build_folder, "src/utils.py", "def util():\n    pass\n", age=60)
+    write_file(build_folder, "src/image.bin", b"\xff\xfe\x00", mode="wb", age=60)
+    write_file(build_folder, "src/cache.pyc", b"\x00", mode="wb", age=60)
+    write_file(build_folder, ".git/HEAD", "ref: refs/heads/main\n", age=60)
+    write_file(build_folder, ".codeplain/metadata.json", "{}", age=60)
+
+
+def test_fetch_is_identical_to_reading_the_build_folder(tmp_path):
+    build_folder = str(tmp_path)
+    setup_build_folder(build_folder)
+
+    existing_files = file_utils.list_all_text_files(build_folder)
+    existing_files_content = file_utils.get_existing_files_content(build_folder, existing_files)
+
+    build_folder_snapshot = file_utils.BuildFolderSnapshot(build_folder)
+    assert build_folder_snapshot.fetch() == (existing_files, existing_files_content)
+    assert sorted(existing_files) == ["main.py", os.path.join("src", "utils.py")]
+
+
+def test_only_changed_files_are_read_again(tmp_path):
+    build_folder = str(tmp_path)
+    setup_build_folder(build_folder)
+    build_folder_snapshot = file_utils.BuildFolderSnapshot(build_folder)
+
+    build_folder_snapshot.fetch()
+    assert build_folder_snapshot.read_files == 3
+
+    build_folder_snapshot.fetch()
+    assert build_folder_snapshot.read_files == 3
+
+    write_file(build_folder, "main.py", "print('hello, world')\n", age=30)
+    write_file(build_folder, "src/new.py", "", age=30)
+    os.remove(os.path.join(build_folder, "src", "utils.py"))
+
+    existing_files, existing_files_content = build_folder_snapshot.fetch()
+    assert build_folder_snapshot.read_files == 5
+    assert build_folder_snapshot.scans == 3
+    assert sorted(existing_files) == ["main.py", os.path.join("src", "new.py")]
+    assert existing_files_content["main.py"] == "print('hello, world')\n"
+
+
+def test_recently_modified_files_are_read_again(tmp_path):
+    build_folder = str(tmp_path)
+    write_file(build_folder, "main.py", "print('hello')\n")
+    build_folder_snapshot = file_utils.BuildFolderSnapshot(build_folder)
+
+    build_folder_snapshot.fetch()
+    build_folder_snapshot.fetch()
+    assert build_folder_snapshot.read_files == 2
+
+
+def test_stored_response_files_are_recorded(tmp_path):
+    build_folder = str(tmp_path)
+    setup_build_folder(build_folder)
+    build_folder_snapshot = file_utils.get_build_folder_snapshot(build_folder)
+    existing_files, _ = build_folder_snapshot.fetch()
+
+    file_utils.store_response_files(
+        build_folder,
+        {"main.py": "print('hello, world')\n", "src/new.py": "", "src/utils.py": None, ".codeplain/new.json": "{}"},
+        existing_files,
+    )
+
+    existing_files, existing_files_content = build_folder_snapshot.fetch()
+    assert build_folder_snapshot.read_files == 3
+    assert existing_files_content == {"main.py": "print('hello, world')\n", os.path.join("src", "new.py"): ""}
+    assert existing_files_content == file_utils.get_existing_files_content(
+        build_folder, file_utils.list_all_text_files(build_folder)
+    )
@@ -0,0 +1,642 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import codeplain_mock_server
+import codeplain_REST_api
+import file_utils
+import retry_policy as retry_policy_module
+from api_metrics import ApiMetrics
+from codeplain_mock_server import MockCodeplainServer
+from plain2code_exceptions import LLMInternalError, MissingRecordedResponse, ServiceUnavailable
+from plain2code_state import RunState
+from response_store import ResponseStore
+from retry_policy import CircuitBreaker, RetryPolicy
+
+
+class ConsoleStub:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, message):
+        self.messages.append(message)
+
+    def error(self, message):
+        self.messages.append(message)
+
+    def debug(self, message):
+        self.messages.append(message)
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        content_length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(content_length))
+
+        body = json.dumps({"endpoint": self.path, "frid": payload.get("frid")}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def echo_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mock_server():
+    with MockCodeplainServer() as server:
+        yield server
+
+
+def test_connections_are_reused(echo_server):
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub())
+    api.api_url = echo_server
+    run_state = RunState(spec_filename="test.plain")
+
+    for frid in ["1", "2", "3"]:
+        response = api.finish_functional_requirement(frid, run_state)
+        assert response == {"endpoint": "/finish_functional_requirement", "frid": frid}
+
+    stats = api.get_connection_stats()
+    assert stats.requests_sent == 3
+    assert stats.connections_opened == 1
+    assert stats.connections_reused == 2
+    assert run_state.call_count == 3
+
+    api.close()
+
+
+def test_connections_are_not_reused_without_keep_alive(echo_server):
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), keep_alive=False)
+    api.api_url = echo_server
+    run_state = RunState(spec_filename="test.plain")
+
+    for frid in ["1", "2"]:
+        api.finish_functional_requirement(frid, run_state)
+
+    stats = api.get_connection_stats()
+    assert stats.requests_sent == 2
+    assert stats.connections_opened == 2
+
+
+def test_endpoint_timeouts():
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key",
+        ConsoleStub(),
+        connect_timeout=5,
+        read_timeout=300,
+        endpoint_read_timeouts={"analyze_rendering": 60},
+    )
+    api.api_url = "https://api.codeplain.ai"
+
+    assert api.get_timeout(f"{api.api_url}/render_functional_requirement") == (5, 300)
+    assert api.get_timeout(f"{api.api_url}/analyze_rendering") == (5, 60)
+    assert api.get_timeout(f"{api.api_url}/finish_functional_requirement") == (
+        5,
+        codeplain_REST_api.DEFAULT_ENDPOINT_READ_TIMEOUTS["finish_functional_requirement"],
+    )
+
+
+def test_content_addressed_file_upload(mock_server):
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), content_addressed_files=True)
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    existing_files_content = {f"src/file_{i}.py": f"# file {i}\n" + "x = 1\n" * 500 for i in range(20)}
+    api.refactor_source_files_if_needed("1", ["src/file_0.py"], existing_files_content, run_state)
+
+    existing_files_content = dict(existing_files_content)
+    existing_files_content["src/file_3.py"] = "# changed\n"
+    api.refactor_source_files_if_needed("1", ["src/file_3.py"], existing_files_content, run_state)
+
+    first_request, second_request = mock_server.received_requests
+    assert second_request.payload["existing_files_content"] == existing_files_content
+    assert second_request.body_size * 10 < first_request.body_size
+    assert api.file_upload_manifest.uploaded_count(run_state.render_id) == 21
+
+
+def test_content_addressed_file_upload_reuploads_missing_files(mock_server):
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), content_addressed_files=True)
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    existing_files_content = {"a.py": "a = 1\n", "b.py": "b = 2\n"}
+    memory_files_content = {"memory.md": "b = 2\n"}
+    api.render_functional_requirement(
+        "1", {}, {}, existing_files_content, memory_files_content, "module", {}, run_state
+    )
+
+    mock_server.evict_file_blobs(run_state.render_id)
+    api.render_functional_requirement(
+        "2", {}, {}, existing_files_content, memory_files_content, "module", {}, run_state
+    )
+
+    assert len(mock_server.received_requests) == 2
+    for request in mock_server.received_requests:
+        assert request.payload["existing_files_content"] == existing_files_content
+        assert request.payload["memory_files_content"] == memory_files_content
+    assert api.get_connection_stats().requests_sent == 3
+
+
+def test_compressed_requests(mock_server):
+    mock_server.request_encodings = ["gzip"]
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), compress_requests=True)
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    existing_files_content = {f"src/file_{i}.py": "x = 1\n" * 500 for i in range(20)}
+    # The server advertises the codings it accepts in its first response, so only the second request is compressed.
+    api.refactor_source_files_if_needed("1", [], existing_files_content, run_state)
+    api.refactor_source_files_if_needed("1", [], existing_files_content, run_state)
+    # Small requests are never compressed.
+    api.finish_functional_requirement("1", run_state)
+
+    first_request, second_request, third_request = mock_server.received_requests
+    assert first_request.content_encoding is None
+    assert second_request.content_encoding == "gzip"
+    assert second_request.payload["existing_files_content"] == existing_files_content
+    assert second_request.body_size * 10 < first_request.body_size
+    assert third_request.content_encoding is None
+
+
+def test_compressed_requests_fall_back_to_plain_json(mock_server):
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key", ConsoleStub(), compress_requests=True, compression_threshold=0
+    )
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    api.finish_functional_requirement("1", run_state)
+    mock_server.request_encodings = []
+    api.finish_functional_requirement("2", run_state)
+    api.finish_functional_requirement("3", run_state)
+
+    assert [request.content_encoding for request in mock_server.received_requests] == [None, None, None]
+    assert [request.payload["frid"] for request in mock_server.received_requests] == ["1", "2", "3"]
+    # Only the first compressed request was rejected, after that the client sends plain JSON.
+    assert api.get_connection_stats().requests_sent == 4
+    assert api.server_request_encodings == []
+
+
+def test_render_session_cache(mock_server):
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key", ConsoleStub(), content_addressed_files=True, render_session_cache=True
+    )
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    plain_source_tree = {"definitions": ["x" * 1000], "functional_requirements": ["y" * 1000]}
+    linked_resources = {"resource.txt": "z" * 1000}
+    existing_files_content = {"main.py": "print(1)\n"}
+
+    for frid in ["1", "2"]:
+        api.analyze_rendering(
+            frid, plain_source_tree, linked_resources, existing_files_content, "module", {}, "", "", run_state
+        )
+
+    mock_server.evict_render_session(run_state.render_id)
+    api.analyze_rendering(
+        "3", plain_source_tree, linked_resources, existing_files_content, "module", {}, "", "", run_state
+    )
+
+    assert len(mock_server.received_requests) == 3
+    for request in mock_server.received_requests:
+        assert request.payload["plain_source_tree"] == plain_source_tree
+        assert request.payload["linked_resources"] == linked_resources
+        assert request.payload["existing_files_content"] == existing_files_content
+
+    first_request, second_request, _ = mock_server.received_requests
+    assert second_request.body_size * 5 < first_request.body_size
+    # The request after the cache eviction was sent twice, the second time with the full payload.
+    assert api.get_connection_stats().requests_sent == 4
+
+
+def test_async_api_concurrent_requests(mock_server, monkeypatch):
+    handle_request = mock_server.handle_request
+
+    def slow_handle_request(*args):
+        time.sleep(0.5)
+        return handle_request(*args)
+
+    monkeypatch.setattr(mock_server, "handle_request", slow_handle_request)
+    mock_server.responses["generate_folder_name_from_functional_requirement"] = {"folder_name": "test_folder"}
+
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub())
+    api.api_url = mock_server.url
+    async_api = codeplain_REST_api.AsyncCodeplainAPI(api)
+    run_state = RunState(spec_filename="test.plain")
+
+    async def send_requests():
+        return await asyncio.gather(
+            *[
+                async_api.generate_folder_name_from_functional_requirement(str(frid), "requirement", [], run_state)
+                for frid in range(5)
+            ]
+        )
+
+    start_time = time.monotonic()
+    responses = asyncio.run(send_requests())
+    elapsed_time = time.monotonic() - start_time
+
+    assert responses == [{"folder_name": "test_folder"}] * 5
+    assert elapsed_time < 2
+    call_counts = [request.payload["render_state"]["call_count"] for request in mock_server.received_requests]
+    assert sorted(call_counts) == [1, 2, 3, 4, 5]
+    assert run_state.call_count == 5
+
+
+def test_record_and_replay_responses(mock_server, tmp_path):
+    mock_server.responses["render_functional_requirement"] = {"main.py": "print('hello')\n"}
+    mock_server.responses["finish_functional_requirement"] = {"status": "finished"}
+
+    def render(api, run_state):
+        return [
+            api.render_functional_requirement("1", {}, {}, {}, {}, "module", {}, run_state),
+            api.finish_functional_requirement("1", run_state),
+        ]
+
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key", ConsoleStub(), response_store=ResponseStore(str(tmp_path), replay=False)
+    )
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+    recorded_responses = render(api, run_state)
+
+    replay_api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key", ConsoleStub(), response_store=ResponseStore(str(tmp_path), replay=True)
+    )
+    replay_api.api_url = "http://127.0.0.1:1"
+    replay_run_state = RunState(spec_filename="test.plain", replay_with=run_state.render_id)
+
+    assert render(replay_api, replay_run_state) == recorded_responses
+    assert replay_api.get_connection_stats().requests_sent == 0
+
+    # A call with a different payload than the recorded one can't be replayed.
+    replay_run_state = RunState(spec_filename="test.plain", replay_with=run_state.render_id)
+    with pytest.raises(MissingRecordedResponse, match="different payload"):
+        replay_api.render_functional_requirement("2", {}, {}, {}, {}, "module", {}, replay_run_state)
+
+
+def test_replay_goes_through_the_recorded_attempts(mock_server, tmp_path):
+    mock_server.responses["finish_functional_requirement"] = {"status": "finished"}
+    mock_server.inject_error(codeplain_mock_server.SERVER_ERROR, "finish_functional_requirement")
+    mock_server.inject_error(codeplain_mock_server.LLM_INTERNAL_ERROR, "finish_functional_requirement")
+
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key",
+        ConsoleStub(),
+        response_store=ResponseStore(str(tmp_path), replay=False),
+        retry_policy=RetryPolicy(base_delay=0, max_delay=0, circuit_breaker=CircuitBreaker()),
+    )
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+    assert api.finish_functional_requirement("1", run_state) == {"status": "finished"}
+    assert len(os.listdir(tmp_path / run_state.render_id)) == 3
+
+    replay_console = ConsoleStub()
+    replay_api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key",
+        replay_console,
+        response_store=ResponseStore(str(tmp_path), replay=True),
+        retry_policy=RetryPolicy(base_delay=60, max_delay=60, circuit_breaker=CircuitBreaker()),
+    )
+    replay_api.api_url = "http://127.0.0.1:1"
+    replay_run_state = RunState(spec_filename="test.plain", replay_with=run_state.render_id)
+
+    start_time = time.monotonic()
+    assert replay_api.finish_functional_requirement("1", replay_run_state) == {"status": "finished"}
+    assert time.monotonic() - start_time < 10
+    assert [message for message in replay_console.messages if message.startswith("Error on attempt")] == [
+        message for message in api.console.messages if message.startswith("Error on attempt")
+    ]
+    assert replay_api.get_connection_stats().requests_sent == 0
+
+
+def test_replay_reproduces_connection_errors(tmp_path):
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key",
+        ConsoleStub(),
+        response_store=ResponseStore(str(tmp_path), replay=False),
+        retry_policy=RetryPolicy(
+            base_delay=0,
+            max_delay=0,
+            retry_budgets={retry_policy_module.CONNECT_ERROR: 1},
+            circuit_breaker=CircuitBreaker(),
+        ),
+    )
+    api.api_url = "http://127.0.0.1:1"
+    run_state = RunState(spec_filename="test.plain")
+    with pytest.raises(requests.exceptions.ConnectionError):
+        api.finish_functional_requirement("1", run_state)
+    assert len(os.listdir(tmp_path / run_state.render_id)) == 2
+
+    replay_api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key",
+        ConsoleStub(),
+        response_store=ResponseStore(str(tmp_path), replay=True),
+        retry_policy=RetryPolicy(
+            base_delay=0,
+            max_delay=0,
+            retry_budgets={retry_policy_module.CONNECT_ERROR: 1},
+            circuit_breaker=CircuitBreaker(),
+        ),
+    )
+    replay_api.api_url = "http://127.0.0.1:1"
+    replay_run_state = RunState(spec_filename="test.plain", replay_with=run_state.render_id)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        replay_api.finish_functional_requirement("1", replay_run_state)
+
+
+def test_mock_server_canned_responses(mock_server):
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub())
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    response_files = api.render_functional_requirement("1.2", {}, {}, {}, {}, "module", {}, run_state)
+    assert response_files == api.render_functional_requirement("1.2", {}, {}, {}, {}, "module", {}, run_state)
+    assert list(response_files) == ["frid_1_2.py"]
+
+    response_files, plan_summary = api.render_conformance_tests(
+        "1.2", "1.2", {}, {}, {}, {}, "module", {}, "conformance_tests/frid_1_2", {}, [], run_state
+    )
+    assert list(response_files) == ["test_frid_1_2.py"]
+    assert plan_summary
+
+    folder_name = api.generate_folder_name_from_functional_requirement("1.2", "requirement", ["frid_1_2"], run_state)
+    assert folder_name == "frid_1_2_2"
+    assert api.fix_conformance_tests_issue(
+        "1.2", "1.2", {}, {}, {}, {}, "module", "module", {}, {}, {}, None, "issue", 1, "folder", None, run_state
+    ) == [False, {}]
+    assert api.summarize_finished_conformance_tests("1.2", {}, {}, {}, "module", {}, run_state) == []
+
+
+def test_mock_server_injected_errors_are_retried(mock_server):
+    retry_policy = RetryPolicy(base_delay=0, max_delay=0, circuit_breaker=CircuitBreaker())
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), retry_policy=retry_policy)
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    for error in codeplain_mock_server.INJECTABLE_ERRORS:
+        mock_server.inject_error(error, "render_functional_requirement")
+    response_files = api.render_functional_requirement("1", {}, {}, {}, {}, "module", {}, run_state)
+
+    assert list(response_files) == ["frid_1.py"]
+    assert len(mock_server.received_requests) == len(codeplain_mock_server.INJECTABLE_ERRORS) + 1
+
+    server_error_budget = retry_policy.retry_budgets[retry_policy_module.SERVER_ERROR]
+    mock_server.inject_error(codeplain_mock_server.SERVER_ERROR, count=server_error_budget + 1)
+    with pytest.raises(requests.exceptions.HTTPError):
+        api.finish_functional_requirement("1", run_state)
+
+
+def test_error_pages_count_as_server_errors(mock_server):
+    circuit_breaker = CircuitBreaker(failure_threshold=3)
+    retry_policy = RetryPolicy(base_delay=0, max_delay=0, circuit_breaker=circuit_breaker)
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), retry_policy=retry_policy)
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    mock_server.inject_error(codeplain_mock_server.BAD_GATEWAY, count=3)
+    with pytest.raises(ServiceUnavailable):
+        api.finish_functional_requirement("1", run_state)
+
+    assert circuit_breaker.state == CircuitBreaker.OPEN
+    assert len(mock_server.received_requests) == 3
+
+
+def test_mock_server_latency(mock_server):
+    mock_server.endpoint_latencies["analyze_rendering"] = 0.3
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub())
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    start_time = time.monotonic()
+    api.finish_functional_requirement("1", run_state)
+    assert time.monotonic() - start_time < 0.3
+
+    start_time = time.monotonic()
+    api.analyze_rendering("1", {}, {}, {}, "module", {}, "", "", run_state)
+    assert time.monotonic() - start_time >= 0.3
+
+
+@pytest.mark.parametrize("supports_streaming", [True, False])
+def test_streamed_responses(mock_server, supports_streaming):
+    mock_server.supports_streaming = supports_streaming
+    mock_server.responses["render_functional_requirement"] = {f"file_{i}.py": f"x = {i}\n" for i in range(3)}
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), stream_responses=True)
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    received_files = []
+    response_files = api.render_functional_requirement(
+        "1", {}, {}, {}, {}, "module", {}, run_state, on_file=lambda name, content: received_files.append(name)
+    )
+    assert response_files == mock_server.responses["render_functional_requirement"]
+    assert received_files == (list(response_files) if supports_streaming else [])
+
+    received_files = []
+    response_files, plan_summary = api.render_conformance_tests(
+        "1",
+        "1",
+        {},
+        {},
+        {},
+        {},
+        "module",
+        {},
+        "folder",
+        {},
+        [],
+        run_state,
+        on_file=lambda name, content: received_files.append(name),
+    )
+    assert list(response_files) == ["test_frid_1.py"]
+    assert plan_summary == "Conformance tests for functional requirement 1."
+    assert received_files == (["test_frid_1.py"] if supports_streaming else [])
+
+
+def test_streamed_files_are_written_as_they_arrive(mock_server, tmp_path):
+    mock_server.stream_delay = 0.2
+    mock_server.responses["render_functional_requirement"] = {"a.py": "a = 1\n", "b/b.py": "b = 2\n"}
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), stream_responses=True)
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    existing_files = []
+    response_file_writer = file_utils.ResponseFileWriter(str(tmp_path), existing_files)
+    files_on_disk = []
+
+    def on_file(file_name, content):
+        response_file_writer(file_name, content)
+        files_on_disk.append(sorted(existing_files))
+
+    response_files = api.render_functional_requirement("1", {}, {}, {}, {}, "module", {}, run_state, on_file=on_file)
+    response_file_writer.store_remaining_files(response_files)
+
+    assert files_on_disk == [["a.py"], ["a.py", "b/b.py"]]
+    assert (tmp_path / "b" / "b.py").read_text() == "b = 2\n"
+
+
+def test_streamed_files_of_failed_attempts_are_discarded(mock_server, tmp_path):
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    (tmp_path / "old.py").write_text("old = True\n")
+    mock_server.responses["render_functional_requirement"] = {"main.py": "print('hello, world')\n", "new.py": ""}
+    retry_policy = RetryPolicy(
+        base_delay=0,
+        max_delay=0,
+        retry_budgets={retry_policy_module.CONNECT_ERROR: 0},
+        circuit_breaker=CircuitBreaker(),
+    )
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key", ConsoleStub(), stream_responses=True, retry_policy=retry_policy
+    )
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    existing_files = ["main.py", "old.py"]
+    response_file_writer = file_utils.ResponseFileWriter(str(tmp_path), existing_files)
+    received_files = []
+
+    def on_file(file_name, content):
+        response_file_writer(file_name, content)
+        received_files.append(file_name)
+
+    mock_server.broken_streams = 1
+    with pytest.raises(requests.exceptions.ConnectionError):
+        api.render_functional_requirement(
+            "1", {}, {}, {}, {}, "module", {}, run_state, on_file=on_file, on_discard=response_file_writer.discard
+        )
+
+    assert received_files == ["main.py"]
+    assert (tmp_path / "main.py").read_text() == "print('hello')\n"
+    assert existing_files == ["main.py", "old.py"]
+
+    # The files of a retried attempt replace the ones of the failed attempt.
+    mock_server.responses["render_functional_requirement"] = {"new.py": "", "old.py": None}
+    mock_server.broken_streams = 1
+    api.retry_policy = RetryPolicy(base_delay=0, max_delay=0, circuit_breaker=CircuitBreaker())
+    response_files = api.render_functional_requirement(
+        "1", {}, {}, {}, {}, "module", {}, run_state, on_file=on_file, on_discard=response_file_writer.discard
+    )
+    response_file_writer.store_remaining_files(response_files)
+
+    assert sorted(os.listdir(tmp_path)) == ["main.py", "new.py"]
+    assert sorted(existing_files) == ["main.py", "new.py"]
+
+
+def test_record_and_replay_streamed_responses(mock_server, tmp_path):
+    mock_server.responses["render_functional_requirement"] = {"a.py": "a = 1\n", "b.py": "b = 2\n"}
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key",
+        ConsoleStub(),
+        stream_responses=True,
+        response_store=ResponseStore(str(tmp_path), replay=False),
+    )
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    received_files = []
+    response_files = api.render_functional_requirement(
+        "1", {}, {}, {}, {}, "module", {}, run_state, on_file=lambda name, content: received_files.append(name)
+    )
+    assert response_files == mock_server.responses["render_functional_requirement"]
+    assert received_files == ["a.py", "b.py"]
+
+    replay_api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key", ConsoleStub(), stream_responses=True, response_store=ResponseStore(str(tmp_path), replay=True)
+    )
+    replay_api.api_url = "http://127.0.0.1:1"
+    replay_run_state = RunState(spec_filename="test.plain", replay_with=run_state.render_id)
+
+    received_files = []
+    assert (
+        replay_api.render_functional_requirement(
+            "1",
+            {},
+            {},
+            {},
+            {},
+            "module",
+            {},
+            replay_run_state,
+            on_file=lambda name, content: received_files.append(name),
+        )
+        == response_files
+    )
+    assert received_files == ["a.py", "b.py"]
+
+
+def test_api_metrics_report(mock_server, tmp_path):
+    mock_server.inject_error(codeplain_mock_server.LLM_INTERNAL_ERROR, "finish_functional_requirement")
+    metrics = ApiMetrics(token_counter=lambda text: len(text.split()))
+    retry_policy = RetryPolicy(base_delay=0, max_delay=0, retry_budgets={retry_policy_module.LLM_ERROR: 0})
+    api = codeplain_REST_api.CodeplainAPI("test-api-key", ConsoleStub(), metrics=metrics, retry_policy=retry_policy)
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    existing_files_content = {"main.py": "print('hello world')\n"}
+    for frid in ["1", "2"]:
+        api.refactor_source_files_if_needed(frid, ["main.py"], existing_files_content, run_state)
+    with pytest.raises(LLMInternalError):
+        api.finish_functional_requirement("2", run_state)
+
+    report_path = tmp_path / "api_metrics.json"
+    metrics.write_report(str(report_path), run_state.render_id)
+    report = json.loads(report_path.read_text())
+
+    assert report["render_id"] == run_state.render_id
+    assert [request["call_count"] for request in report["requests"]] == [1, 2, 3]
+    assert report["requests"][0]["field_bytes"]["existing_files_content"] == len(json.dumps(existing_files_content))
+    assert report["requests"][0]["field_tokens"]["existing_files_content"] == 3
+    assert report["requests"][2]["error"] == "LLMInternalError"
+
+    assert report["render"]["requests"] == 3
+    assert report["render"]["failed_requests"] == 1
+    assert report["render"]["field_bytes"]["existing_files_content"] == 2 * len(json.dumps(existing_files_content))
+    assert report["frids"]["1"]["requests_per_endpoint"] == {"refactor_source_files_if_needed": 1}
+    assert report["frids"]["2"]["requests_per_endpoint"] == {
+        "refactor_source_files_if_needed": 1,
+        "finish_functional_requirement": 1,
+    }
+
+
+def test_api_metrics_record_the_bytes_sent(mock_server):
+    metrics = ApiMetrics(token_counter=lambda text: len(text.split()))
+    api = codeplain_REST_api.CodeplainAPI(
+        "test-api-key", ConsoleStub(), compress_requests=True, compression_threshold=0, metrics=metrics
+    )
+    api.api_url = mock_server.url
+    run_state = RunState(spec_filename="test.plain")
+
+    existing_files_content = {"main.py": "print('hello world')\n" * 1000}
+    for frid in ["1", "2"]:
+        api.refactor_source_files_if_needed(frid, ["main.py"], existing_files_content, run_state)
+
+    # The server advertises the encodings it accepts in its first response.
+    uncompressed_request, compressed_request = metrics.requests
+    assert uncompressed_request.sent_bytes == uncompressed_request.body_bytes
+    assert compressed_request.sent_bytes < compressed_request.body_bytes / 10
+    assert [request.sent_bytes for request in metrics.requests] == [
+        request.body_size for request in mock_server.received_requests
+    ]
+    assert metrics.get_report()["render"]["sent_bytes"] == sum(request.sent_bytes for request in metrics.requests)
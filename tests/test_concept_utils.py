@@ -0,0 +1,198 @@
+import pytest
+from mistletoe import Document
+
+import concept_utils
+import plain_spec
+from plain2code_exceptions import PlainSyntaxError
+from plain_file import PlainRenderer, process_exported_definitions
+
+
+def parse_definitions(definitions: str) -> dict:
+    return {plain_spec.DEFINITIONS: Document(definitions).children[0]}
+
+
+def get_definitions_closure(plain_source: dict, concepts: list[str]) -> list[str]:
+    with PlainRenderer() as renderer:
+        concept_index = concept_utils.ConceptIndex(plain_source, renderer)
+        return [renderer.render(token).strip() for token in concept_index.get_definitions_closure(concepts)]
+
+
+def test_concept_index():
+    plain_source = parse_definitions(
+        """- :User: is a user of the :App:.
+- :App: is a console application tested by :UnitTests:.
+- :Admin:, :Moderator: are :User: with elevated rights.
+"""
+    )
+    with PlainRenderer() as renderer:
+        concept_index = concept_utils.ConceptIndex(plain_source, renderer)
+
+    assert [definition.defined_concepts for definition in concept_index.definitions] == [
+        (":User:",),
+        (":App:",),
+        (":Admin:", ":Moderator:"),
+    ]
+    assert [definition.used_concepts for definition in concept_index.definitions] == [
+        (":User:", ":App:"),
+        (":App:",),
+        (":Admin:", ":Moderator:", ":User:"),
+    ]
+    assert concept_index.definitions_by_concept[":Moderator:"] == [concept_index.definitions[2]]
+
+
+def test_definitions_closure():
+    plain_source = parse_definitions(
+        """- :Task: is a piece of work of a :User:.
+- :User: is a user of the :App:.
+- :App: is a console application.
+- :Project: is a set of :Task: of a :User:.
+- :Unrelated: is not used.
+"""
+    )
+
+    assert get_definitions_closure(plain_source, [":Project:"]) == [
+        "- :Project: is a set of :Task: of a :User:.",
+        "- :Task: is a piece of work of a :User:.",
+        "- :User: is a user of the :App:.",
+        "- :App: is a console application.",
+    ]
+    assert get_definitions_closure(plain_source, [":App:", ":Task:"]) == [
+        "- :App: is a console application.",
+        "- :Task: is a piece of work of a :User:.",
+        "- :User: is a user of the :App:.",
+    ]
+    assert get_definitions_closure(plain_source, [":Missing:"]) == []
+
+
+def test_definitions_closure_with_cycles():
+    plain_source = parse_definitions(
+        """- :Parent: has a :Child:.
+- :Child: has a :Parent:.
+- :Admin:, :Moderator: are users.
+"""
+    )
+
+    assert get_definitions_closure(plain_source, [":Child:"]) == [
+        "- :Child: has a :Parent:.",
+        "- :Parent: has a :Child:.",
+    ]
+    assert get_definitions_closure(plain_source, [":Admin:"]) == ["- :Admin:, :Moderator: are users."]
+
+
+def test_process_exported_definitions():
+    plain_source = parse_definitions("- :User: is a user.\n")
+    exported_definitions = parse_definitions(
+        "- :App: is an application.\n- :User: is a user.\n- :App: is an application.\n"
+    )[plain_spec.DEFINITIONS].children
+
+    process_exported_definitions(plain_source, exported_definitions)
+
+    with PlainRenderer() as renderer:
+        assert [renderer.render(token).strip() for token in plain_source[plain_spec.DEFINITIONS].children] == [
+            "- :User: is a user.",
+            "- :App: is an application.",
+        ]
+
+
+def test_tokenize_concepts():
+    concept_tokens = concept_utils.tokenize_concepts("- :Admin:, :Super User: are :User: with :UnitTests:.")
+    assert concept_tokens.defined_concepts == (":Admin:",)
+    assert concept_tokens.used_concepts == (":Admin:", ":User:", ":UnitTests:")
+    assert concept_tokens.definition_errors == (
+        "Syntax error: Invalid concept: :Super User:. Should contain only letters, numbers, hyphens and dots.",
+    )
+
+    concept_tokens = concept_utils.tokenize_concepts("Implement :App:.")
+    assert concept_tokens.defined_concepts == ()
+    assert concept_tokens.used_concepts == (":App:",)
+    assert len(concept_tokens.definition_errors) == 1
+
+
+def test_validate_concepts_with_many_definitions():
+    definitions_count = 10000
+    marshalled_plain_source = {
+        plain_spec.DEFINITIONS: [
+            {"markdown": f"- :Concept{i}: is related to :Concept{(i * 7) % definitions_count}:."}
+            for i in range(definitions_count)
+        ]
+        + [{"markdown": "- :Concept1: is defined twice."}],
+        plain_spec.FUNCTIONAL_REQUIREMENTS: [
+            {"markdown": f"- Implement :Concept{i}:.", "acceptance_tests": [{"markdown": f"- :Concept{i}: works."}]}
+            for i in range(definitions_count)
+        ]
+        + [{"markdown": "- Implement :Undefined:."}],
+    }
+
+    errors = concept_utils.validate_concepts(marshalled_plain_source)
+
+    assert errors == [
+        "Syntax error: Concepts were defined multiple times: :Concept1: .",
+        "Syntax error: Concept :Undefined: is not defined in the definitions. functional specs: - Implement :Undefined:.",
+    ]
+
+
+def test_sort_definitions_orders_definitions_by_generation():
+    definitions = [
+        {"markdown": "- :Task: is a piece of work of a :User:."},
+        {"markdown": "- :Project: is a set of :Task:."},
+        {"markdown": "- :App: is a console application."},
+        {"markdown": "- :Admin:, :User: are users of the :App:."},
+        {"markdown": "- :Report: is a summary."},
+    ]
+
+    concept_utils.sort_definitions(definitions)
+
+    assert [definition["markdown"] for definition in definitions] == [
+        "- :App: is a console application.",
+        "- :Report: is a summary.",
+        "- :Admin:, :User: are users of the :App:.",
+        "- :Task: is a piece of work of a :User:.",
+        "- :Project: is a set of :Task:.",
+    ]
+
+    definitions = [
+        {"markdown": "- :A: uses :B:."},
+        {"markdown": "- :B: is independent."},
+        {"markdown": "- :C: is independent."},
+    ]
+    concept_utils.sort_definitions(definitions)
+    assert [definition["markdown"] for definition in definitions] == [
+        "- :B: is independent.",
+        "- :C: is independent.",
+        "- :A: uses :B:.",
+    ]
+
+    # Definitions of the same generation keep their original order, regardless of when they become ready.
+    definitions = [
+        {"markdown": "- :X: uses :Q:."},
+        {"markdown": "- :P: is independent."},
+        {"markdown": "- :Y: uses :P:."},
+        {"markdown": "- :Q: is independent."},
+    ]
+    concept_utils.sort_definitions(definitions)
+    assert [definition["markdown"] for definition in definitions] == [
+        "- :P: is independent.",
+        "- :Q: is independent.",
+        "- :X: uses :Q:.",
+        "- :Y: uses :P:.",
+    ]
+
+
+def test_sort_definitions_reports_one_cycle_per_component():
+    definitions = [
+        {"markdown": "- :A: uses :B: and :C:."},
+        {"markdown": "- :B: uses :A:."},
+        {"markdown": "- :C: uses :A: and :B:."},
+        {"markdown": "- :D: is independent."},
+        {"markdown": "- :E: uses :F:."},
+        {"markdown": "- :F: uses :E: and :D:."},
+    ]
+
+    with pytest.raises(PlainSyntaxError) as exc_info:
+        concept_utils.sort_definitions(definitions)
+
+    assert str(exc_info.value) == (
+        "Found cycles in the concept graph. Cycles are not allowed."
+        "Cyclic definitons:\n- :A: uses :B: and :C:.\n- :B: uses :A:.\n"
+        "Cyclic definitons:\n- :E: uses :F:.\n- :F: uses :E: and :D:.\n"
+    )
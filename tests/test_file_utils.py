@@ -0,0 +1,87 @@
+import os
+from unittest.mock import patch
+
+import file_utils
+
+
+def write_file(folder, file_name, content):
+    full_file_name = os.path.join(folder, file_name)
+    os.makedirs(os.path.dirname(full_file_name), exist_ok=True)
+    with open(full_file_name, "wb") as f:
+        f.write(content)
+
+
+def test_read_all_text_files(tmp_path):
+    folder = str(tmp_path)
+    write_file(folder, "main.py", b"print('hello')\n")
+    write_file(folder, "src/unicode.txt", "živjo ☃\n".encode("utf-8"))
+    write_file(folder, "src/image.bin", b"\xff\xfe\x00")
+    write_file(folder, "src/module.pyc", b"\x00")
+    write_file(folder, ".git/HEAD", b"ref: refs/heads/main\n")
+
+    all_files, all_files_content = file_utils.read_all_text_files(folder)
+
+    assert all_files == file_utils.list_all_text_files(folder)
+    assert all_files_content == file_utils.get_existing_files_content(folder, all_files)
+    assert sorted(all_files) == ["main.py", os.path.join("src", "unicode.txt")]
+
+
+def test_read_all_text_files_reads_every_file_once(tmp_path):
+    folder = str(tmp_path)
+    for i in range(5):
+        write_file(folder, f"file_{i}.py", b"pass\n")
+
+    with patch("builtins.open", wraps=open) as mock_open:
+        file_utils.read_all_text_files(folder)
+
+    assert mock_open.call_count == 5
+
+
+def test_is_text_file_sniffs_a_prefix(tmp_path):
+    folder = str(tmp_path)
+    # A multi-byte character split by the end of the sniffed prefix.
+    prefix = b"a" * (file_utils.TEXT_FILE_SNIFF_SIZE - 1) + "ž".encode("utf-8")
+    write_file(folder, "split.txt", prefix)
+    write_file(folder, "truncated.txt", prefix[:-1])
+    write_file(folder, "binary_start.txt", b"\xff" + prefix)
+
+    assert file_utils.is_text_file(os.path.join(folder, "split.txt"))
+    assert not file_utils.is_text_file(os.path.join(folder, "truncated.txt"))
+    assert not file_utils.is_text_file(os.path.join(folder, "binary_start.txt"))
+
+    # Only the prefix is read, so invalid bytes after it aren't detected.
+    write_file(folder, "binary_end.txt", prefix + b"\xff")
+    assert file_utils.is_text_file(os.path.join(folder, "binary_end.txt"))
+
+
+def create_tree(folder, files_count):
+    for i in range(files_count):
+        write_file(folder, os.path.join(f"package_{i % 100}", f"module_{i}.py"), f"value = {i}\n".encode("utf-8"))
+    write_file(folder, "package_0/image.bin", b"\xff\xfe\x00")
+
+
+def test_parallel_read_is_identical_to_sequential_read(tmp_path):
+    folder = str(tmp_path)
+    create_tree(folder, 500)
+
+    with patch.object(file_utils, "file_read_workers", 1):
+        sequential_result = file_utils.read_all_text_files(folder)
+        existing_files_content = file_utils.get_existing_files_content(folder, sequential_result[0])
+
+    with patch.object(file_utils, "file_read_workers", 8):
+        assert file_utils.read_all_text_files(folder) == sequential_result
+        assert list(file_utils.get_existing_files_content(folder, sequential_result[0]).items()) == list(
+            existing_files_content.items()
+        )
+        assert file_utils.BuildFolderSnapshot(folder).fetch() == sequential_result
+
+    assert len(sequential_result[0]) == 500
+
+
+def test_map_files_keeps_the_order_of_the_paths(tmp_path):
+    folder = str(tmp_path)
+    create_tree(folder, 200)
+    paths = [os.path.join(folder, file_name) for file_name in file_utils.list_all_text_files(folder)]
+
+    assert file_utils.map_files(os.path.basename, paths, 8) == [os.path.basename(path) for path in paths]
+    assert file_utils.read_text_files(paths, 8) == file_utils.read_text_files(paths, 1)
@@ -0,0 +1,91 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+import file_utils
+import ignore_rules
+from ignore_rules import IgnoreRules
+
+
+@pytest.mark.parametrize(
+    "patterns,path,is_ignored",
+    [
+        (["*.log"], "app.log", True),
+        (["*.log"], "logs/app.log", True),
+        (["*.log", "!keep.log"], "logs/keep.log", False),
+        (["/build"], "build", True),
+        (["/build"], "src/build", False),
+        (["build/"], "build", False),
+        (["build/"], "build/main.py", True),
+        (["build/", "!build/main.py"], "build/main.py", True),
+        (["src/*.js"], "src/app.js", True),
+        (["src/*.js"], "src/lib/app.js", False),
+        (["**/lib"], "a/b/lib", True),
+        (["a/**/b"], "a/b", True),
+        (["a/**/b"], "a/x/y/b", True),
+        (["a/**"], "a/x/y", True),
+        (["a/**"], "a", False),
+        (["file?.txt"], "file1.txt", True),
+        (["file[0-9].txt"], "filea.txt", False),
+        (["file[!0-9].txt"], "filea.txt", True),
+        (["\\#notes"], "#notes", True),
+        (["# comment", "", "trailing.txt   "], "trailing.txt", True),
+    ],
+)
+def test_ignore_rules(patterns, path, is_ignored):
+    assert IgnoreRules(patterns).is_ignored(path) == is_ignored
+
+
+def write_file(folder, file_name, content=""):
+    full_file_name = os.path.join(folder, file_name)
+    os.makedirs(os.path.dirname(full_file_name), exist_ok=True)
+    with open(full_file_name, "w") as f:
+        f.write(content)
+
+
+def test_walk_files_prunes_ignored_directories(tmp_path):
+    folder = str(tmp_path / "build")
+    write_file(folder, "main.py")
+    write_file(folder, "node_modules/react/index.js")
+    write_file(folder, "src/__pycache__/main.cpython-311.pyc")
+    write_file(folder, "src/app.js")
+    write_file(folder, "dist/bundle.js")
+    write_file(folder, "debug.log")
+    write_file(str(tmp_path), ignore_rules.IGNORE_FILE_NAME, "*.log\n")
+
+    with patch.object(ignore_rules, "ignore_file", str(tmp_path / ignore_rules.IGNORE_FILE_NAME)):
+        with patch("os.scandir", wraps=os.scandir) as mock_scandir:
+            all_files = file_utils.list_all_text_files(folder)
+
+        assert sorted(all_files) == [
+            os.path.join("dist", "bundle.js"),
+            "main.py",
+            os.path.join("src", "app.js"),
+        ]
+        scanned_folders = {os.path.relpath(call.args[0], folder) for call in mock_scandir.call_args_list}
+        assert scanned_folders == {".", "dist", "src"}
+
+        assert file_utils.read_all_text_files(folder)[0] == all_files
+        assert file_utils.BuildFolderSnapshot(folder).fetch()[0] == all_files
+
+
+def test_ignore_file_changes_are_picked_up(tmp_path):
+    folder = str(tmp_path / "build")
+    write_file(folder, "main.py")
+    write_file(folder, "debug.log")
+    ignore_file = str(tmp_path / ignore_rules.IGNORE_FILE_NAME)
+
+    with patch.object(ignore_rules, "ignore_file", ignore_file):
+        assert "debug.log" in file_utils.list_all_text_files(folder)
+
+        write_file(str(tmp_path), ignore_rules.IGNORE_FILE_NAME, "*.log\n")
+        assert "debug.log" not in file_utils.list_all_text_files(folder)
+
+
+def test_find_ignore_file(tmp_path):
+    plain_file_path = str(tmp_path / "hello_world.plain")
+    assert ignore_rules.find_ignore_file(plain_file_path) is None
+
+    write_file(str(tmp_path), ignore_rules.IGNORE_FILE_NAME, "*.log\n")
+    assert ignore_rules.find_ignore_file(plain_file_path) == str(tmp_path / ignore_rules.IGNORE_FILE_NAME)
@@ -0,0 +1,126 @@
+import os
+from unittest.mock import patch
+
+import plain_file
+from parse_cache import ParseCache
+
+MAIN_PLAIN_SOURCE = """---
+requires:
+  - base
+---
+
+***definitions***
+
+- :App: is a console application.
+
+***technical specs***
+
+- :App: should be written in Python.
+
+***functional specs***
+
+- {% include "greeting.plain" %}
+"""
+
+BASE_PLAIN_SOURCE = """***definitions***
+
+- :User: is a user of the application.
+
+***technical specs***
+
+- :User: should be written in Python.
+
+***functional specs***
+
+- Display "base"
+"""
+
+
+def write_file(folder, file_name, content):
+    with open(os.path.join(folder, file_name), "w") as f:
+        f.write(content)
+
+
+def setup_plain_files(folder):
+    os.makedirs(folder, exist_ok=True)
+    write_file(folder, "main.plain", MAIN_PLAIN_SOURCE)
+    write_file(folder, "base.plain", BASE_PLAIN_SOURCE)
+    write_file(folder, "greeting.plain", 'Display "hello, world"')
+
+
+def parse_without_parsing(plain_source_file_name, template_dirs, parse_cache):
+    with patch.object(plain_file, "parse_plain_file_tree", side_effect=AssertionError("parsed again")):
+        return plain_file.plain_file_parser(plain_source_file_name, template_dirs, parse_cache)
+
+
+def test_cache_hit_skips_parsing(tmp_path):
+    source_folder = str(tmp_path / "source")
+    setup_plain_files(source_folder)
+    parse_cache = ParseCache(str(tmp_path / "cache"))
+
+    result = plain_file.plain_file_parser("main.plain", [source_folder], parse_cache)
+    assert result == plain_file.plain_file_parser("main.plain", [source_folder])
+    assert result[1]["functional specs"] == [{"markdown": '- Display "hello, world"'}]
+    assert result[2] == ["base"]
+
+    assert parse_without_parsing("main.plain", [source_folder], parse_cache) == result
+
+
+def test_cache_entry_records_all_dependencies(tmp_path):
+    source_folder = str(tmp_path / "source")
+    setup_plain_files(source_folder)
+    parse_cache = ParseCache(str(tmp_path / "cache"))
+
+    with patch.object(parse_cache, "store") as store:
+        plain_file.plain_file_parser("main.plain", [source_folder], parse_cache)
+        dependencies = store.call_args.args[3]
+
+    assert sorted(dependencies) == ["base.plain", "greeting.plain", "main.plain"]
+
+
+def test_changed_dependency_evicts_entry(tmp_path):
+    source_folder = str(tmp_path / "source")
+    parse_cache = ParseCache(str(tmp_path / "cache"))
+
+    for file_name in ["main.plain", "base.plain", "greeting.plain"]:
+        setup_plain_files(source_folder)
+        plain_file.plain_file_parser("main.plain", [source_folder], parse_cache)
+
+        with open(os.path.join(source_folder, file_name), "a") as f:
+            f.write("\n")
+
+        assert parse_cache.load("main", [source_folder]) is None
+        assert os.listdir(parse_cache.folder) == []
+
+
+def test_reparses_after_change(tmp_path):
+    source_folder = str(tmp_path / "source")
+    setup_plain_files(source_folder)
+    parse_cache = ParseCache(str(tmp_path / "cache"))
+
+    plain_file.plain_file_parser("main.plain", [source_folder], parse_cache)
+    write_file(source_folder, "greeting.plain", 'Display "hello, universe"')
+
+    _, plain_source, _ = plain_file.plain_file_parser("main.plain", [source_folder], parse_cache)
+    assert plain_source["functional specs"] == [{"markdown": '- Display "hello, universe"'}]
+
+    assert parse_without_parsing("main.plain", [source_folder], parse_cache)[1] == plain_source
+
+
+def test_template_dirs_precedence(tmp_path):
+    source_folder = str(tmp_path / "source")
+    custom_template_folder = str(tmp_path / "templates")
+    setup_plain_files(source_folder)
+    os.remove(os.path.join(source_folder, "greeting.plain"))
+    os.makedirs(custom_template_folder)
+    write_file(custom_template_folder, "greeting.plain", 'Display "hello, world"')
+    parse_cache = ParseCache(str(tmp_path / "cache"))
+
+    template_dirs = [source_folder, custom_template_folder]
+    plain_file.plain_file_parser("main.plain", template_dirs, parse_cache)
+    assert parse_cache.load("main", template_dirs) is not None
+    assert parse_cache.load("main", list(reversed(template_dirs))) is None
+
+    # A template with the same name in a directory with higher precedence shadows the cached one.
+    write_file(source_folder, "greeting.plain", 'Display "hello, universe"')
+    assert parse_cache.load("main", template_dirs) is None
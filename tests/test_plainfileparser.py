@@ -1,10 +1,9 @@
+import json
 import os
 import re
-from unittest.mock import patch
 from urllib.parse import urlparse
 
 import pytest
-from liquid2 import Environment, RenderContext, TemplateSource
 
 import file_utils
 import plain_file
@@ -195,7 +194,7 @@ def test_without_non_functional_requirement(get_test_data_path):
         )
 
 
-def test_indented_include_tags():
+def test_indented_include_tags(tmp_path):
     plain_source = """# Main
 
 ***definitions***
@@ -249,39 +248,25 @@ def test_indented_include_tags():
         - the nice thing should be really nice
         - the useful thing should be really useful
 """
-    rendered_plain_source = plain_file.render_plain_source(plain_source, loaded_templates, {})
-    assert rendered_plain_source == expected_rendered_plain_source
+    for template_name, template in loaded_templates.items():
+        (tmp_path / template_name).write_text(template)
 
-    def mock_get_source(
-        env: Environment,
-        template_name: str,
-        *,
-        context: RenderContext | None = None,
-        **kwargs: object,
-    ):
-        return TemplateSource(
-            loaded_templates[template_name],
-            template_name,
-            lambda: True,
-        )
-
-    with patch(
-        "liquid2.builtin.loaders.file_system_loader.FileSystemLoader.get_source",
-        side_effect=mock_get_source,
-    ):
-        plain_source_result, loaded_templates_result = file_utils.get_loaded_templates(["."], plain_source)
-        assert plain_source_result == expected_rendered_plain_source
-        assert loaded_templates_result == loaded_templates
+    rendered_plain_source, loaded_templates_result = file_utils.render_plain_source_with_templates(
+        [str(tmp_path)], plain_source, {}
+    )
+    assert rendered_plain_source == expected_rendered_plain_source
+    assert loaded_templates_result == loaded_templates
 
 
 def test_code_variables(load_test_data, get_test_data_path):
+    template_dirs = [get_test_data_path("data/templates")]
     plain_source = load_test_data("data/templates/code_variables.plain")
-    loaded_templates = {
-        "implement.plain": load_test_data("data/templates/implement.plain"),
-    }
 
-    code_variables = {}
-    rendered_plain_source = plain_file.render_plain_source(plain_source, loaded_templates, code_variables)
+    code_variables: dict = {}
+    rendered_plain_source, loaded_templates = file_utils.render_plain_source_with_templates(
+        template_dirs, plain_source, code_variables
+    )
+    assert loaded_templates == {"implement.plain": load_test_data("data/templates/implement.plain")}
     keys = list(code_variables.keys())
 
     expected_rendered_plain_source = f"""***definitions***
@@ -318,13 +303,15 @@ def test_code_variables(load_test_data, get_test_data_path):
     assert plain_source == expected_plain_source
 
     plain_source = load_test_data("data/templates/template_include.plain")
-    loaded_templates = {
+
+    code_variables = {}
+    rendered_plain_source, loaded_templates = file_utils.render_plain_source_with_templates(
+        template_dirs, plain_source, code_variables
+    )
+    assert loaded_templates == {
         "header.plain": load_test_data("data/templates/header.plain"),
         "implement_2.plain": load_test_data("data/templates/implement_2.plain"),
     }
-
-    code_variables = {}
-    rendered_plain_source = plain_file.render_plain_source(plain_source, loaded_templates, code_variables)
     keys = list(code_variables.keys())
     expected_rendered_plain_source = f"""***definitions***
 
@@ -366,6 +353,24 @@ def test_code_variables(load_test_data, get_test_data_path):
     assert plain_source == expected_plain_source
 
 
+def test_render_plain_source_with_templates(load_test_data, get_test_data_path):
+    template_dirs = [get_test_data_path("data/templates")]
+    plain_source = load_test_data("data/templates/template_include.plain")
+
+    code_variables: dict = {}
+    rendered_plain_source, loaded_templates = file_utils.render_plain_source_with_templates(
+        template_dirs, plain_source, code_variables
+    )
+    assert sorted(loaded_templates) == ["header.plain", "implement_2.plain"]
+    assert loaded_templates["header.plain"] == load_test_data("data/templates/header.plain")
+    assert len(code_variables) == 3
+    assert all(unique_str in rendered_plain_source for unique_str in code_variables)
+    assert file_utils.get_template_environment(template_dirs) is file_utils.get_template_environment(template_dirs)
+
+    with pytest.raises(Exception, match="Undefined liquid variable"):
+        file_utils.render_plain_source_with_templates(template_dirs, load_test_data("data/templates/header.plain"), {})
+
+
 def test_acceptance_tests_block_include_with_trailing_newline_keeps_structure_and_ignores_quote(get_test_data_path):
     """
     Ensures that a block-level include inside ***acceptance tests*** whose template ends
@@ -530,3 +535,67 @@ def test_topological_sort(get_test_data_path):
         {"markdown": "- :Concept4: is a concept that depends on the :Concept3: concept."},
         {"markdown": "- :Concept6: is a concept that depends on the :Concept1: and :Concept4: concepts."},
     ]
+
+
+def parse_plain_file_to_json(plain_source_file_name, template_dirs, incremental_parser=None):
+    try:
+        result = plain_file.plain_file_parser(
+            plain_source_file_name, template_dirs, incremental_parser=incremental_parser
+        )
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return json.dumps(result)
+
+
+@pytest.mark.parametrize(
+    "test_data_folder",
+    ["data", "data/plainfile", "data/plainfileparser", "data/imports", "data/requires", "data/templates"],
+)
+def test_incremental_parse_is_identical_to_full_parse(get_test_data_path, test_data_folder):
+    template_dirs = [get_test_data_path(test_data_folder)]
+    incremental_parser = plain_file.IncrementalPlainParser()
+    for plain_source_file_name in sorted(os.listdir(template_dirs[0])):
+        if not plain_source_file_name.endswith(plain_file.PLAIN_SOURCE_FILE_EXTENSION):
+            continue
+
+        full_parse = parse_plain_file_to_json(plain_source_file_name, template_dirs)
+        for _ in range(2):
+            assert parse_plain_file_to_json(plain_source_file_name, template_dirs, incremental_parser) == full_parse
+
+
+def test_incremental_parse_after_edit(tmp_path):
+    functional_requirements = "\n".join(f"- Display :Item{i % 3}: number {i}.\n" for i in range(20))
+    plain_source = f"""***definitions***
+
+- :Item2: is an item that depends on :Item1:.
+
+- :Item1: is an item that depends on :Item0:.
+
+- :Item0: is an item.
+
+***technical specs***
+
+- :Item0: should be stored in memory.
+
+***functional specs***
+
+{functional_requirements}"""
+    plain_source_path = tmp_path / "edited.plain"
+    plain_source_path.write_text(plain_source)
+
+    incremental_parser = plain_file.IncrementalPlainParser()
+    initial_parse = parse_plain_file_to_json("edited.plain", [str(tmp_path)], incremental_parser)
+    assert initial_parse == parse_plain_file_to_json("edited.plain", [str(tmp_path)])
+    tokenized_blocks = incremental_parser.tokenized_blocks
+
+    plain_source_path.write_text(plain_source.replace("number 7.", "number seven.\n  With more details."))
+    edited_parse = parse_plain_file_to_json("edited.plain", [str(tmp_path)], incremental_parser)
+    assert edited_parse == parse_plain_file_to_json("edited.plain", [str(tmp_path)])
+    assert edited_parse != initial_parse
+    assert incremental_parser.tokenized_blocks == tokenized_blocks + 1
+
+    # Errors are reported with the line numbers of the whole plain source.
+    plain_source_path.write_text(plain_source.replace("- Display :Item0: number 9.", "Display :Item0: number 9."))
+    assert parse_plain_file_to_json("edited.plain", [str(tmp_path)], incremental_parser) == parse_plain_file_to_json(
+        "edited.plain", [str(tmp_path)]
+    )
@@ -65,3 +65,275 @@ def test_get_specifications_simple(get_test_data_path):
         "test specs": [],
         "functional specs": ["- Simple functional requirement"],
     }
+
+
+def test_frid_index_with_sections():
+    plain_source = {
+        "functional specs": [{"markdown": "- First"}, {"markdown": "- Second"}],
+        "sections": [
+            {"ID": "3", "functional specs": [{"markdown": "- Third"}]},
+            {"ID": "4", "sections": [{"ID": "4.1", "functional specs": [{"markdown": "- Fourth"}]}]},
+        ],
+    }
+
+    frid_index = plain_spec.get_frid_index(plain_source)
+
+    assert frid_index.frids == ("1", "2", "3.1", "4.1.1")
+    assert list(plain_spec.get_frids(plain_source)) == ["1", "2", "3.1", "4.1.1"]
+    assert plain_spec.get_first_frid(plain_source) == "1"
+    assert plain_spec.get_next_frid(plain_source, "2") == "3.1"
+    assert plain_spec.get_next_frid(plain_source, "4.1.1") is None
+    assert plain_spec.get_previous_frid(plain_source, "3.1") == "2"
+    assert plain_spec.get_frids_before(plain_source, "4.1.1") == ["1", "2", "3.1"]
+    assert frid_index.sections["3.1"] is plain_source["sections"][0]
+    assert frid_index.sections["4.1.1"] is plain_source["sections"][1]["sections"][0]
+
+    assert plain_spec.get_frid_index(plain_source) is frid_index
+    assert plain_spec.get_frid_index(dict(plain_source)) is not frid_index
+
+
+def test_frid_index_empty_tree():
+    assert plain_spec.get_first_frid({}) is None
+    assert plain_spec.get_frids_before({}, "1") == []
+
+
+def test_specification_views_with_sections():
+    plain_source = {
+        "definitions": [{"markdown": "- :App: is an application."}],
+        "technical specs": [{"markdown": "- Use Python."}],
+        "sections": [
+            {
+                "ID": "1",
+                "technical specs": [
+                    {"markdown": "- Use {{ framework }}.", "code_variables": [{"name": "framework", "value": "Flask"}]}
+                ],
+                "functional specs": [
+                    {"markdown": "- First"},
+                    {"markdown": "- Second", "acceptance_tests": [{"markdown": "- Second works"}]},
+                ],
+            },
+            {"ID": "2", "functional specs": [{"markdown": "- Third"}]},
+        ],
+    }
+
+    specification_views = plain_spec.SpecificationViews(plain_source)
+
+    specifications, code_variables = specification_views.get("1.2")
+    assert specifications == {
+        "definitions": ["- :App: is an application."],
+        "technical specs": ["- Use Python.", "- Use Flask."],
+        "test specs": [],
+        "functional specs": ["- First", "- Second"],
+        "acceptance_tests": ["- Second works"],
+    }
+    assert code_variables == {"framework": "Flask"}
+
+    specifications, code_variables = specification_views.get("2.1")
+    assert specifications == {
+        "definitions": ["- :App: is an application."],
+        "technical specs": ["- Use Python."],
+        "test specs": [],
+        "functional specs": ["- First", "- Second", "- Third"],
+    }
+    assert code_variables is None
+
+    # FRIDs of the same section share their specifications.
+    assert specification_views.get("1.1")[0]["technical specs"] is specification_views.get("1.2")[0]["technical specs"]
+    assert specification_views.get("2.1")[0]["definitions"] is specification_views.get("1.1")[0]["definitions"]
+
+    with pytest.raises(Exception, match="Functional requirement 3.1 does not exist."):
+        specification_views.get("3.1")
+
+
+def test_specification_views_of_nested_sections():
+    plain_source = {
+        "definitions": [
+            {"markdown": "- :App: is an application.", "linked_resources": [{"text": "App", "target": "app.md"}]}
+        ],
+        "technical specs": [{"markdown": "- Use Python."}],
+        "sections": [
+            {
+                "ID": "1",
+                "technical specs": [
+                    {"markdown": "- Use {{ framework }}.", "code_variables": [{"name": "framework", "value": "Flask"}]}
+                ],
+                "sections": [
+                    {
+                        "ID": "1.1",
+                        "definitions": [{"markdown": "- :User: uses :App:."}],
+                        "test specs": [
+                            {
+                                "markdown": "- Test with {{ runner }}.",
+                                "code_variables": [{"name": "runner", "value": "pytest"}],
+                                "linked_resources": [{"text": "Tests", "target": "tests.md"}],
+                            }
+                        ],
+                        "functional specs": [
+                            {
+                                "markdown": "- :User: can log in to the {{ page }} page.",
+                                "code_variables": [{"name": "page", "value": "home"}],
+                                "linked_resources": [{"text": "Login", "target": "login.yaml"}],
+                                "acceptance_tests": [{"markdown": "- Login works"}],
+                            },
+                            {"markdown": "- :User: can log out."},
+                        ],
+                    },
+                    {"ID": "1.2", "functional specs": [{"markdown": "- :App: has a settings page."}]},
+                ],
+            },
+            {"ID": "2", "functional specs": [{"markdown": "- Third"}]},
+        ],
+    }
+
+    specification_views = plain_spec.SpecificationViews(plain_source)
+
+    assert specification_views.get("1.1.1") == (
+        {
+            "definitions": ["- :App: is an application.", "- :User: uses :App:."],
+            "technical specs": ["- Use Python.", "- Use Flask."],
+            "test specs": ["- Test with pytest."],
+            "functional specs": ["- :User: can log in to the home page."],
+            "acceptance_tests": ["- Login works"],
+        },
+        {"page": "home", "runner": "pytest", "framework": "Flask"},
+    )
+    assert specification_views.get("1.1.2") == (
+        {
+            "definitions": ["- :App: is an application.", "- :User: uses :App:."],
+            "technical specs": ["- Use Python.", "- Use Flask."],
+            "test specs": ["- Test with pytest."],
+            "functional specs": ["- :User: can log in to the home page.", "- :User: can log out."],
+        },
+        {"page": "home", "runner": "pytest", "framework": "Flask"},
+    )
+    assert specification_views.get("1.2.1") == (
+        {
+            "definitions": ["- :App: is an application."],
+            "technical specs": ["- Use Python.", "- Use Flask."],
+            "test specs": [],
+            "functional specs": [
+                "- :User: can log in to the home page.",
+                "- :User: can log out.",
+                "- :App: has a settings page.",
+            ],
+        },
+        {"page": "home", "framework": "Flask"},
+    )
+    assert specification_views.get("2.1") == (
+        {
+            "definitions": ["- :App: is an application."],
+            "technical specs": ["- Use Python."],
+            "test specs": [],
+            "functional specs": [
+                "- :User: can log in to the home page.",
+                "- :User: can log out.",
+                "- :App: has a settings page.",
+                "- Third",
+            ],
+        },
+        {"page": "home"},
+    )
+
+    specification_views = plain_spec.SpecificationViews(plain_source, replace_code_variables=False)
+
+    assert specification_views.get("1.1.1") == (
+        {
+            "definitions": ["- :App: is an application.", "- :User: uses :App:."],
+            "technical specs": ["- Use Python.", "- Use {{ framework }}."],
+            "test specs": ["- Test with {{ runner }}."],
+            "functional specs": ["- :User: can log in to the {{ page }} page."],
+            "acceptance_tests": ["- Login works"],
+        },
+        {"page": "home", "runner": "pytest", "framework": "Flask"},
+    )
+    assert specification_views.get("2.1") == (
+        {
+            "definitions": ["- :App: is an application."],
+            "technical specs": ["- Use Python."],
+            "test specs": [],
+            "functional specs": [
+                "- :User: can log in to the {{ page }} page.",
+                "- :User: can log out.",
+                "- :App: has a settings page.",
+                "- Third",
+            ],
+        },
+        {"page": "home"},
+    )
+
+
+def test_specification_views_conflicting_code_variables():
+    plain_source = {
+        "functional specs": [
+            {"markdown": "- First"},
+            {"markdown": "- {{ name }}", "code_variables": [{"name": "name", "value": "a"}]},
+            {"markdown": "- {{ name }}", "code_variables": [{"name": "name", "value": "b"}]},
+            {"markdown": "- Last"},
+        ],
+    }
+
+    specification_views = plain_spec.SpecificationViews(plain_source, replace_code_variables=False)
+
+    assert specification_views.get("2") == (
+        {"definitions": [], "technical specs": [], "test specs": [], "functional specs": ["- First", "- {{ name }}"]},
+        {"name": "a"},
+    )
+    for frid in ["3", "4"]:
+        with pytest.raises(Exception, match="Code variable name has multiple values: a and b"):
+            specification_views.get(frid)
+
+
+def test_linked_resource_index():
+    plain_source = {
+        "definitions": [{"markdown": "- :App:", "linked_resources": [{"text": "App", "target": "app.md"}]}],
+        "functional specs": [
+            {
+                "markdown": "- First",
+                "linked_resources": [{"text": "Spec", "target": "spec.yaml"}],
+                "acceptance_tests": [
+                    {"markdown": "- Test", "linked_resources": [{"text": "Data", "target": "data.csv"}]}
+                ],
+            },
+            {"markdown": "- Second", "linked_resources": [{"text": "Spec", "target": "spec.yaml"}]},
+        ],
+    }
+
+    linked_resource_index = plain_spec.get_linked_resource_index(plain_source)
+    assert plain_spec.get_linked_resource_index(plain_source) is linked_resource_index
+
+    assert linked_resource_index.get_linked_resources(frid="1") == [
+        {"text": "App", "target": "app.md", "sections": ["definitions"]},
+        {"text": "Data", "target": "data.csv", "sections": ["functional specs"]},
+        {"text": "Spec", "target": "spec.yaml", "sections": ["functional specs"]},
+    ]
+    assert linked_resource_index.get_linked_resources(frid="2") == [
+        {"text": "App", "target": "app.md", "sections": ["definitions"]},
+        {"text": "Spec", "target": "spec.yaml", "sections": ["functional specs", "functional specs"]},
+    ]
+    assert linked_resource_index.get_linked_resources(
+        [plain_spec.NON_FUNCTIONAL_REQUIREMENTS, plain_spec.FUNCTIONAL_REQUIREMENTS], False, "1"
+    ) == [{"text": "Spec", "target": "spec.yaml", "sections": ["functional specs"]}]
+
+    resources_list = []
+    plain_spec.collect_linked_resources(plain_source, resources_list, None, True)
+    assert [resource["text"] for resource in resources_list] == ["App", "Data", "Spec"]
+
+    with pytest.raises(ValueError, match="frid 3 does not exist."):
+        linked_resource_index.get_linked_resources(frid="3")
+
+
+def test_linked_resource_index_conflicts():
+    plain_source = {
+        "functional specs": [
+            {"markdown": "- First", "linked_resources": [{"text": "Spec", "target": "spec.yaml"}]},
+            {"markdown": "- Second", "linked_resources": [{"text": "Spec", "target": "other.yaml"}]},
+        ],
+    }
+    with pytest.raises(
+        Exception, match="The file other.yaml is linked to multiple linked resources with the same text"
+    ):
+        plain_spec.LinkedResourceIndex(plain_source)
+
+    plain_source["functional specs"][1]["linked_resources"] = [{"text": "Other", "target": "spec.yaml"}]
+    with pytest.raises(Exception, match="The linked resource Other is linked to multiple files: spec.yaml"):
+        plain_spec.LinkedResourceIndex(plain_source)
@@ -0,0 +1,149 @@
+import json
+import random
+
+import pytest
+import requests
+
+import plain2code_exceptions
+import retry_policy
+from retry_policy import CircuitBreaker, RetryPolicy
+
+
+def make_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return response
+
+
+def http_error(response):
+    return requests.exceptions.HTTPError(f"{response.status_code} error", response=response)
+
+
+def test_decorrelated_jitter_delays():
+    policy = RetryPolicy(
+        base_delay=1, max_delay=20, circuit_breaker=CircuitBreaker(), random_generator=random.Random(42)
+    )
+    retries = policy.start_request()
+    response = make_response(503)
+
+    previous_delay = 1
+    for _ in range(policy.retry_budgets[retry_policy.SERVER_ERROR]):
+        retries.before_attempt()
+        decision = retries.on_failure(http_error(response), response)
+        assert decision.retry
+        assert decision.category == retry_policy.SERVER_ERROR
+        assert 1 <= decision.delay <= min(20, previous_delay * 3)
+        previous_delay = decision.delay
+
+    retries.before_attempt()
+    assert not retries.on_failure(http_error(response), response).retry
+
+
+def test_retry_budgets_are_per_category():
+    policy = RetryPolicy(
+        base_delay=0,
+        max_delay=0,
+        retry_budgets={retry_policy.TIMEOUT: 1, retry_policy.LLM_ERROR: 1},
+        circuit_breaker=CircuitBreaker(),
+    )
+    retries = policy.start_request()
+
+    assert retries.on_failure(requests.exceptions.ReadTimeout(), None).retry
+    assert retries.on_failure(plain2code_exceptions.LLMInternalError("error"), None).retry
+    assert not retries.on_failure(requests.exceptions.ReadTimeout(), None).retry
+    assert not retries.on_failure(plain2code_exceptions.LLMInternalError("error"), None).retry
+    assert retries.on_failure(requests.exceptions.ConnectionError(), None).retry
+
+    # Errors that won't go away by retrying aren't retried at all.
+    decision = retries.on_failure(plain2code_exceptions.ConflictingRequirements("error"), make_response(400))
+    assert not decision.retry
+    assert decision.category is None
+
+
+def test_retry_after_header():
+    policy = RetryPolicy(base_delay=1, max_delay=2, circuit_breaker=CircuitBreaker())
+    retries = policy.start_request()
+
+    response = make_response(429, {"Retry-After": "30"})
+    decision = retries.on_failure(http_error(response), response)
+    assert decision.category == retry_policy.RATE_LIMITED
+    assert decision.delay == 30
+
+    response = make_response(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    decision = retries.on_failure(http_error(response), response)
+    assert decision.retry
+    assert 1 <= decision.delay <= 2
+
+
+def test_circuit_breaker():
+    now = [0.0]
+    circuit_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=lambda: now[0])
+
+    for _ in range(3):
+        circuit_breaker.before_request()
+        circuit_breaker.record_failure()
+    assert circuit_breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(plain2code_exceptions.ServiceUnavailable):
+        circuit_breaker.before_request()
+
+    # After the reset timeout a single trial request is let through.
+    now[0] = 10
+    circuit_breaker.before_request()
+    with pytest.raises(plain2code_exceptions.ServiceUnavailable):
+        circuit_breaker.before_request()
+
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == CircuitBreaker.OPEN
+
+    now[0] = 20
+    circuit_breaker.before_request()
+    circuit_breaker.record_success()
+    assert circuit_breaker.state == CircuitBreaker.CLOSED
+    circuit_breaker.before_request()
+
+
+def test_failure_category_of_responses_that_are_not_json():
+    decode_error = json.JSONDecodeError("Expecting value", "<html>", 0)
+
+    assert retry_policy.get_failure_category(decode_error, make_response(502)) == retry_policy.SERVER_ERROR
+    assert retry_policy.get_failure_category(decode_error, make_response(429)) == retry_policy.RATE_LIMITED
+    assert retry_policy.get_failure_category(decode_error, make_response(200)) == retry_policy.INVALID_RESPONSE
+    assert retry_policy.get_failure_category(decode_error, None) == retry_policy.INVALID_RESPONSE
+
+
+def test_only_successful_responses_close_the_circuit_breaker():
+    circuit_breaker = CircuitBreaker(failure_threshold=2)
+    retries = RetryPolicy(base_delay=0, max_delay=0, circuit_breaker=circuit_breaker).start_request()
+
+    retries.on_failure(requests.exceptions.ConnectionError(), None)
+    retries.on_failure(plain2code_exceptions.LLMInternalError("error"), make_response(400))
+    assert circuit_breaker.consecutive_failures == 1
+
+    retries.on_failure(requests.exceptions.JSONDecodeError("Expecting value", "{", 1), make_response(200))
+    assert circuit_breaker.consecutive_failures == 0
+
+
+def test_rejected_trial_request_does_not_keep_the_circuit_breaker_half_open():
+    now = [0.0]
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    policy = RetryPolicy(base_delay=0, max_delay=0, circuit_breaker=circuit_breaker)
+
+    retries = policy.start_request()
+    retries.before_attempt()
+    retries.on_failure(requests.exceptions.ConnectionError(), None)
+    assert circuit_breaker.state == CircuitBreaker.OPEN
+
+    now[0] = 10
+    retries = policy.start_request()
+    retries.before_attempt()
+    response = make_response(400, {"Content-Type": "application/json"})
+    response._content = json.dumps({"error_code": "CreditBalanceTooLow", "message": "Credit balance too low"}).encode()
+    decision = retries.on_failure(plain2code_exceptions.CreditBalanceTooLow("Credit balance too low"), response)
+    assert not decision.retry
+
+    retries = policy.start_request()
+    retries.before_attempt()
+    retries.record_success()
+    assert circuit_breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,113 @@
+import os
+from unittest.mock import patch
+
+import file_utils
+from template_cache import TemplateCache
+
+MAIN_PLAIN_SOURCE = """***definitions***
+
+- :App: is a console application.
+
+***functional specs***
+
+- {% include "greeting.plain" %}
+- Greet the user:
+    {% include "greeting.plain" %}
+"""
+
+
+def write_file(folder, file_name, content):
+    with open(os.path.join(folder, file_name), "w") as f:
+        f.write(content)
+
+
+def render(template_dirs, template_cache):
+    loader = file_utils.TrackingFileSystemLoader(template_dirs, template_cache=template_cache)
+    environment = file_utils.create_template_environment(loader)
+    return environment.from_string(MAIN_PLAIN_SOURCE).render(), loader.loaded_templates
+
+
+def test_cached_templates_render_identically(tmp_path):
+    write_file(str(tmp_path), "greeting.plain", 'Display "hello"\nand "world"\n')
+    template_cache = TemplateCache()
+
+    uncached = render([str(tmp_path)], None)
+    assert render([str(tmp_path)], template_cache) == uncached
+
+    # The template is included with two different indentations.
+    assert len(template_cache._templates) == 2
+
+    with patch.object(TemplateCache, "put", side_effect=AssertionError("compiled again")):
+        with patch.object(file_utils.TrackingFileSystemLoader, "get_source", side_effect=AssertionError("read again")):
+            rendered_plain_source, loaded_templates = render([str(tmp_path)], template_cache)
+
+    # Cache hits are still tracked.
+    assert (rendered_plain_source, loaded_templates) == uncached
+    assert loaded_templates == {"greeting.plain": 'Display "hello"\nand "world"\n'}
+
+
+class FrontMatterLoader(file_utils.TrackingFileSystemLoader):
+    def get_source(self, environment, template_name, **kwargs):
+        return super().get_source(environment, template_name, **kwargs)._replace(matter={"name": "world"})
+
+
+def test_cached_templates_keep_their_front_matter(tmp_path):
+    write_file(str(tmp_path), "greeting.plain", 'Display "hello {{ name }}"')
+    template_cache = TemplateCache()
+
+    def render_with_front_matter():
+        environment = file_utils.create_template_environment(
+            FrontMatterLoader([str(tmp_path)], template_cache=template_cache)
+        )
+        return environment.get_template("greeting.plain").render()
+
+    assert render_with_front_matter() == 'Display "hello world"'
+    assert render_with_front_matter() == 'Display "hello world"'
+
+
+def test_changed_template_is_compiled_again(tmp_path):
+    write_file(str(tmp_path), "greeting.plain", 'Display "hello"')
+    template_cache = TemplateCache()
+    render([str(tmp_path)], template_cache)
+
+    write_file(str(tmp_path), "greeting.plain", 'Display "hello, universe"')
+    rendered_plain_source, loaded_templates = render([str(tmp_path)], template_cache)
+
+    assert '- Display "hello, universe"' in rendered_plain_source
+    assert loaded_templates == {"greeting.plain": 'Display "hello, universe"'}
+
+
+def test_persisted_templates(tmp_path):
+    source_folder = str(tmp_path / "source")
+    os.makedirs(source_folder)
+    write_file(source_folder, "greeting.plain", 'Display "hello"\nand "world"')
+    cache_folder = str(tmp_path / "cache")
+
+    uncached = render([source_folder], TemplateCache(cache_folder))
+    assert len(os.listdir(cache_folder)) == 2
+
+    # A new process starts with an empty in-memory cache.
+    with patch.object(file_utils.TrackingFileSystemLoader, "get_source", side_effect=AssertionError("read again")):
+        assert render([source_folder], TemplateCache(cache_folder)) == uncached
+
+
+def test_persisted_templates_of_other_liquid_versions_are_not_used(tmp_path):
+    source_folder = str(tmp_path / "source")
+    os.makedirs(source_folder)
+    write_file(source_folder, "greeting.plain", 'Display "hello"')
+    cache_folder = str(tmp_path / "cache")
+
+    uncached = render([source_folder], TemplateCache(cache_folder))
+
+    # The template is included with two different indentations, so it's compiled twice.
+    with patch("liquid2.__version__", "0.0.0"):
+        with patch.object(TemplateCache, "put") as mock_put:
+            assert render([source_folder], TemplateCache(cache_folder)) == uncached
+            assert mock_put.call_count == 2
+
+    # Entries that can't be unpickled are compiled again.
+    for entry_name in os.listdir(cache_folder):
+        write_file(cache_folder, entry_name, "not a pickle")
+    with patch.object(TemplateCache, "put") as mock_put:
+        assert render([source_folder], TemplateCache(cache_folder)) == uncached
+        assert mock_put.call_count == 2